@@ -0,0 +1,69 @@
+"""Benchmark top-k product selection on per-store totals.
+
+    python benchmarks/bench_top_k.py [--skus 50000] [--stores 8] [--k 10]
+
+Each store gets a Description-indexed frame of Revenue and Quantity totals, as
+period_aggregate returns. For every store this times a full sort + head, pandas
+nlargest and top_k (argpartition), for a Series and for a frame ranked by column,
+and checks that all three pick the same rows in the same order.
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from common import best_of, import_dashboard
+
+
+def store_totals(skus, stores, seed=0):
+    """Per-store product totals: skewed revenue, and quantities with many ties"""
+    rng = np.random.default_rng(seed)
+    index = pd.Index([f"SKU {n:06d}" for n in range(skus)], name='Description')
+    return [
+        pd.DataFrame({
+            'Revenue': np.round(rng.lognormal(3, 1.5, skus), 2),
+            'Quantity': rng.integers(0, 50, skus)
+        }, index=index)
+        for _ in range(stores)
+    ]
+
+
+def methods(k, by=None):
+    """The three ways to pick the k largest, for a Series (by=None) or a frame ranked by column"""
+    if by is None:
+        return {
+            'sort_values().head()': lambda totals: totals.sort_values(ascending=False, kind='stable').head(k),
+            'nlargest()': lambda totals: totals.nlargest(k),
+            'top_k()': lambda totals: top_k(totals, k)
+        }
+    return {
+        'sort_values().head()': lambda totals: totals.sort_values(by, ascending=False, kind='stable').head(k),
+        'nlargest()': lambda totals: totals.nlargest(k, by),
+        'top_k()': lambda totals: top_k(totals, k, by=by)
+    }
+
+
+def bench(label, stores, candidates):
+    results = {}
+    print(label)
+    for name, method in candidates.items():
+        seconds, results[name] = best_of(lambda: [method(totals) for totals in stores], repeat=5)
+        print(f"  {name:<21} {seconds * 1000:8.1f} ms  ({seconds / len(stores) * 1000:,.2f} ms/store)")
+    reference = [top.index for top in results['top_k()']]
+    for name, tops in results.items():
+        assert all(top.index.equals(ref) for top, ref in zip(tops, reference)), f"{name} picked different rows"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--skus', type=int, default=50_000, help="products per store")
+    parser.add_argument('--stores', type=int, default=8)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+    
+    top_k = import_dashboard().top_k
+    stores = store_totals(args.skus, args.stores)
+    print(f"{args.stores} stores x {args.skus:,} SKUs, k={args.k}")
+    bench("Series: Revenue", [totals['Revenue'] for totals in stores], methods(args.k))
+    bench("Series: Quantity (many ties)", [totals['Quantity'] for totals in stores], methods(args.k))
+    bench("DataFrame by Revenue", stores, methods(args.k, by='Revenue'))
@@ -0,0 +1,28 @@
+"""Shared setup for the ad-hoc benchmark scripts (run them from the repo root)."""
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_dashboard():
+    """The dashboard module, imported headless with its on-disk caches in a fresh temp dir"""
+    cache_root = tempfile.mkdtemp(prefix="dashboard-bench-")
+    os.environ.pop('DATA_BACKEND', None)
+    os.environ['COLUMNAR_CACHE_DIR'] = os.path.join(cache_root, "columnar")
+    os.environ['SALES_LAKE_DIR'] = os.path.join(cache_root, "lake")
+    sys.path.insert(0, REPO_ROOT)
+    return importlib.import_module("sales_dashboard")
+
+
+def best_of(fn, repeat=3):
+    """Fastest wall time of fn over repeat runs, plus its last result"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
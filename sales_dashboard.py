@@ -1,17 +1,59 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 from datetime import datetime, timedelta
 import re
 from io import BytesIO
 import os
 import json
+import copy
+import codecs
+import hashlib
+import pickle
+import tempfile
+import sqlite3
+import time
+import random
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from functools import reduce
+from collections import OrderedDict
+from contextlib import contextmanager, closing
+from urllib.parse import urlparse, parse_qs
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload
+import httplib2
 import io
 
+try:
+    import pyarrow as pa
+    import pyarrow.dataset
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None  # Columnar caching disabled
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None  # Sales history uses SQLite
+
+try:
+    import redis
+except ImportError:
+    redis = None  # Shared data cache stays in-process
+
+try:
+    from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto
+except ImportError:
+    PlotlyChartProto = None  # Cached chart specs are rebuilt into figures for st.plotly_chart
+
 # --- PAGE CONFIG ---
 st.set_page_config(page_title="Three Mills Analytics Pro", layout="wide", page_icon="🥖")
 
@@ -205,6 +247,288 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+# --- PERFORMANCE INSTRUMENTATION ---
+logger = logging.getLogger("sales_dashboard")
+
+# Worker threads have no Streamlit session, so they record into the metrics
+# dict they were handed (see run_with_perf_metrics)
+_perf_context = threading.local()
+
+@st.cache_resource(show_spinner=False)
+def get_perf_lock():
+    """Process-wide lock guarding metrics dicts (shared with workers started on earlier reruns)"""
+    return threading.Lock()
+
+PERF_LOCK = get_perf_lock()
+
+def get_perf_metrics():
+    """Get the performance metrics recorded for this session"""
+    metrics = getattr(_perf_context, 'metrics', None)
+    if metrics is not None:
+        return metrics
+    metrics = st.session_state.get('perf_metrics')
+    if metrics is None:
+        metrics = st.session_state.perf_metrics = {'spans': {}, 'counters': {}}
+    return metrics
+
+def run_with_perf_metrics(metrics, fn, *args, **kwargs):
+    """Run fn (usually on a worker thread), recording spans and counters into metrics"""
+    _perf_context.metrics = metrics
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _perf_context.metrics = None
+
+def perf_metrics_snapshot():
+    """Deep copy of this session's metrics, taken under the lock so workers can keep recording"""
+    metrics = get_perf_metrics()
+    with PERF_LOCK:
+        return copy.deepcopy(metrics)
+
+def record_span(name, seconds):
+    """Record the duration of one instrumented stage"""
+    spans = get_perf_metrics()['spans']
+    with PERF_LOCK:
+        span = spans.setdefault(name, {'count': 0, 'total': 0.0, 'last': 0.0, 'max': 0.0})
+        span['count'] += 1
+        span['total'] += seconds
+        span['last'] = seconds
+        span['max'] = max(span['max'], seconds)
+    logger.info(json.dumps({'event': 'span', 'span': name, 'ms': round(seconds * 1000, 3)}))
+
+@contextmanager
+def perf_span(name):
+    """Time a block of work under the given span name"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+def perf_count(name, value=1):
+    """Increment a performance counter (bytes downloaded, rows processed, ...)"""
+    counters = get_perf_metrics()['counters']
+    with PERF_LOCK:
+        counters[name] = counters.get(name, 0) + value
+    logger.info(json.dumps({'event': 'counter', 'counter': name, 'value': value}))
+
+def perf_metrics_prometheus(metrics):
+    """Export recorded metrics in the Prometheus text exposition format"""
+    lines = [
+        '# HELP dashboard_span_seconds Time spent in instrumented dashboard stages',
+        '# TYPE dashboard_span_seconds summary'
+    ]
+    for name, span in sorted(metrics['spans'].items()):
+        lines.append(f'dashboard_span_seconds_sum{{span="{name}"}} {span["total"]:.6f}')
+        lines.append(f'dashboard_span_seconds_count{{span="{name}"}} {span["count"]}')
+    for name, value in sorted(metrics['counters'].items()):
+        lines.append(f'# TYPE dashboard_{name}_total counter')
+        lines.append(f'dashboard_{name}_total {value}')
+    return '\n'.join(lines) + '\n'
+
+def show_chart(fig, name, cache_key=None):
+    """Render a Plotly chart, timing serialization and rendering under chart.<name>.
+    
+    fig is either a newly built figure, which is serialized once (and stored in
+    the figure cache under cache_key), or a JSON spec served by cached_figure.
+    """
+    with perf_span(f"chart.{name}"):
+        if isinstance(fig, str):
+            spec = fig
+        else:
+            spec = serialize_figure(fig, name)
+            if cache_key is not None:
+                get_figure_cache().put(cache_key, spec, len(spec))
+        render_figure_spec(spec)
+
+def render_figure_spec(spec):
+    """Send a serialized Plotly spec to the page as st.plotly_chart does, without validating it again"""
+    if PlotlyChartProto is None:
+        st.plotly_chart(pio.from_json(spec), use_container_width=True)
+        return
+    proto = PlotlyChartProto()
+    proto.use_container_width = True
+    proto.figure.spec = spec
+    proto.figure.config = json.dumps({'showLink': False, 'linkText': False})
+    proto.theme = "streamlit"
+    st._main._enqueue("plotly_chart", proto)  # Honours the enclosing column/container like st.plotly_chart
+
+# --- ADAPTIVE CHART RENDERING ---
+# Trend charts pick their granularity from the span (day -> week -> month), fall
+# back to an LTTB-downsampled daily line once even monthly bars get crowded.
+# Every figure's JSON payload is measured and bounded.
+MAX_BAR_POINTS = 40  # More periods than this draw as a line instead of bars
+MAX_LABELED_BARS = 31  # Per-bar value labels only up to this many bars
+MAX_LINE_POINTS = 400  # Line traces are downsampled to at most this many points
+MAX_FIGURE_BYTES = 1024 * 1024  # Larger figures lose their per-point text labels
+
+def serialize_figure(fig, name):
+    """The JSON spec Streamlit sends to the browser, without per-point text labels when it is too large"""
+    spec = pio.to_json(fig, validate=False)
+    if len(spec) > MAX_FIGURE_BYTES:
+        fig.update_traces(text=None)
+        spec = pio.to_json(fig, validate=False)
+        if len(spec) > MAX_FIGURE_BYTES:
+            logger.warning(f"Chart {name} payload is {len(spec):,} bytes")
+    perf_count("chart_bytes", len(spec))
+    logger.info(json.dumps({'event': 'chart', 'chart': name, 'bytes': len(spec)}))
+    return spec
+
+def choose_granularity(days_span):
+    """Trend chart period for a date span"""
+    if days_span <= 14:
+        return 'day'
+    if days_span <= 180:
+        return 'week'
+    return 'month'
+
+def period_totals(daily_totals, granularity):
+    """Revenue/Quantity per display period, labelled, from per-date totals"""
+    if granularity == 'day':
+        totals = daily_totals[['Date', 'Revenue', 'Quantity']].copy()
+        totals['Label'] = totals['Date'].dt.strftime('%b %d')
+        return totals
+    
+    if granularity == 'month':
+        totals = daily_totals.groupby(daily_totals['Date'].dt.to_period('M')).agg(
+            Revenue=('Revenue', 'sum'),
+            Quantity=('Quantity', 'sum'),
+            Date=('Date', 'min')
+        ).reset_index(drop=True)
+        totals['Label'] = totals['Date'].dt.strftime('%b %Y')
+        return totals
+    
+    # Weeks of the month (1-7 = Week 1, 8-14 = Week 2, etc.), labelled e.g. "Dec 1-7"
+    weekly_data = daily_totals.copy()
+    weekly_data['WeekNum'] = ((weekly_data['Date'].dt.day - 1) // 7) + 1
+    weekly_data['MonthName'] = weekly_data['Date'].dt.strftime('%b')
+    totals = weekly_data.groupby(['MonthName', 'WeekNum']).agg(
+        Revenue=('Revenue', 'sum'),
+        Quantity=('Quantity', 'sum'),
+        Date=('Date', 'min'),
+        EndDate=('Date', 'max')
+    ).reset_index()
+    totals['Label'] = (
+        totals['MonthName'] + ' ' + totals['Date'].dt.day.astype(str) + '-' + totals['EndDate'].dt.day.astype(str)
+    )
+    return totals
+
+def lttb_downsample(x, y, threshold):
+    """Indices of at most threshold points keeping a line's visual shape (Largest-Triangle-Three-Buckets)"""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    
+    # First and last points are kept; the rest is split into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = [0]
+    anchor = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[edges[i + 1]:edges[i + 2]].mean()
+            next_y = y[edges[i + 1]:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        # Keep the point forming the largest triangle with the last kept point and the next bucket's mean
+        areas = np.abs(
+            (x[anchor] - next_x) * (y[start:end] - y[anchor]) -
+            (x[anchor] - x[start:end]) * (next_y - y[anchor])
+        )
+        anchor = start + int(np.argmax(areas))
+        selected.append(anchor)
+    selected.append(n - 1)
+    return np.array(selected)
+
+def trend_trace(totals, daily_totals, value_column, color, hovertemplate, text_size=10):
+    """Bar per period, or a downsampled daily line once there are too many periods"""
+    values = totals[value_column]
+    if len(totals) <= MAX_BAR_POINTS:
+        return go.Bar(
+            x=totals['Label'],
+            y=values,
+            marker_color=color,
+            text=[f"{v:,.0f}" for v in values] if len(totals) <= MAX_LABELED_BARS else None,
+            textposition='outside',
+            textfont=dict(size=text_size),
+            hovertemplate=hovertemplate
+        )
+    
+    # Long ranges: a daily line, reduced server-side before it reaches the browser
+    keep = lttb_downsample(daily_totals['Date'].astype('int64'), daily_totals[value_column], MAX_LINE_POINTS)
+    points = daily_totals.iloc[keep]
+    return go.Scatter(
+        x=points['Date'],
+        y=points[value_column],
+        mode='lines',
+        line=dict(color=color, width=2),
+        hovertemplate=hovertemplate
+    )
+
+# --- FIGURE CACHE ---
+# Serialized figure specs are shared across reruns and sessions, keyed by a hash
+# of the aggregate they plot plus their styling parameters (metric toggle,
+# captions). An unchanged chart skips figure construction, validation and
+# serialization: its JSON spec goes straight into the chart message. The cache
+# is LRU, bounded by the specs' size.
+FIGURE_CACHE_BYTES = 32 * 1024 * 1024
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by the total size of its entries"""
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+    
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+@st.cache_resource
+def get_figure_cache():
+    """Process-wide figure cache shared by all sessions"""
+    return LRUCache(FIGURE_CACHE_BYTES)
+
+def figure_key(name, *parts):
+    """Cache key for a chart: its name plus a hash of its aggregate data and styling parameters"""
+    digest = hashlib.sha1(name.encode())
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+            digest.update(repr(list(part.columns) if isinstance(part, pd.DataFrame) else part.name).encode())
+        elif isinstance(part, np.ndarray):
+            digest.update(part.tobytes())
+            digest.update(repr(part.shape).encode())
+        else:
+            digest.update(repr(part).encode())
+    return digest.hexdigest()
+
+def cached_figure(key):
+    """The serialized spec of a previously built figure for key, or None"""
+    spec = get_figure_cache().get(key)
+    perf_count("figure_cache_hits" if spec is not None else "figure_cache_misses")
+    return spec
+
 # --- GOOGLE DRIVE SERVICE ACCOUNT SETUP ---
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 
@@ -236,45 +560,483 @@ def get_google_drive_service():
     except Exception as e:
         return None, f"Error connecting to Google Drive: {str(e)}"
 
-def list_files_in_folder(service, folder_id, file_pattern=None):
-    """List all Excel files in a Google Drive folder"""
+# --- DATA SOURCE BACKENDS ---
+SPREADSHEET_MIME_TYPES = [
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.ms-excel'
+]
+SPREADSHEET_EXTENSIONS = ('.xlsx', '.xls')
+
+def get_setting(name, default=None):
+    """Read a setting from Streamlit secrets, falling back to an environment variable"""
     try:
-        query = f"'{folder_id}' in parents and (mimeType='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet' or mimeType='application/vnd.ms-excel') and trashed=false"
+        if st.secrets.load_if_toml_exists() and name in st.secrets:
+            return st.secrets[name]
+    except:
+        pass  # No secrets file
+    return os.environ.get(name.upper(), default)
+
+# Drive quota scheduling: every Drive request passes through one process-wide
+# scheduler. A token bucket keeps the request rate under DRIVE_MAX_QPS. An AIMD
+# limit on concurrent requests halves on each throttle and creeps back up on
+# success. Throttled (403 rate limit / 429) and transient 5xx responses are
+# retried with jittered exponential backoff instead of dropping the day.
+DRIVE_MAX_QPS = float(get_setting('drive_max_qps', 10))
+DRIVE_MAX_CONCURRENCY = int(get_setting('drive_max_concurrency', 8))
+DRIVE_MAX_RETRIES = int(get_setting('drive_max_retries', 8))
+DRIVE_BACKOFF_BASE = 0.5
+DRIVE_BACKOFF_MAX = 32.0
+RATE_LIMIT_REASONS = {'userRateLimitExceeded', 'rateLimitExceeded'}
+TRANSIENT_STATUSES = {500, 502, 503, 504}
+# Downloads stream to a temporary file in Range requests of this size; a dropped
+# connection is retried from the last complete chunk
+DRIVE_CHUNK_BYTES = int(float(get_setting('drive_chunk_mb', 8)) * 1024 * 1024)
+
+def drive_error_kind(error):
+    """'throttled', 'transient' or None (permanent) for a failed Drive request"""
+    if not isinstance(error, HttpError):
+        return 'transient'  # Dropped connection or timeout
+    status = error.resp.status
+    if status == 429:
+        return 'throttled'
+    if status == 403:
+        try:
+            reasons = {e.get('reason') for e in json.loads(error.content)['error']['errors']}
+        except Exception:
+            reasons = set()
+        return 'throttled' if reasons & RATE_LIMIT_REASONS else None
+    return 'transient' if status in TRANSIENT_STATUSES else None
+
+class DriveQuotaScheduler:
+    """Token bucket, AIMD concurrency limit and jittered backoff around Drive requests"""
+    
+    def __init__(self, max_qps, max_concurrency, max_retries):
+        self.rate = max_qps
+        self.tokens = max_qps
+        self.refilled = time.monotonic()
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.max_retries = max_retries
+        self.condition = threading.Condition()
+        self.minutes = OrderedDict()
+    
+    def count(self, name, on_count=None):
+        """Add one to this minute's usage counter (the last hour is kept)"""
+        minute = int(time.time() // 60)
+        with self.condition:
+            counters = self.minutes.setdefault(minute, {'requests': 0, 'throttled': 0, 'retries': 0, 'failed': 0})
+            counters[name] += 1
+            while len(self.minutes) > 60:
+                self.minutes.popitem(last=False)
+        if on_count:
+            on_count(f"drive_{name}")
+    
+    def usage(self):
+        """Counters for the current minute plus the current concurrency limit"""
+        with self.condition:
+            current = dict(self.minutes.get(int(time.time() // 60), {'requests': 0, 'throttled': 0, 'retries': 0, 'failed': 0}))
+            current['limit'] = int(self.limit)
+        return current
+    
+    def acquire(self):
+        """Block until a request token and a concurrency slot are both available"""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.refilled) * self.rate)
+                self.refilled = now
+                if self.tokens >= 1 and self.in_flight < int(self.limit):
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return
+                wait_seconds = (1 - self.tokens) / self.rate if self.tokens < 1 else None
+                self.condition.wait(timeout=wait_seconds)
+    
+    def release(self, throttled):
+        """Free a slot; halve the concurrency limit on a throttle, else grow it additively"""
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self.condition.notify_all()
+    
+    def call(self, fn, on_count=None):
+        """Run one Drive request under the quota, retrying throttles and transient errors.
         
-        results = service.files().list(
-            q=query,
-            fields="files(id, name, createdTime, modifiedTime)",
-            pageSize=1000,
-            orderBy='name'
-        ).execute()
+        on_count(counter_name) mirrors the usage counters into the caller's metrics.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            self.count('requests', on_count)
+            kind = None
+            try:
+                return fn()
+            except (HttpError, OSError, httplib2.HttpLib2Error) as e:
+                kind = drive_error_kind(e)
+                if kind == 'throttled':
+                    self.count('throttled', on_count)
+                if kind is None or attempt == self.max_retries:
+                    self.count('failed', on_count)
+                    raise
+                retry_after = e.resp.get('retry-after') if isinstance(e, HttpError) else None
+            finally:
+                self.release(kind == 'throttled')
+            
+            self.count('retries', on_count)
+            delay = random.uniform(0, min(DRIVE_BACKOFF_MAX, DRIVE_BACKOFF_BASE * 2 ** attempt))
+            if retry_after and str(retry_after).isdigit():
+                delay = max(delay, float(retry_after))
+            time.sleep(delay)
+
+@st.cache_resource
+def get_drive_scheduler():
+    """Drive quota scheduler shared by every session and worker in the process"""
+    return DriveQuotaScheduler(DRIVE_MAX_QPS, DRIVE_MAX_CONCURRENCY, DRIVE_MAX_RETRIES)
+
+class DriveBackend:
+    """Storage backend for the Google Drive API (or anything with the same interface)"""
+    name = "Google Drive"
+    
+    def __init__(self, service, service_factory=None, scheduler=None):
+        # httplib2 isn't thread-safe, so every other thread builds its own service
+        self.shared_service = service
+        self.service_factory = service_factory
+        self.thread_services = threading.local()
+        self.thread_services.service = service
+        self.scheduler = scheduler
+    
+    def execute(self, fn):
+        """Run one Drive request through the quota scheduler, if there is one"""
+        return self.scheduler.call(fn, on_count=perf_count) if self.scheduler else fn()
+    
+    @property
+    def service(self):
+        if self.service_factory is None:
+            return self.shared_service
+        if not hasattr(self.thread_services, 'service'):
+            self.thread_services.service = self.service_factory()
+        return self.thread_services.service
+    
+    def describe_folder(self, folder_id):
+        return f"{folder_id[:15]}..."
+    
+    def list_files(self, folder_id):
+        """List spreadsheet files in a folder, following pagination"""
+        mime_query = ' or '.join(f"mimeType='{mime}'" for mime in SPREADSHEET_MIME_TYPES)
+        query = f"'{folder_id}' in parents and ({mime_query}) and trashed=false"
         
-        files = results.get('files', [])
+        files = []
+        page_token = None
+        while True:
+            results = self.execute(self.service.files().list(
+                q=query,
+                fields="nextPageToken, files(id, name, createdTime, modifiedTime, md5Checksum, size)",
+                pageSize=1000,
+                orderBy='name',
+                pageToken=page_token
+            ).execute)
+            files.extend(results.get('files', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return files
+    
+    def download(self, file_id):
+        """Stream a file to a temporary file in resumable Range chunks"""
+        request = self.service.files().get_media(fileId=file_id)
+        file_buffer = tempfile.TemporaryFile()
+        downloader = MediaIoBaseDownload(file_buffer, request, chunksize=DRIVE_CHUNK_BYTES)
+        chunk_label = f"{DRIVE_CHUNK_BYTES // 1024}kb"
         
-        # Filter by pattern if provided
-        if file_pattern:
-            files = [f for f in files if re.search(file_pattern, f['name'])]
+        done = False
+        while not done:
+            # A failed chunk leaves the downloader after the last byte written, so a retry resumes there
+            received = file_buffer.tell()
+            chunk_start = time.perf_counter()
+            status, done = self.execute(downloader.next_chunk)
+            record_span(f"drive.chunk.{chunk_label}", time.perf_counter() - chunk_start)
+            perf_count(f"drive_chunk_bytes_{chunk_label}", file_buffer.tell() - received)
         
+        file_buffer.seek(0)
+        return file_buffer
+
+class LocalDirectoryBackend:
+    """Storage backend reading daily export files from a local directory"""
+    name = "Local Folder"
+    
+    def __init__(self, root):
+        self.root = root
+    
+    def folder_path(self, folder_id):
+        """Resolve a folder id to a subdirectory; the single-folder placeholder id is the root itself"""
+        if folder_id in ('', SALES_FOLDER_ID):
+            return self.root
+        path = os.path.join(self.root, folder_id)
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"Folder not found: {path}")
+        return path
+    
+    def list_files(self, folder_id):
+        """List spreadsheet files in a folder with Drive-style metadata"""
+        folder = self.folder_path(folder_id)
+        files = []
+        with perf_span("local.scan"):
+            entries = sorted(os.scandir(folder), key=lambda e: e.name)
+        for entry in entries:
+            if not entry.is_file() or not entry.name.lower().endswith(SPREADSHEET_EXTENSIONS):
+                continue
+            stat = entry.stat()
+            modified = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(stat.st_mtime)) + f".{stat.st_mtime_ns // 1000 % 1000000:06d}Z"
+            files.append({
+                'id': entry.path,
+                'name': entry.name,
+                'createdTime': modified,
+                'modifiedTime': modified,
+                'size': str(stat.st_size)
+            })
         return files
-    except Exception as e:
-        st.error(f"Error listing files: {str(e)}")
-        return []
+    
+    def describe_folder(self, folder_id):
+        try:
+            return self.folder_path(folder_id)
+        except FileNotFoundError:
+            return f"{os.path.join(self.root, folder_id)} (not found)"
+    
+    def download(self, file_id):
+        """Open a file for reading (the caller closes it)"""
+        return open(file_id, 'rb')
 
-def download_file_from_drive(service, file_id):
-    """Download a file from Google Drive"""
-    try:
-        request = service.files().get_media(fileId=file_id)
-        file_buffer = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_buffer, request)
+class FakeDriveService:
+    """In-process fake of the Drive v3 API serving files from a local directory.
+    
+    Simulates per-request latency, quota throttling (403 userRateLimitExceeded /
+    429 rateLimitExceeded), dropped download connections and list pagination so loading can be benchmarked and
+    regression-tested without a service account. Plug it into DriveBackend to
+    exercise the real Drive code path, including chunked media downloads.
+    """
+    
+    def __init__(self, root, latency=0.0, error_rate=0.0, max_qps=None, page_size=100, seed=None, drop_rate=0.0):
+        self.source = LocalDirectoryBackend(root)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.max_qps = max_qps
+        self.page_size = page_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.recent_requests = []
+        self.checksums = {}
+        self.stats = {'requests': 0, 'throttled': 0, 'dropped': 0, 'pages': 0, 'bytes_served': 0}
+    
+    def files(self):
+        return _FakeFilesResource(self)
+    
+    def request(self, uri, method="GET", headers=None, **kwargs):
+        """Serve a media download, honouring HTTP Range headers like Drive does"""
+        error = self.simulate_request()
+        if error:
+            return error
+        with self.lock:
+            dropped = self.drop_rate and self.random.random() < self.drop_rate
+            if dropped:
+                self.stats['dropped'] += 1
+        if dropped:
+            raise ConnectionResetError("Connection reset by peer (simulated)")
         
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
+        file_id = parse_qs(urlparse(uri).query)['fileId'][0]
+        with open(file_id, 'rb') as f:
+            content = f.read()
+        total = len(content)
+        
+        byte_range = (headers or {}).get('range')
+        if not byte_range:
+            self.count_bytes(total)
+            return httplib2.Response({'status': 200, 'content-length': str(total)}), content
+        
+        start, end = byte_range.split('=')[1].split('-')
+        start, end = int(start), min(int(end), total - 1)
+        if start >= total:
+            return httplib2.Response({'status': 416, 'content-range': f'bytes */{total}'}), b''
+        chunk = content[start:end + 1]
+        self.count_bytes(len(chunk))
+        return httplib2.Response({'status': 206, 'content-range': f'bytes {start}-{end}/{total}'}), chunk
+    
+    def simulate_request(self):
+        """Apply latency and throttling to one request, returning an error response if throttled"""
+        if self.latency:
+            time.sleep(self.latency * (0.5 + self.random.random()))
+        
+        with self.lock:
+            self.stats['requests'] += 1
+            now = time.monotonic()
+            self.recent_requests = [t for t in self.recent_requests if now - t < 1.0]
+            self.recent_requests.append(now)
+            
+            reason = None
+            if self.max_qps and len(self.recent_requests) > self.max_qps:
+                reason = (403, 'userRateLimitExceeded')
+            elif self.error_rate and self.random.random() < self.error_rate:
+                reason = self.random.choice([(403, 'userRateLimitExceeded'), (429, 'rateLimitExceeded')])
+            if not reason:
+                return None
+            self.stats['throttled'] += 1
+        
+        status, error_reason = reason
+        content = json.dumps({'error': {
+            'code': status,
+            'message': 'Rate Limit Exceeded',
+            'errors': [{'reason': error_reason, 'message': 'Rate Limit Exceeded'}]
+        }}).encode()
+        return httplib2.Response({'status': status, 'content-type': 'application/json'}), content
+    
+    def count_bytes(self, size):
+        with self.lock:
+            self.stats['bytes_served'] += size
+    
+    def checksum(self, file):
+        """md5Checksum of a listed file, as Drive reports it (memoized per version)"""
+        key = (file['id'], file['modifiedTime'])
+        if key not in self.checksums:
+            with open(file['id'], 'rb') as f:
+                self.checksums[key] = md5_hexdigest(f)
+        return self.checksums[key]
+
+class _FakeFilesResource:
+    """files() resource of FakeDriveService"""
+    
+    def __init__(self, fake):
+        self.fake = fake
+    
+    def list(self, q='', pageSize=100, pageToken=None, **kwargs):
+        return _FakeListRequest(self.fake, q, pageSize, pageToken)
+    
+    def get_media(self, fileId):
+        return _FakeMediaRequest(self.fake, fileId)
+
+class _FakeListRequest:
+    """Paginated files().list() request of FakeDriveService"""
+    
+    def __init__(self, fake, query, page_size, page_token):
+        self.fake = fake
+        self.query = query
+        self.page_size = min(page_size, fake.page_size)
+        self.offset = int(page_token or 0)
+    
+    def execute(self, num_retries=0):
+        error = self.fake.simulate_request()
+        if error:
+            resp, content = error
+            raise HttpError(resp, content, uri='files.list')
+        
+        match = re.search(r"'([^']*)' in parents", self.query)
+        try:
+            files = self.fake.source.list_files(match.group(1) if match else '')
+        except FileNotFoundError as e:
+            content = json.dumps({'error': {'code': 404, 'message': str(e), 'errors': [{'reason': 'notFound'}]}}).encode()
+            raise HttpError(httplib2.Response({'status': 404}), content, uri='files.list')
+        page = [dict(file, md5Checksum=self.fake.checksum(file)) for file in files[self.offset:self.offset + self.page_size]]
+        with self.fake.lock:
+            self.fake.stats['pages'] += 1
+        
+        result = {'files': page}
+        if self.offset + self.page_size < len(files):
+            result['nextPageToken'] = str(self.offset + self.page_size)
+        return result
+
+class _FakeMediaRequest:
+    """files().get_media() request of FakeDriveService, consumed by MediaIoBaseDownload"""
+    
+    def __init__(self, fake, file_id):
+        self.http = fake
+        self.uri = f"https://fake-drive.local/drive/v3/files?fileId={file_id}&alt=media"
+        self.headers = {}
+
+def get_storage_backend():
+    """Get the configured storage backend: 'drive' (default), 'local' or 'fake'"""
+    backend_type = str(get_setting('data_backend', 'drive')).lower()
+    
+    if backend_type in ('local', 'fake'):
+        local_dir = get_setting('local_data_dir')
+        if not local_dir or not os.path.isdir(local_dir):
+            return None, f"⚠️ Local data folder not found: `{local_dir}`. Set LOCAL_DATA_DIR to a folder of daily sales files."
+        if backend_type == 'local':
+            return LocalDirectoryBackend(local_dir), None
+        
+        fake = FakeDriveService(
+            local_dir,
+            latency=float(get_setting('fake_drive_latency', 0.0)),
+            error_rate=float(get_setting('fake_drive_error_rate', 0.0)),
+            max_qps=int(get_setting('fake_drive_max_qps', 0)) or None,
+            page_size=int(get_setting('fake_drive_page_size', 100)),
+            drop_rate=float(get_setting('fake_drive_drop_rate', 0.0))
+        )
+        backend = DriveBackend(fake, scheduler=get_drive_scheduler())
+        backend.name = "Fake Google Drive"
+        return backend, None
+    
+    service, error = get_google_drive_service()
+    if service:
+        return DriveBackend(service, service_factory=lambda: get_google_drive_service()[0],
+                            scheduler=get_drive_scheduler()), None
+    
+    # Fall back to a local folder (e.g. a network share) when Drive isn't set up
+    local_dir = get_setting('local_data_dir')
+    if local_dir and os.path.isdir(local_dir):
+        return LocalDirectoryBackend(local_dir), None
+    return None, error
+
+def list_files_in_folder(backend, folder_id, file_pattern=None):
+    """List all Excel files in a data source folder"""
+    with perf_span("drive.list"):
+        files = backend.list_files(folder_id)
+    
+    # Filter by pattern if provided
+    if file_pattern:
+        files = [f for f in files if re.search(file_pattern, f['name'])]
+    
+    return files
+
+def md5_hexdigest(file_obj, block_size=1024 * 1024):
+    """md5 of a file object's contents, read in blocks from its current position"""
+    digest = hashlib.md5()
+    for block in iter(lambda: file_obj.read(block_size), b''):
+        digest.update(block)
+    return digest.hexdigest()
+
+def download_mismatch(file_buffer, expected_md5=None, expected_size=None):
+    """Why a download doesn't match its listed size/md5Checksum, or None if it does"""
+    size = file_buffer.seek(0, os.SEEK_END)
+    file_buffer.seek(0)
+    if expected_size is not None and size != int(expected_size):
+        return f"size {size:,} bytes, expected {int(expected_size):,}"
+    if expected_md5:
+        with perf_span("drive.verify"):
+            digest = md5_hexdigest(file_buffer)
+        file_buffer.seek(0)
+        if digest != expected_md5:
+            return f"md5 {digest}, expected {expected_md5}"
+    return None
+
+def download_file_from_drive(backend, file_id, expected_md5=None, expected_size=None):
+    """Download a file from the data source, verified against its listed size and checksum.
+    
+    A corrupt download is fetched once more before giving up with a ValueError.
+    """
+    for attempt in range(2):
+        with perf_span("drive.download"):
+            file_buffer = backend.download(file_id)
         
+        perf_count("bytes_downloaded", file_buffer.seek(0, os.SEEK_END))
         file_buffer.seek(0)
-        return file_buffer
-    except Exception as e:
-        st.error(f"Error downloading file: {str(e)}")
-        return None
+        mismatch = download_mismatch(file_buffer, expected_md5, expected_size)
+        if mismatch is None:
+            return file_buffer
+        file_buffer.close()
+        perf_count("download_mismatches")
+        logger.warning(f"Download of {file_id} failed verification: {mismatch}")
+    raise ValueError(f"Download failed verification ({mismatch})")
 
 # --- HELPER FUNCTIONS ---
 def extract_date_from_filename(filename):
@@ -329,14 +1091,365 @@ def clean_product_name(name):
         name = name[4:]
     return name.strip()
 
-def process_gdrive_files(service, folder_id, start_date=None, end_date=None):
-    """Process files from Google Drive within date range"""
+def add_sale_dates(df, filename):
+    """Add FileDate (from the filename) and Date (from Saledate or the filename)"""
+    file_date = extract_date_from_filename(filename)
+    if file_date:
+        df['FileDate'] = file_date
+    
+    if 'Saledate' in df.columns:
+        df['Date'] = pd.to_datetime(df['Saledate'])
+    elif file_date:
+        df['Date'] = file_date
+    else:
+        df['Date'] = pd.NaT
+    return df
+
+# Raw columns used by the cleaning pipeline (plus the dates added on load)
+SOURCE_COLUMNS = ['Description', 'Quantity', 'ExtendedNetAmount', 'SequenceNumber', 'Hour_ID', 'FileDate', 'Date']
+
+def select_source_columns(df):
+    """Keep only the columns the pipeline uses, with consistent (Arrow-friendly) types"""
+    df = df[[col for col in SOURCE_COLUMNS if col in df.columns]].copy()
+    for col in ('Quantity', 'ExtendedNetAmount', 'Hour_ID'):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    if 'Description' in df.columns and df['Description'].dtype == object:
+        df['Description'] = df['Description'].where(df['Description'].isna(), df['Description'].astype(str))
+    if 'SequenceNumber' in df.columns:
+        # Receipt numbers are kept as text so every file shares one type
+        seq = df['SequenceNumber']
+        if pd.api.types.is_numeric_dtype(seq):
+            seq = seq.astype('Int64')
+        df['SequenceNumber'] = seq.astype(str).where(seq.notna(), None)
+    return df
+
+# --- COLUMNAR FILE CACHE ---
+# Parsed daily files are cached as uncompressed Arrow IPC files so repeat loads
+# are a memory-mapped read instead of an Excel parse. Each cache file records the
+# source's version: its md5Checksum when the source lists one (Drive), otherwise
+# its modifiedTime/size. A re-export with identical bytes keeps its cache entries;
+# a corrected one invalidates only its own day.
+COLUMNAR_CACHE_DIR = get_setting('columnar_cache_dir', '.sales_cache')
+CACHE_FORMAT = 2  # Bump when the cached column layout or types change
+
+def file_version(file):
+    """Version stamp of a listed file used for change detection"""
+    if file.get('md5Checksum'):
+        return f"{CACHE_FORMAT}|md5:{file['md5Checksum']}|{file.get('size', '')}"
+    return f"{CACHE_FORMAT}|{file.get('modifiedTime', '')}|{file.get('size', '')}"
+
+def file_identity(file):
+    """What cache entries are keyed on: the content checksum plus file name, else the file id"""
+    if file.get('md5Checksum'):
+        return f"md5:{file['md5Checksum']}|{file['name']}"
+    return file['id']
+
+def columnar_cache_path(file):
+    key = hashlib.sha1(file_identity(file).encode()).hexdigest()
+    return os.path.join(COLUMNAR_CACHE_DIR, f"{key}.arrow")
+
+def read_columnar_cache(file):
+    """Read a cached parsed file through a memory map, or None if missing or stale"""
+    path = columnar_cache_path(file)
+    if pa is None or not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            metadata = reader.schema.metadata or {}
+            if metadata.get(b'source_version') != file_version(file).encode():
+                return None
+            return reader.read_all().to_pandas()
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable cache file {path}: {e}")
+        return None
+
+def write_columnar_cache(file, df):
+    """Write a parsed file to the columnar cache (best effort)"""
+    if pa is None:
+        return
+    path = columnar_cache_path(file)
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[b'source_version'] = file_version(file).encode()
+        table = table.replace_schema_metadata(metadata)
+        
+        os.makedirs(COLUMNAR_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning(f"Could not cache {file['name']}: {e}")
+
+def load_sales_file(backend, file):
+    """Load one daily file, from the columnar cache when it is current"""
+    with perf_span("cache.columnar_read"):
+        df = read_columnar_cache(file)
+    if df is not None:
+        perf_count("columnar_cache_hits")
+        return df
+    
+    with closing(download_file_from_drive(backend, file['id'], file.get('md5Checksum'), file.get('size'))) as file_buffer:
+        with perf_span("parse.read_excel"):
+            df = pd.read_excel(file_buffer)
+    perf_count("files_processed")
+    df = select_source_columns(add_sale_dates(df, file['name']))
+    
+    with perf_span("cache.columnar_write"):
+        write_columnar_cache(file, df)
+    return df
+
+def clean_sales_lines(combined_df):
+    """Clean and categorize sales rows (product names, revenue, category, hour)"""
+    perf_count("rows_processed", len(combined_df))
+    
+    with perf_span("clean.products"):
+        combined_df = combined_df[combined_df['Description'].notna()]
+        combined_df['Description'] = combined_df['Description'].apply(clean_product_name)
+        combined_df['Revenue'] = pd.to_numeric(combined_df['ExtendedNetAmount'], errors='coerce').fillna(0)
+        combined_df['Quantity'] = pd.to_numeric(combined_df['Quantity'], errors='coerce').fillna(0)
+    
+    with perf_span("clean.categorize"):
+        combined_df['Category'] = combined_df['Description'].apply(get_bakery_category)
+        combined_df = combined_df[combined_df['Category'] != "Ignore"]
+        combined_df['Hour'] = pd.to_numeric(combined_df['Hour_ID'], errors='coerce').fillna(0).astype(int)
+    
+    return combined_df
+
+def add_time_periods(combined_df):
+    """Add week/month/year columns derived from Date"""
+    with perf_span("clean.time_periods"):
+        combined_df['Week'] = combined_df['Date'].dt.isocalendar().week
+        combined_df['Month'] = combined_df['Date'].dt.month
+        combined_df['Year'] = combined_df['Date'].dt.year
+        combined_df['WeekYear'] = combined_df['Year'].astype(str) + '-W' + combined_df['Week'].astype(str).str.zfill(2)
+        combined_df['MonthYear'] = combined_df['Date'].dt.strftime('%Y-%m')
+        combined_df['DayName'] = combined_df['Date'].dt.day_name()
+    
+    return combined_df
+
+def clean_sales_data(combined_df):
+    """Clean, categorize and add time periods to combined sales rows"""
+    return add_time_periods(clean_sales_lines(combined_df))
+
+# --- SHARED DATA CACHE ---
+# Cleaned per-day frames and each store's assembled range (rows plus partial
+# aggregates) are shared by every session in the process, so concurrent users
+# asking for the same days hold one copy and trigger one fetch. Entries are
+# keyed by source file version and evicted LRU under SHARED_CACHE_MB. With
+# shared_cache_url set (and redis installed) a Redis server sits behind the
+# local cache so several app processes share fetches too. Cached frames are
+# read-only: callers copy before changing them.
+SHARED_CACHE_BYTES = int(get_setting('shared_cache_mb', 512)) * 1024 * 1024
+SHARED_CACHE_URL = get_setting('shared_cache_url')
+SHARED_CACHE_TTL = int(get_setting('shared_cache_ttl', 24 * 3600))
+
+class RedisDataCache:
+    """LRUCache-compatible get/put over a Redis server (values are pickled)"""
+    
+    def __init__(self, url, ttl):
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+    
+    def get(self, key):
+        try:
+            data = self.client.get(key)
+        except Exception as e:
+            logger.warning(f"Shared cache unavailable: {e}")
+            return None
+        return pickle.loads(data) if data is not None else None
     
-    # List files
-    files = list_files_in_folder(service, folder_id, file_pattern=r'\d{8}')
+    def put(self, key, value, size):
+        try:
+            self.client.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Could not write to shared cache: {e}")
+
+class SharedDataCache:
+    """In-process LRU in front of an optional remote (Redis) cache"""
+    
+    def __init__(self, local, remote=None):
+        self.local = local
+        self.remote = remote
+    
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.remote is not None:
+            value = self.remote.get(key)
+            if value is not None:
+                self.local.put(key, value, cached_value_bytes(value))
+        return value
+    
+    def put(self, key, value):
+        size = cached_value_bytes(value)
+        self.local.put(key, value, size)
+        if self.remote is not None:
+            self.remote.put(key, value, size)
+
+@st.cache_resource(show_spinner=False)
+def get_shared_data_cache():
+    """Process-wide cache of cleaned frames and aggregates shared by all sessions"""
+    remote = None
+    if SHARED_CACHE_URL and redis is not None:
+        remote = RedisDataCache(SHARED_CACHE_URL, SHARED_CACHE_TTL)
+    return SharedDataCache(LRUCache(SHARED_CACHE_BYTES), remote)
+
+def cached_value_bytes(value):
+    """Approximate in-memory size of a cached frame, or of the frames in a tuple/dict"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, dict):
+        return sum(cached_value_bytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(cached_value_bytes(item) for item in value)
+    return 64
+
+def shared_day_key(file):
+    """Shared cache key of one source file's cleaned lines"""
+    return f"day|{file_identity(file)}|{file_version(file)}"
+
+def shared_range_key(store, files):
+    """Shared cache key of one store's assembled range"""
+    digest = hashlib.sha1(store.encode())
+    for file in files:
+        digest.update(shared_day_key(file).encode())
+    return f"range|{digest.hexdigest()}"
+
+# --- SINGLE-FLIGHT FETCHES ---
+# Concurrent loads of the same source file version (same id and modifiedTime)
+# wait on one in-flight download and parse instead of each fetching it, which
+# protects the Drive quota when several sessions load the same range at once.
+class SingleFlight:
+    """Coalesce concurrent calls for the same key onto one execution"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+    
+    def do(self, key, fn):
+        """Returns (result, shared); shared is True when another caller's run was reused"""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Future()
+        if not leader:
+            return call.result(), True
+        
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result, False
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+@st.cache_resource(show_spinner=False)
+def get_fetch_flights():
+    """Process-wide in-flight fetches shared by all sessions"""
+    return SingleFlight()
+
+def fetch_day_lines(backend, file):
+    """Download, parse and clean one source file into the shared data cache.
+    
+    Only one fetch per file version runs at a time; concurrent callers share its result.
+    """
+    day_key = shared_day_key(file)
+    data_cache = get_shared_data_cache()
+    
+    def fetch():
+        # A flight that finished just before this one started may have filled the cache
+        day_df = data_cache.get(day_key)
+        if day_df is None:
+            day_df = clean_sales_lines(load_sales_file(backend, file))[LAKE_COLUMNS]
+            data_cache.put(day_key, day_df)
+        return day_df
+    
+    day_df, shared = get_fetch_flights().do(day_key, fetch)
+    if shared:
+        perf_count("singleflight_shared")
+    return day_df
+
+# --- PARTITIONED SALES LAKE ---
+# Cleaned lines are kept as Parquet partitioned by store and file date
+# (store=/year=/month=/day=). A day whose source file is unchanged is never
+# downloaded or cleaned again, and a range load reads only the partitions in
+# range, and only the columns the dashboard uses.
+SALES_LAKE_DIR = get_setting('sales_lake_dir', '.sales_lake')
+LAKE_COLUMNS = ['Date', 'Description', 'Category', 'Hour', 'Revenue', 'Quantity', 'SequenceNumber']
+LAKE_SCHEMA = pa.schema([
+    ('Date', pa.timestamp('ns')),
+    ('Description', pa.string()),
+    ('Category', pa.string()),
+    ('Hour', pa.int64()),
+    ('Revenue', pa.float64()),
+    ('Quantity', pa.float64()),
+    ('SequenceNumber', pa.string())
+]) if pa else None
+
+def lake_partition_path(store, file):
+    """Partition file for one source file, or None when the lake is disabled"""
+    file_date = extract_date_from_filename(file['name'])
+    if pa is None or not SALES_LAKE_DIR or not file_date:
+        return None
+    store_key = re.sub(r'[^\w-]', '_', store)
+    key = hashlib.sha1(file['id'].encode()).hexdigest()[:16]
+    return os.path.join(
+        SALES_LAKE_DIR, f"store={store_key}", f"year={file_date.year}",
+        f"month={file_date.month:02d}", f"day={file_date.day:02d}", f"{key}.parquet"
+    )
+
+def lake_partition_current(path, file):
+    """Whether a partition exists and was written from this version of the file"""
+    if not os.path.exists(path):
+        return False
+    try:
+        metadata = pa.parquet.read_schema(path).metadata or {}
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable lake partition {path}: {e}")
+        return False
+    return metadata.get(b'source_version') == file_version(file).encode()
+
+def write_lake_partition(path, file, df):
+    """Write one file's cleaned lines to its partition (best effort, returns success)"""
+    try:
+        table = pa.Table.from_pandas(df[LAKE_COLUMNS], schema=LAKE_SCHEMA, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[b'source_version'] = file_version(file).encode()
+        table = table.replace_schema_metadata(metadata)
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pa.parquet.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        logger.warning(f"Could not write lake partition for {file['name']}: {e}")
+        return False
+
+def read_lake_partitions(paths):
+    """Read the given partitions (one frame per path), projecting only the dashboard's columns"""
+    dataset = pa.dataset.dataset(paths, schema=LAKE_SCHEMA, format='parquet')
+    tables = {fragment.path: fragment.to_table(columns=LAKE_COLUMNS, schema=LAKE_SCHEMA) for fragment in dataset.get_fragments()}
+    return [tables[path].to_pandas() for path in paths]
+
+def list_folder_files(backend, folder_id, start_date=None, end_date=None):
+    """List one folder's daily files within date range; returns (files, error)"""
+    try:
+        files = list_files_in_folder(backend, folder_id, file_pattern=r'\d{8}')
+    except Exception as e:
+        return [], f"Error listing files: {str(e)}"
     
     if not files:
-        return pd.DataFrame(), "No files found in the folder"
+        return [], "No files found in the folder"
     
     # Filter by date range if provided
     if start_date or end_date:
@@ -352,145 +1465,1056 @@ def process_gdrive_files(service, folder_id, start_date=None, end_date=None):
         files = filtered_files
     
     if not files:
-        return pd.DataFrame(), "No files found in the selected date range"
-    
-    # Download and process files
-    all_data = []
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    for idx, file in enumerate(files):
-        status_text.text(f"Loading {file['name']}... ({idx+1}/{len(files)})")
-        
-        file_buffer = download_file_from_drive(service, file['id'])
-        if file_buffer:
-            try:
-                df = pd.read_excel(file_buffer)
-                file_date = extract_date_from_filename(file['name'])
-                if file_date:
-                    df['FileDate'] = file_date
-                
-                if 'Saledate' in df.columns:
-                    df['Date'] = pd.to_datetime(df['Saledate'])
-                elif file_date:
-                    df['Date'] = file_date
-                else:
-                    df['Date'] = pd.NaT
-                
-                all_data.append(df)
-            except Exception as e:
-                st.warning(f"Could not process {file['name']}: {str(e)}")
-        
-        progress_bar.progress((idx + 1) / len(files))
-    
-    progress_bar.empty()
-    status_text.empty()
-    
-    if not all_data:
-        return pd.DataFrame(), "Could not process any files"
-    
-    # Combine and clean
-    combined_df = pd.concat(all_data, ignore_index=True)
-    combined_df = combined_df[combined_df['Description'].notna()]
-    combined_df['Description'] = combined_df['Description'].apply(clean_product_name)
-    combined_df['Revenue'] = pd.to_numeric(combined_df['ExtendedNetAmount'], errors='coerce').fillna(0)
-    combined_df['Quantity'] = pd.to_numeric(combined_df['Quantity'], errors='coerce').fillna(0)
-    combined_df['Category'] = combined_df['Description'].apply(get_bakery_category)
-    combined_df = combined_df[combined_df['Category'] != "Ignore"]
-    combined_df['Hour'] = pd.to_numeric(combined_df['Hour_ID'], errors='coerce').fillna(0).astype(int)
-    
-    # Add time periods
-    combined_df['Week'] = combined_df['Date'].dt.isocalendar().week
-    combined_df['Month'] = combined_df['Date'].dt.month
-    combined_df['Year'] = combined_df['Date'].dt.year
-    combined_df['WeekYear'] = combined_df['Year'].astype(str) + '-W' + combined_df['Week'].astype(str).str.zfill(2)
-    combined_df['MonthYear'] = combined_df['Date'].dt.strftime('%Y-%m')
-    combined_df['DayName'] = combined_df['Date'].dt.day_name()
-    
-    return combined_df, None
+        return [], "No files found in the selected date range"
+    return files, None
 
-def process_files(uploaded_files):
-    """Process manually uploaded files (fallback)"""
-    if not uploaded_files:
-        return pd.DataFrame()
-    
-    all_data = []
+def load_files(backend, files, on_progress=None, store='Main'):
+    """Load and clean the given daily files (no Streamlit calls).
     
-    for file in uploaded_files:
+    Returns (df, error, warnings). Each day comes from the shared data cache, the
+    sales lake, or a fresh download, in that order, and fresh days are added to both.
+    """
+    warnings = []
+    data_cache = get_shared_data_cache()
+    day_frames, lake_days = {}, {}
+    load_start = time.perf_counter()
+    for idx, file in enumerate(files):
         try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file, encoding='cp1252')
-            else:
-                df = pd.read_excel(file)
-            
-            file_date = extract_date_from_filename(file.name)
-            if file_date:
-                df['FileDate'] = file_date
-            
-            if 'Saledate' in df.columns:
-                df['Date'] = pd.to_datetime(df['Saledate'])
-            elif file_date:
-                df['Date'] = file_date
+            day_key = shared_day_key(file)
+            day_df = data_cache.get(day_key)
+            path = lake_partition_path(store, file) if day_df is None else None
+            if day_df is not None:
+                perf_count("shared_cache_hits")
+                day_frames[day_key] = day_df
+            elif path is not None and lake_partition_current(path, file):
+                perf_count("lake_partition_hits")
+                lake_days[day_key] = path
             else:
-                df['Date'] = pd.NaT
-            
-            all_data.append(df)
-            
+                perf_count("shared_cache_misses")
+                day_df = fetch_day_lines(backend, file)
+                if path is not None:
+                    with perf_span("lake.write"):
+                        write_lake_partition(path, file, day_df)
+                day_frames[day_key] = day_df
         except Exception as e:
-            st.warning(f"⚠️ Could not process {file.name}: {str(e)}")
-            continue
+            warnings.append(f"Could not process {file['name']}: {str(e)}")
+        
+        if on_progress:
+            on_progress(file['name'], idx + 1, len(files))
     
-    if not all_data:
-        return pd.DataFrame()
+    record_span("load.files", time.perf_counter() - load_start)
     
-    combined_df = pd.concat(all_data, ignore_index=True)
-    combined_df = combined_df[combined_df['Description'].notna()]
-    combined_df['Description'] = combined_df['Description'].apply(clean_product_name)
-    combined_df['Revenue'] = pd.to_numeric(combined_df['ExtendedNetAmount'], errors='coerce').fillna(0)
-    combined_df['Quantity'] = pd.to_numeric(combined_df['Quantity'], errors='coerce').fillna(0)
-    combined_df['Category'] = combined_df['Description'].apply(get_bakery_category)
-    combined_df = combined_df[combined_df['Category'] != "Ignore"]
-    combined_df['Hour'] = pd.to_numeric(combined_df['Hour_ID'], errors='coerce').fillna(0).astype(int)
-    
-    combined_df['Week'] = combined_df['Date'].dt.isocalendar().week
-    combined_df['Month'] = combined_df['Date'].dt.month
-    combined_df['Year'] = combined_df['Date'].dt.year
-    combined_df['WeekYear'] = combined_df['Year'].astype(str) + '-W' + combined_df['Week'].astype(str).str.zfill(2)
-    combined_df['MonthYear'] = combined_df['Date'].dt.strftime('%Y-%m')
-    combined_df['DayName'] = combined_df['Date'].dt.day_name()
+    if lake_days:
+        with perf_span("lake.read"):
+            lake_frames = read_lake_partitions(list(lake_days.values()))
+        for day_key, day_df in zip(lake_days, lake_frames):
+            data_cache.put(day_key, day_df)
+            day_frames[day_key] = day_df
     
-    return combined_df
+    if not day_frames:
+        return pd.DataFrame(), "Could not process any files", warnings
+    
+    # Combine in file order; concat always copies, so cached day frames stay untouched
+    frames = [day_frames[key] for key in map(shared_day_key, files) if key in day_frames]
+    combined_df = pd.concat(frames, ignore_index=True)
+    return add_time_periods(combined_df), None, warnings
 
-# --- MAIN APP ---
-st.markdown("""
-<div class="main-header">
-    <div style="display: flex; align-items: center; justify-content: space-between;">
-        <div>
-            <h1 class="main-title">🌾 Your Business</h1>
-            <p class="main-subtitle">SALES ANALYTICS DASHBOARD</p>
-        </div>
-        <div style="font-size: 80px; opacity: 0.3;">🥖</div>
-    </div>
-</div>
-""", unsafe_allow_html=True)
+def load_folder(backend, folder_id, start_date=None, end_date=None, on_progress=None, store='Main'):
+    """Load and clean one folder's daily files within date range.
+    
+    Makes no Streamlit calls, so it can run on a worker thread. Returns
+    (df, error, warnings); on_progress(file_name, done, total) is called per file.
+    Unchanged days are read back from the shared data cache or the sales lake.
+    """
+    files, error = list_folder_files(backend, folder_id, start_date, end_date)
+    if error:
+        return pd.DataFrame(), error, []
+    return load_files(backend, files, on_progress, store)
 
-# --- SIDEBAR: DATA SOURCE ---
-st.sidebar.header("📁 Data Source")
+# --- MULTI-STORE INGESTION ---
+# Each store has its own folder of daily files. Stores load concurrently, each
+# worker also builds that store's partial aggregates, and the partials are merged
+# with an associative reduce so chain totals never need the combined rows.
+MAX_LOAD_WORKERS = int(get_setting('max_load_workers', 4))
 
-# Hardcoded Google Drive Folder ID for Your Business Sales Data
-SALES_FOLDER_ID = "YOUR_GOOGLE_DRIVE_FOLDER_ID_HERE"
+def get_store_folders():
+    """Store name -> folder id, from the sales_folders setting (table or JSON)"""
+    folders = get_setting('sales_folders')
+    if isinstance(folders, str):
+        folders = json.loads(folders)
+    return dict(folders) if folders else {'Main': SALES_FOLDER_ID}
+
+def summarize_store(df, store):
+    """Partial aggregates for one store's rows"""
+    revenue = df['Revenue'].sum()
+    units = df['Quantity'].sum()
+    return {
+        'revenue': revenue,
+        'units': units,
+        'rows': len(df),
+        'by_store': pd.DataFrame({'Revenue': [revenue], 'Quantity': [units]}, index=pd.Index([store], name='Store')),
+        'by_product': df.groupby('Description')[['Revenue', 'Quantity']].sum(),
+        'by_category': df.groupby('Category')[['Revenue', 'Quantity']].sum(),
+        'by_date': df.groupby('Date')[['Revenue', 'Quantity']].sum()
+    }
 
-# Check for service account
-service, error = get_google_drive_service()
+def merge_store_summaries(left, right):
+    """Combine two partial aggregates (associative, so stores can merge in any grouping)"""
+    merged = {}
+    for key, value in left.items():
+        if isinstance(value, pd.DataFrame):
+            merged[key] = value.add(right[key], fill_value=0)
+        else:
+            merged[key] = value + right[key]
+    return merged
 
-if service:
-    st.sidebar.success("✅ Google Drive Connected")
+def load_store(backend, store, folder_id, start_date, end_date, on_progress):
+    """Load one store's folder and build its partial aggregates (worker thread).
     
-    # Use hardcoded folder ID
-    st.session_state.folder_id = TMB_SALES_FOLDER_ID
+    Returns (df, summary, error, warnings, shared); shared is True when the range
+    came whole from the shared data cache (and so is already in the sales history).
+    """
+    files, error = list_folder_files(backend, folder_id, start_date, end_date)
+    if error:
+        return pd.DataFrame(), None, error, [], False
     
-    # Show folder location (read-only info)
-    st.sidebar.info(f"📂 Data Folder: `{TMB_SALES_FOLDER_ID[:15]}...`")
+    data_cache = get_shared_data_cache()
+    range_key = shared_range_key(store, files)
+    cached = data_cache.get(range_key)
+    if cached is not None:
+        perf_count("shared_range_hits")
+        if on_progress:
+            on_progress(files[-1]['name'], len(files), len(files))
+        return cached['df'], cached['summary'], None, [], True
+    
+    df, error, warnings = load_files(backend, files, on_progress, store)
+    if error or df.empty:
+        return df, None, error, warnings, False
+    df['Store'] = store
+    with perf_span("stores.summarize"):
+        summary = summarize_store(df, store)
+    if not warnings:
+        data_cache.put(range_key, {'df': df, 'summary': summary})
+    return df, summary, None, warnings, False
+
+def load_store_folders(backend, store_folders, start_date=None, end_date=None, on_progress=None):
+    """Load every store's folder concurrently and record it in the sales history.
+    
+    Makes no Streamlit calls, so it can run as a background job. Returns
+    (df, error, chain_summary, warnings); on_progress(done, total) is called with
+    the files processed across all stores.
+    """
+    progress = {store: (0, 1) for store in store_folders}
+    progress_lock = threading.Lock()
+    
+    def track_progress(store):
+        def on_file(file_name, done, total):
+            with progress_lock:
+                progress[store] = (done, total)
+                files_done = sum(d for d, _ in progress.values())
+                files_total = sum(t for _, t in progress.values())
+            if on_progress:
+                on_progress(files_done, files_total)
+        return on_file
+    
+    metrics = get_perf_metrics()
+    with perf_span("stores.load"):
+        if len(store_folders) == 1:
+            store, folder_id = next(iter(store_folders.items()))
+            results = {store: load_store(backend, store, folder_id, start_date, end_date, track_progress(store))}
+        else:
+            with ThreadPoolExecutor(max_workers=MAX_LOAD_WORKERS) as executor:
+                futures = {
+                    store: executor.submit(run_with_perf_metrics, metrics, load_store, backend, store, folder_id,
+                                           start_date, end_date, track_progress(store))
+                    for store, folder_id in store_folders.items()
+                }
+            results = {store: future.result() for store, future in futures.items()}
+    
+    frames, fresh_frames, summaries, errors, warnings = [], [], [], [], []
+    prefix = len(store_folders) > 1
+    for store, (df, summary, error, store_warnings, shared) in results.items():
+        warnings.extend(f"{store}: {warning}" if prefix else warning for warning in store_warnings)
+        if error:
+            errors.append(f"{store}: {error}" if prefix else error)
+        elif summary is not None:
+            frames.append(df)
+            summaries.append(summary)
+            if not shared:
+                fresh_frames.append((store, df))
+    
+    if not frames:
+        return pd.DataFrame(), "; ".join(errors) or "No data found", None, warnings
+    warnings.extend(errors)
+    
+    with perf_span("stores.merge"):
+        chain_summary = reduce(merge_store_summaries, summaries)
+    for store, fresh_df in fresh_frames:
+        history_error = upsert_sales_history(fresh_df)
+        if history_error:
+            warnings.append(f"{store}: {history_error}" if prefix else history_error)
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    return df, None, chain_summary, warnings
+
+# --- BACKGROUND LOAD JOBS ---
+# Loads run on a process-wide worker pool instead of inside the script run, so
+# the page stays interactive. Each session keeps its jobs in
+# st.session_state.load_jobs (one per slot: 'main', 'period2'); the script polls
+# them on every rerun, and starting a job for a new range cancels the old one.
+# A cancelled job that is still queued never starts; a running one stops at
+# the next file.
+MAX_LOAD_JOBS = int(get_setting('max_load_jobs', 4))
+LOAD_POLL_SECONDS = 0.5
+
+class LoadCancelled(Exception):
+    """Raised inside a load job once it has been cancelled"""
+
+class LoadJob:
+    """One background load of a date range for one session"""
+    
+    def __init__(self, key):
+        self.key = key
+        self.cancel_event = threading.Event()
+        self.files_done = 0
+        self.files_total = 0
+        self.started = time.perf_counter()
+        self.future = None
+    
+    def report(self, done, total):
+        """Progress callback for the worker; stops the load once cancelled"""
+        if self.cancel_event.is_set():
+            raise LoadCancelled()
+        self.files_done, self.files_total = done, total
+    
+    def cancel(self):
+        """Stop the job; one still queued on the pool never starts"""
+        self.cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+    
+    @property
+    def running(self):
+        return not self.cancel_event.is_set() and not self.future.done()
+    
+    def fraction(self):
+        return min(self.files_done / self.files_total, 1.0) if self.files_total else 0.0
+    
+    def outcome(self):
+        """(df, error, chain_summary, warnings) of a finished job"""
+        try:
+            return self.future.result()
+        except Exception as e:
+            return pd.DataFrame(), f"Error loading data: {str(e)}", None, []
+
+@st.cache_resource
+def get_load_pool():
+    """Worker pool shared by every session's load jobs"""
+    return ThreadPoolExecutor(max_workers=MAX_LOAD_JOBS, thread_name_prefix="load-job")
+
+def load_job_key(store_folders, start_date, end_date):
+    """What a job loads; a different key means the requested range changed"""
+    return (tuple(sorted(store_folders.items())), pd.Timestamp(start_date), pd.Timestamp(end_date))
+
+def run_load_job(job, backend, store_folders, start_date, end_date):
+    """Body of a load job (worker thread)"""
+    if job.cancel_event.is_set():
+        raise LoadCancelled()  # Cancelled between being picked up and starting; skip the listing
+    with perf_span("load.job"):
+        return load_store_folders(backend, store_folders, start_date, end_date, on_progress=job.report)
+
+def submit_load_job(backend, store_folders, start_date, end_date):
+    """Start loading a range on the worker pool and return its job"""
+    job = LoadJob(load_job_key(store_folders, start_date, end_date))
+    job.future = get_load_pool().submit(run_with_perf_metrics, get_perf_metrics(), run_load_job,
+                                        job, backend, store_folders, pd.Timestamp(start_date), pd.Timestamp(end_date))
+    return job
+
+def start_load_job(slot, backend, store_folders, start_date, end_date):
+    """Start this session's job for slot, cancelling the one it replaces"""
+    jobs = st.session_state.setdefault('load_jobs', {})
+    if slot in jobs:
+        jobs[slot].cancel()
+        perf_count("load_jobs_cancelled")
+    jobs[slot] = submit_load_job(backend, store_folders, start_date, end_date)
+    perf_count("load_jobs_started")
+    return jobs[slot]
+
+def cancel_load_jobs():
+    """Cancel and forget every job of this session"""
+    for job in st.session_state.pop('load_jobs', {}).values():
+        job.cancel()
+
+def follow_load_job(slot, label):
+    """Show a running job's progress; returns the job (and forgets it) once finished.
+    
+    The actual polling rerun happens at the end of the script, so the rest of the
+    page renders normally while the job runs.
+    """
+    jobs = st.session_state.get('load_jobs', {})
+    job = jobs.get(slot)
+    if job is None:
+        return None
+    if job.running:
+        progress_col, stop_col = st.columns([5, 1])
+        with progress_col:
+            st.progress(job.fraction(), text=f"{label}... ({job.files_done}/{job.files_total} files)")
+        with stop_col:
+            if st.button("⏹️ Stop", key=f"stop_load_{slot}", use_container_width=True):
+                jobs.pop(slot).cancel()
+                perf_count("load_jobs_cancelled")
+                st.rerun()
+        return None
+    jobs.pop(slot)
+    if job.cancel_event.is_set():
+        return None
+    record_span("load.wait", time.perf_counter() - job.started)
+    return job
+
+# --- SALES HISTORY DATABASE ---
+# Optional embedded database of every cleaned line item loaded so far, so long
+# historical questions are a SQL query instead of hundreds of Drive downloads.
+# DuckDB is used for *.duckdb paths when installed, SQLite otherwise.
+SALES_DB_PATH = get_setting('sales_db_path')
+HISTORY_COLUMNS = ['Store', 'Date', 'Month', 'Description', 'Category', 'Hour', 'SequenceNumber', 'Revenue', 'Quantity']
+
+@st.cache_resource(show_spinner=False)
+def get_history_lock():
+    """Process-wide lock serializing history writes from every session and load job"""
+    return threading.Lock()
+
+HISTORY_LOCK = get_history_lock()
+
+def history_uses_duckdb():
+    return duckdb is not None and str(SALES_DB_PATH).endswith('.duckdb')
+
+def connect_history():
+    """Open the sales history database, creating the table on first use"""
+    if history_uses_duckdb():
+        con = duckdb.connect(SALES_DB_PATH)
+    else:
+        con = sqlite3.connect(SALES_DB_PATH, timeout=30)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS sales_lines (
+            Store TEXT, Date TEXT, Month TEXT, Description TEXT, Category TEXT,
+            Hour INTEGER, SequenceNumber TEXT, Revenue DOUBLE, Quantity DOUBLE
+        )
+    """)
+    con.execute("CREATE INDEX IF NOT EXISTS sales_lines_date ON sales_lines (Date, Store)")
+    return con
+
+def upsert_sales_history(df):
+    """Replace the stored rows of every (Store, Date) partition present in df; returns an error message or None"""
+    if not SALES_DB_PATH or df.empty:
+        return None
+    
+    frame = pd.DataFrame({
+        'Store': df['Store'].astype(str) if 'Store' in df.columns else 'Main',
+        'Date': df['Date'].dt.strftime('%Y-%m-%d'),
+        'Month': df['Date'].dt.strftime('%Y-%m'),
+        'Description': df['Description'],
+        'Category': df['Category'],
+        'Hour': df['Hour'],
+        'SequenceNumber': df['SequenceNumber'].astype(str) if 'SequenceNumber' in df.columns else None,
+        'Revenue': df['Revenue'],
+        'Quantity': df['Quantity']
+    })[HISTORY_COLUMNS]
+    partitions = list(frame[['Store', 'Date']].drop_duplicates().itertuples(index=False, name=None))
+    
+    try:
+        with perf_span("history.upsert"), HISTORY_LOCK, closing(connect_history()) as con:
+            con.execute("BEGIN TRANSACTION")
+            con.executemany("DELETE FROM sales_lines WHERE Store = ? AND Date = ?", partitions)
+            if history_uses_duckdb():
+                con.register('incoming_lines', frame)
+                con.execute("INSERT INTO sales_lines SELECT * FROM incoming_lines")
+                con.unregister('incoming_lines')
+            else:
+                placeholders = ', '.join('?' * len(HISTORY_COLUMNS))
+                con.executemany(f"INSERT INTO sales_lines VALUES ({placeholders})", frame.itertuples(index=False, name=None))
+            con.execute("COMMIT")
+        perf_count("history_rows_upserted", len(frame))
+    except Exception as e:
+        logger.warning(f"Could not update sales history: {e}")
+        return f"Sales history not updated for {len(partitions)} day(s), so 📚 Sales History is missing them: {e}"
+    return None
+
+@st.cache_data(ttl=300, show_spinner=False)
+def query_sales_history(sql, params=(), db_version=None):
+    """Run a read query against the sales history (db_version busts the cache after writes)"""
+    with closing(connect_history()) as con:
+        if history_uses_duckdb():
+            return con.execute(sql, list(params)).df()
+        return pd.read_sql_query(sql, con, params=list(params))
+
+def sales_history_version():
+    """Modification stamp of the history database, or None if it doesn't exist yet"""
+    if SALES_DB_PATH and os.path.exists(SALES_DB_PATH):
+        return os.stat(SALES_DB_PATH).st_mtime_ns
+    return None
+
+# --- CSV INGESTION ---
+# Only these columns are read from POS CSV exports; measures get explicit dtypes
+# so nothing is inferred column by column
+CSV_COLUMNS = ['Saledate', 'Description', 'Quantity', 'ExtendedNetAmount', 'SequenceNumber', 'Hour_ID']
+CSV_DTYPES = {
+    'Description': 'object',
+    'Quantity': 'float64',
+    'ExtendedNetAmount': 'float64',
+    'Hour_ID': 'float64'
+}
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+def detect_encoding(content):
+    """Detect a CSV's encoding once from a leading sample (UTF-8 if it decodes, else cp1252)"""
+    if content.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    sample = content[:ENCODING_SAMPLE_BYTES]
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the end of the sample is still UTF-8
+        if len(sample) == ENCODING_SAMPLE_BYTES and e.start >= len(sample) - 3:
+            return 'utf-8'
+        return 'cp1252'
+
+def read_sales_csv(file):
+    """Read a POS CSV export with the pyarrow engine, projecting and typing the needed columns"""
+    content = file.getvalue()
+    encoding = detect_encoding(content)
+    
+    header = pd.read_csv(io.BytesIO(content), encoding=encoding, nrows=0).columns
+    usecols = [col for col in CSV_COLUMNS if col in header]
+    dtype = {col: kind for col, kind in CSV_DTYPES.items() if col in usecols}
+    
+    if pa is not None:
+        try:
+            return pd.read_csv(io.BytesIO(content), engine='pyarrow', encoding=encoding, usecols=usecols, dtype=dtype)
+        except Exception as e:
+            # Dirty values in a typed column; fall back to the tolerant C parser
+            logger.warning(f"pyarrow CSV read failed for {file.name}, falling back: {e}")
+    return pd.read_csv(io.BytesIO(content), encoding=encoding, usecols=usecols)
+
+# --- UPLOAD DE-DUPLICATION ---
+LINE_ITEM_KEY = ['Date', 'SequenceNumber', 'Description']
+
+def upload_content_hash(file):
+    """SHA-256 of an uploaded file's bytes"""
+    return hashlib.sha256(file.getvalue()).hexdigest()
+
+def upload_signature(uploaded_files):
+    """Identify a set of uploads by content, independent of order and file names"""
+    return tuple(sorted(upload_content_hash(file) for file in uploaded_files))
+
+def add_line_occurrence(df):
+    """Number repeated (Date, SequenceNumber, Description) lines within one file.
+    
+    A basket can legitimately contain the same product on several lines, so the
+    occurrence number keeps those apart while identical lines from overlapping
+    files still collide.
+    """
+    if all(col in df.columns for col in LINE_ITEM_KEY):
+        df['LineOccurrence'] = df.groupby(LINE_ITEM_KEY, sort=False, dropna=False).cumcount()
+    return df
+
+def drop_duplicate_line_items(combined_df):
+    """Drop line items repeated across files, using row hashes instead of a sort"""
+    if 'LineOccurrence' not in combined_df.columns:
+        return combined_df, 0
+    
+    with perf_span("upload.dedup"):
+        key_columns = LINE_ITEM_KEY + ['LineOccurrence']
+        row_hashes = pd.util.hash_pandas_object(combined_df[key_columns], index=False)
+        duplicated = row_hashes.duplicated().to_numpy()
+        combined_df = combined_df[~duplicated].drop(columns='LineOccurrence')
+    
+    return combined_df, int(duplicated.sum())
+
+def process_files(uploaded_files):
+    """Process manually uploaded files (fallback)"""
+    if not uploaded_files:
+        return pd.DataFrame()
+    
+    # Parsed uploads keyed by content hash, so unchanged files aren't parsed again
+    upload_cache = st.session_state.setdefault('upload_cache', {})
+    all_data = []
+    seen_hashes = set()
+    
+    for file in uploaded_files:
+        content_hash = upload_content_hash(file)
+        if content_hash in seen_hashes:
+            continue  # Same file uploaded twice under different names
+        seen_hashes.add(content_hash)
+        
+        if content_hash in upload_cache:
+            perf_count("upload_cache_hits")
+            all_data.append(upload_cache[content_hash])
+            continue
+        
+        try:
+            with perf_span("parse.upload"):
+                if file.name.endswith('.csv'):
+                    df = read_sales_csv(file)
+                else:
+                    df = pd.read_excel(file)
+            perf_count("bytes_uploaded", file.size)
+            perf_count("files_processed")
+            
+            df = add_line_occurrence(select_source_columns(add_sale_dates(df, file.name)))
+            upload_cache[content_hash] = df
+            all_data.append(df)
+            
+        except Exception as e:
+            st.warning(f"⚠️ Could not process {file.name}: {str(e)}")
+            continue
+    
+    # Forget files that are no longer uploaded
+    for content_hash in list(upload_cache):
+        if content_hash not in seen_hashes:
+            del upload_cache[content_hash]
+    
+    if not all_data:
+        return pd.DataFrame()
+    
+    combined_df = pd.concat(all_data, ignore_index=True)
+    combined_df, duplicates = drop_duplicate_line_items(combined_df)
+    st.session_state.upload_duplicates_removed = duplicates
+    perf_count("duplicate_rows_dropped", duplicates)
+    return clean_sales_data(combined_df)
+
+# --- ROLLUP TABLES ---
+# Weekly and monthly views read small pre-aggregated tables (one row per store,
+# period and product) instead of grouping every line item on each rerun. Revenue
+# is summed in integer cents, so every rollup total equals the line-item total
+# exactly, whatever the grouping.
+ROLLUP_KEYS = ['Store', 'Date', 'Category', 'Description']
+ROLLUP_MEASURES = ['RevenueCents', 'Quantity', 'Lines']
+
+def revenue_cents(revenue):
+    """Revenue in integer cents"""
+    return (revenue * 100).round().astype('int64')
+
+def rollup_lines(df):
+    """Line items reduced to the rollup keys and measures"""
+    return pd.DataFrame({
+        'Store': df['Store'] if 'Store' in df.columns else '',
+        'Date': df['Date'],
+        'Category': df['Category'],
+        'Description': df['Description'],
+        'RevenueCents': revenue_cents(df['Revenue']),
+        'Quantity': df['Quantity'],
+        'Lines': 1
+    })
+
+def group_rollup(rollup, period_column, period_values):
+    """Re-aggregate the daily rollup to a coarser period"""
+    keys = ['Store', period_column, 'Category', 'Description']
+    return rollup.assign(**{period_column: period_values}).groupby(keys)[ROLLUP_MEASURES].sum().reset_index()
+
+def day_content_hashes(df):
+    """Order-independent hash of every store/day's line items (keys, cents and units)"""
+    stores = df['Store'] if 'Store' in df.columns else pd.Series('', index=df.index)
+    line_hashes = pd.util.hash_pandas_object(pd.DataFrame({
+        'Store': stores,
+        'Date': df['Date'],
+        'Category': df['Category'],
+        'Description': df['Description'],
+        'RevenueCents': revenue_cents(df['Revenue']),
+        'Quantity': df['Quantity']
+    }), index=False)
+    days = pd.MultiIndex.from_arrays([stores, df['Date']], names=['Store', 'Date'])
+    return line_hashes.groupby(days).sum(), days  # uint64 sums wrap, so totals stay exact hashes
+
+def update_rollups(rollups, df):
+    """Bring the day, ISO-week and month rollups up to date with df.
+    
+    A store/day is regrouped from line items only when its content hash differs
+    from the previous rollup's, so corrected exports that move revenue between
+    products are picked up while untouched days are reused. Week and month
+    rollups are derived from the (small) daily rollup.
+    """
+    day_keys = ['Store', 'Date']
+    with perf_span("rollup.hash"):
+        day_hashes, line_days = day_content_hashes(df)
+    
+    daily = (rollups or {}).get('day')
+    previous_hashes = (rollups or {}).get('day_hashes')
+    if daily is not None and previous_hashes is not None and not daily.empty:
+        common = day_hashes.index.intersection(previous_hashes.index)
+        unchanged = common[day_hashes[common].to_numpy() == previous_hashes[common].to_numpy()]
+        kept = daily[pd.MultiIndex.from_frame(daily[day_keys]).isin(unchanged)]
+    else:
+        unchanged = day_hashes.index[:0]
+        kept = None
+    
+    # Only lines of new or changed days are reduced to rollup lines
+    stale_lines = rollup_lines(df[~line_days.isin(unchanged)])
+    with perf_span("rollup.daily"):
+        rebuilt = stale_lines.groupby(ROLLUP_KEYS)[ROLLUP_MEASURES].sum().reset_index()
+    perf_count("rollup_days_rebuilt", len(day_hashes) - len(unchanged))
+    
+    daily = pd.concat([kept, rebuilt]) if kept is not None else rebuilt
+    daily = daily.sort_values(ROLLUP_KEYS, ignore_index=True)
+    
+    iso = daily['Date'].dt.isocalendar()
+    return {
+        'day': daily,
+        'day_hashes': day_hashes,
+        'week': group_rollup(daily, 'Week', iso['year'].astype(str) + '-W' + iso['week'].astype(str).str.zfill(2)),
+        'month': group_rollup(daily, 'Month', daily['Date'].dt.strftime('%Y-%m'))
+    }
+
+def filter_rollup(rollup, store="All Stores", category="All Categories", product="All Products"):
+    """Rollup rows matching the sidebar store and quick filters"""
+    mask = pd.Series(True, index=rollup.index)
+    if store != "All Stores":
+        mask &= rollup['Store'] == store
+    if category != "All Categories":
+        mask &= rollup['Category'] == category
+    if product != "All Products":
+        mask &= rollup['Description'] == product
+    return rollup[mask]
+
+def rollup_sums(rollup, by):
+    """Revenue/Quantity totals of a rollup grouped by the given column(s)"""
+    sums = rollup.groupby(by)[['RevenueCents', 'Quantity']].sum()
+    sums.insert(0, 'Revenue', sums.pop('RevenueCents') / 100)
+    return sums
+
+def rollup_revenue(rollup):
+    """Exact revenue total of a rollup"""
+    return int(rollup['RevenueCents'].sum()) / 100
+
+# --- TRANSACTION INDEX ---
+# A transaction is a (store, day, SequenceNumber) triple. The index keeps the
+# sorted distinct receipt codes of every store/day/product, so a filtered count
+# is the size of a union of small sets rather than a nunique over every line.
+# Per-month HyperLogLog sketches per category give approximate counts for
+# multi-year spans.
+TRANSACTION_COUNT_MODE = get_setting('transaction_count_mode', 'auto')  # exact, approx or auto
+HLL_MIN_DAYS = 366  # auto mode uses the sketches beyond this span
+HLL_PRECISION = 12  # 4096 registers per sketch, ~1.6% standard error
+
+def hll_registers(hashes, groups, n_groups):
+    """HyperLogLog registers for each group from 64-bit hashes"""
+    m = 1 << HLL_PRECISION
+    bits = 64 - HLL_PRECISION
+    slots = (hashes >> np.uint64(bits)).astype(np.int64)
+    rest = hashes & np.uint64((1 << bits) - 1)
+    # frexp gives the exact bit length since rest < 2**53
+    ranks = (bits + 1 - np.frexp(rest.astype(np.float64))[1]).astype(np.uint8)
+    registers = np.zeros(n_groups * m, dtype=np.uint8)
+    np.maximum.at(registers, groups * m + slots, ranks)
+    return registers.reshape(n_groups, m)
+
+def hll_estimate(registers):
+    """Cardinality estimate from (merged) HyperLogLog registers"""
+    m = len(registers)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.exp2(-registers.astype(np.float64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * np.log(m / zeros)  # Small-range correction
+    return int(round(estimate))
+
+def build_transaction_index(df):
+    """Distinct receipt sets per store/day/product, plus monthly category sketches (needs SequenceNumber)"""
+    lines = pd.DataFrame({
+        'Store': df['Store'] if 'Store' in df.columns else '',
+        'Date': df['Date'],
+        'Category': df['Category'],
+        'Description': df['Description'],
+        'Receipt': pd.factorize(df['SequenceNumber'])[0]
+    })
+    lines = lines[lines['Receipt'] >= 0]  # -1 marks a missing SequenceNumber
+    lines['Day'] = lines.groupby(['Store', 'Date'], sort=True).ngroup()
+    
+    # One row per (day, product, receipt), sorted so each product's set is contiguous
+    receipts = lines.drop_duplicates(['Day', 'Description', 'Receipt'])
+    receipts = receipts.sort_values(['Day', 'Description', 'Receipt'], ignore_index=True)
+    receipt_codes = int(lines['Receipt'].max()) + 1 if len(lines) else 0
+    day_receipts = receipts['Day'].to_numpy(np.int64) * receipt_codes + receipts['Receipt'].to_numpy()
+    day_counts = pd.Series(day_receipts).drop_duplicates().groupby(receipts['Day']).size()
+    
+    month = (receipts['Date'].dt.year * 100 + receipts['Date'].dt.month).rename('Month')
+    sketch_groups = receipts.groupby(['Store', month, 'Category'])
+    hashes = pd.util.hash_array(day_receipts)
+    sketches = hll_registers(hashes, sketch_groups.ngroup().to_numpy(), sketch_groups.ngroups)
+    
+    return {
+        'receipts': receipts,
+        'day_counts': day_counts,
+        'receipt_codes': receipt_codes,
+        'sketch_keys': sketch_groups.size().reset_index()[['Store', 'Month', 'Category']],
+        'sketches': sketches
+    }
+
+def use_approximate_count(days_span, product="All Products"):
+    """Whether transaction counts should come from the HyperLogLog sketches"""
+    if product != "All Products":
+        return False  # Single-product sets are small; always exact
+    if TRANSACTION_COUNT_MODE == 'approx':
+        return True
+    return TRANSACTION_COUNT_MODE == 'auto' and days_span > HLL_MIN_DAYS
+
+def count_transactions(txn_index, store="All Stores", category="All Categories", product="All Products", approximate=False):
+    """Distinct transactions matching the filters (union of the per-day receipt sets)"""
+    if approximate and product == "All Products":
+        keys = filter_rollup(txn_index['sketch_keys'], store, category)
+        if keys.empty:
+            return 0
+        return hll_estimate(txn_index['sketches'][keys.index].max(axis=0))
+    
+    receipts = filter_rollup(txn_index['receipts'], store, category, product)
+    if product != "All Products":
+        return len(receipts)  # One product's daily sets are already distinct
+    if category == "All Categories":
+        return int(txn_index['day_counts'].loc[receipts['Day'].unique()].sum())
+    day_receipts = receipts['Day'].to_numpy(np.int64) * txn_index['receipt_codes'] + receipts['Receipt'].to_numpy()
+    return len(np.unique(day_receipts))
+
+def transactions_metric(txn_index, store="All Stores", category="All Categories", product="All Products", approximate=False):
+    """Transaction count as shown on a metric card; '—' when the data has no receipt numbers"""
+    if txn_index is None:
+        return "—"
+    transactions = count_transactions(txn_index, store, category, product, approximate)
+    return f"{'≈' if approximate else ''}{transactions:,}"
+
+# --- BASKET ANALYSIS ---
+# A basket is one transaction from the index above. Baskets and products form a
+# sparse incidence matrix B (one entry per basket/product), and co-purchase counts
+# are B^T B restricted to the most-bought products, computed as a vectorized
+# self-join on basket rather than a loop over product pairs.
+BASKET_TOP_PRODUCTS = 30
+
+def co_purchase_counts(basket_codes, product_codes, n_products):
+    """B^T B for a basket x product incidence matrix given as (basket, product) entries"""
+    if len(basket_codes) == 0:
+        return np.zeros((n_products, n_products), dtype=np.int64)
+    
+    order = np.argsort(basket_codes, kind='stable')
+    baskets = basket_codes[order]
+    items = product_codes[order]
+    
+    # Pair every entry with every entry of its own basket (including itself)
+    starts = np.flatnonzero(np.r_[True, baskets[1:] != baskets[:-1]])
+    sizes = np.diff(np.r_[starts, len(baskets)])
+    entry_sizes = np.repeat(sizes, sizes)
+    entry_starts = np.repeat(starts, sizes)
+    left = np.repeat(items, entry_sizes)
+    offsets = np.arange(entry_sizes.sum()) - np.repeat(np.cumsum(entry_sizes) - entry_sizes, entry_sizes)
+    right = items[np.repeat(entry_starts, entry_sizes) + offsets]
+    
+    return np.bincount(left * n_products + right, minlength=n_products * n_products).reshape(n_products, n_products)
+
+def analyze_baskets(txn_index, store="All Stores", category="All Categories", top_n=BASKET_TOP_PRODUCTS):
+    """Basket stats plus co-purchase counts, attach rates and lift for the top products.
+    
+    The basket stats cover baskets holding at least one product of the category;
+    lift is measured against every basket of the store.
+    """
+    receipts = filter_rollup(txn_index['receipts'], store)
+    basket_codes, basket_keys = pd.factorize(
+        receipts['Day'].to_numpy(np.int64) * txn_index['receipt_codes'] + receipts['Receipt'].to_numpy()
+    )
+    n_baskets = len(basket_keys)
+    
+    # Receipts hold one row per basket and product, so this counts distinct products
+    basket_products = np.bincount(basket_codes, minlength=n_baskets)
+    if category == "All Categories":
+        category_baskets = basket_products
+    else:
+        in_category = np.zeros(n_baskets, dtype=bool)
+        in_category[basket_codes[(receipts['Category'] == category).to_numpy()]] = True
+        category_baskets = basket_products[in_category]
+    
+    # Candidate products ranked by the number of baskets they appear in
+    candidates = receipts if category == "All Categories" else receipts[receipts['Category'] == category]
+    top_products = candidates['Description'].value_counts().head(top_n).index
+    product_codes = pd.Index(top_products).get_indexer(receipts['Description'])
+    in_top = product_codes >= 0
+    
+    counts = co_purchase_counts(basket_codes[in_top], product_codes[in_top], len(top_products))
+    baskets_with = np.diag(counts)
+    
+    # Unordered pairs, the more popular product first
+    first, second = np.triu_indices(len(top_products), k=1)
+    together = counts[first, second]
+    keep = together > 0
+    first, second, together = first[keep], second[keep], together[keep]
+    pairs = pd.DataFrame({
+        'Product': top_products[first],
+        'Bought With': top_products[second],
+        'Baskets Together': together,
+        'Attach Rate': together / baskets_with[first] * 100,
+        'Lift': together * n_baskets / (baskets_with[first] * baskets_with[second])
+    }).sort_values(['Baskets Together', 'Lift'], ascending=False, ignore_index=True)
+    
+    return {
+        'baskets': len(category_baskets),
+        'all_baskets': n_baskets,
+        'avg_products': category_baskets.mean() if len(category_baskets) else 0,
+        'multi_product_share': (category_baskets > 1).mean() * 100 if len(category_baskets) else 0,
+        'products': top_products,
+        'counts': counts,
+        'pairs': pairs
+    }
+
+def attach_rates(analysis, product):
+    """Attach rate and lift of every top product in baskets containing product"""
+    products = analysis['products']
+    counts = analysis['counts']
+    anchor = products.get_loc(product)
+    baskets_with = np.diag(counts)
+    rates = pd.DataFrame({
+        'Bought With': products,
+        'Baskets Together': counts[anchor],
+        'Attach Rate': counts[anchor] / baskets_with[anchor] * 100,
+        'Lift': counts[anchor] * analysis['all_baskets'] / (baskets_with[anchor] * baskets_with)
+    }).drop(index=anchor)
+    return rates[rates['Baskets Together'] > 0].sort_values('Attach Rate', ascending=False)
+
+# --- HOURLY HEATMAPS ---
+# Heatmaps are dense (rows x 24 hours) arrays filled by a single np.bincount over
+# integer (row, hour) codes, so a year of dates stays as cheap as one week.
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+def hourly_heatmap(df, rows='date', value='Revenue'):
+    """Value per (date or weekday) x hour as a dense array, with the row labels.
+    
+    Weekday rows are averages per trading day, so ranges with an uneven number
+    of Mondays and Sundays stay comparable.
+    """
+    hours = df['Hour'].clip(0, 23).to_numpy(np.int64)
+    weights = df[value].to_numpy(np.float64)
+    dates = df['Date'].dt.normalize()
+    
+    if rows == 'weekday':
+        row_codes = dates.dt.dayofweek.to_numpy(np.int64)
+        n_rows = 7
+        labels = WEEKDAY_NAMES
+    elif dates.empty:
+        return np.zeros((0, 24)), []  # No dates to span
+    else:
+        first = dates.min()
+        row_codes = ((dates - first).dt.days).to_numpy(np.int64)
+        n_rows = int(row_codes.max()) + 1
+        labels = pd.date_range(first, periods=n_rows).strftime('%b %d, %Y').tolist()
+    
+    grid = np.bincount(row_codes * 24 + hours, weights=weights, minlength=n_rows * 24).reshape(n_rows, 24)
+    if rows == 'weekday':
+        trading_days = np.bincount(dates.drop_duplicates().dt.dayofweek.to_numpy(np.int64), minlength=7)
+        grid = grid / np.maximum(trading_days, 1)[:, None]
+    return grid, labels
+
+# --- FILTER OPTION INDEX ---
+# The store, category and product selectors read a small index built once per
+# loaded frame (and rebuilt when days are added to it): the row positions of
+# every (store, category, product) plus each category's sorted products.
+# Filling the widgets is O(options), and filtering gathers the stored row
+# positions instead of scanning and copying the whole frame on every rerun.
+def build_filter_index(df):
+    """Row positions per (store, category, product) and sorted filter options"""
+    stores = df['Store'] if 'Store' in df.columns else pd.Series('', index=df.index)
+    positions = df.groupby([stores, 'Category', 'Description']).indices
+    
+    scoped = {}
+    for store, category, product in positions:
+        for scope in ("All Stores", store):
+            scoped.setdefault(scope, {}).setdefault(category, set()).add(product)
+    options = {}
+    for scope, categories in scoped.items():
+        options[scope] = {
+            'categories': sorted(categories),
+            'products': {category: sorted(products) for category, products in categories.items()},
+            'all_products': sorted(set().union(*categories.values()))
+        }
+    return {
+        'positions': positions,
+        'stores': sorted(scoped.keys() - {"All Stores"}),
+        'options': options
+    }
+
+def filter_options(filter_index, store="All Stores", category="All Categories"):
+    """Sorted category choices and the product choices for the selected category"""
+    options = filter_index['options'].get(store)
+    if options is None:
+        return [], []
+    if category == "All Categories":
+        return options['categories'], options['all_products']
+    return options['categories'], options['products'].get(category, [])
+
+def filter_rows(df, filter_index, store="All Stores", category="All Categories", product="All Products"):
+    """Rows of the indexed frame matching the filters, in their original order"""
+    if store == "All Stores" and category == "All Categories" and product == "All Products":
+        return df
+    matches = [
+        rows for (row_store, row_category, row_product), rows in filter_index['positions'].items()
+        if store in ("All Stores", row_store)
+        and category in ("All Categories", row_category)
+        and product in ("All Products", row_product)
+    ]
+    if not matches:
+        return df.iloc[:0]
+    rows = matches[0] if len(matches) == 1 else np.sort(np.concatenate(matches))
+    return df.take(rows)
+
+# --- TOP-K SELECTION ---
+# Leaderboards take the k largest pre-aggregated totals with np.argpartition
+# (linear time) and sort only those, instead of sorting every product. Ties
+# fall as in a stable sort: keep='first' favours the total listed first
+# (alphabetical after a groupby), keep='last' the one listed last, as in
+# Series.nlargest.
+def top_k(totals, k, by=None, keep='first'):
+    """The k largest entries of a Series, or of a DataFrame by column, largest first"""
+    if k <= 0:
+        return totals.iloc[:0]
+    values = (totals if by is None else totals[by]).to_numpy()
+    if keep == 'last':
+        values = values[::-1]
+    valid = np.flatnonzero(~pd.isna(values))  # NaN totals are skipped, as nlargest does
+    values = values[valid]
+    n = len(values)
+    if k < n:
+        threshold = values[np.argpartition(values, n - k)[n - k]]
+        candidates = np.flatnonzero(values >= threshold)  # Includes every tie at the cut
+    else:
+        candidates = np.arange(n)
+    order = valid[candidates[np.argsort(-values[candidates], kind='stable')][:k]]
+    if keep == 'last':
+        order = len(totals) - 1 - order
+    return totals.iloc[order]
+
+# --- PRODUCT RANK CHANGES ---
+# Leaderboards compare dense ranks of every product, not only each period's
+# top 10, so a product that climbs into the top 10 shows how far it moved.
+# Ranks come from one outer join of the two periods' totals; a product
+# missing from a period has no rank there.
+def product_ranks(before, after, by='Revenue'):
+    """Dense ranks of every product in two periods, with rank changes and new/dropped flags"""
+    ranks = pd.concat({'Before': before[by], 'After': after[by]}, axis=1, join='outer')
+    ranks['Rank Before'] = ranks['Before'].rank(method='dense', ascending=False)
+    ranks['Rank After'] = ranks['After'].rank(method='dense', ascending=False)
+    ranks['Rank Change'] = ranks['Rank Before'] - ranks['Rank After']  # Positive means moved up
+    ranks['New'] = ranks['Rank Before'].isna() & ranks['Rank After'].notna()
+    ranks['Dropped'] = ranks['Rank Before'].notna() & ranks['Rank After'].isna()
+    return ranks
+
+def rank_change_labels(ranks):
+    """Leaderboard badges: ↑n / ↓n / — for ranked products, NEW for new entries"""
+    change = ranks['Rank Change']
+    labels = pd.Series("", index=ranks.index)
+    labels[change == 0] = "—"
+    labels[change > 0] = "↑" + change[change > 0].astype(int).astype(str)
+    labels[change < 0] = "↓" + (-change[change < 0]).astype(int).astype(str)
+    labels[ranks['New']] = "NEW"
+    return labels
+
+def rank_movers(ranks, n=3, within=None):
+    """Biggest climbers (ranked within the top `within` after) and fallers (within it before)"""
+    change = ranks['Rank Change']
+    climbed = change > 0
+    fell = change < 0
+    if within is not None:
+        climbed &= ranks['Rank After'] <= within
+        fell &= ranks['Rank Before'] <= within
+    return top_k(change[climbed], n), -top_k(-change[fell], n)
+
+# --- PERIOD DELTA TABLES ---
+# Category and product change tables line up both periods' totals with one
+# outer join; a key missing from a period counts as 0 there. Change % is the
+# change over the size of the earlier total. From a zero base it is +100% for
+# a gain, -100% for a loss and 0% when both totals are zero. Long tables offer
+# a "biggest changes" view of their largest gains and declines next to the full
+# table; the Styler only ever formats the rows being displayed.
+DELTA_TABLE_MAX_ROWS = 100
+
+def delta_table(before, after, before_label, after_label, key):
+    """Totals of both periods per key with absolute and percent change, biggest gains first"""
+    table = pd.concat({before_label: before, after_label: after}, axis=1, join='outer').fillna(0)
+    table.index.name = key
+    base = table[before_label].abs()
+    table['Change $'] = table[after_label] - table[before_label]
+    table['Change %'] = np.where(
+        base > 0,
+        table['Change $'] / base.where(base > 0) * 100,
+        np.sign(table[after_label]) * 100
+    )
+    return table.sort_values('Change %', ascending=False, kind='stable')
+
+def delta_table_rows(table, max_rows=DELTA_TABLE_MAX_ROWS):
+    """The rows to display: all of them, or the largest gains and declines of a long table"""
+    if len(table) <= max_rows:
+        return table
+    gains = max_rows // 2
+    return pd.concat([table.head(gains), table.tail(max_rows - gains)])
+
+def color_change(val):
+    """Green/red/grey cell style for a signed change"""
+    if val > 0:
+        return 'background-color: rgba(16, 185, 129, 0.2); color: #10b981; font-weight: bold;'
+    elif val < 0:
+        return 'background-color: rgba(239, 68, 68, 0.2); color: #ef4444; font-weight: bold;'
+    else:
+        return 'background-color: rgba(156, 163, 175, 0.1); color: #6b7280;'
+
+def style_delta_table(rows, before_label, after_label):
+    """Currency formatting, colored Change % and Change $ bars for the displayed rows"""
+    return rows.style.format({
+        before_label: "${:,.2f}",
+        after_label: "${:,.2f}",
+        'Change $': "${:,.2f}",
+        'Change %': "{:+.1f}%"
+    }).map(color_change, subset=['Change %']).bar(subset=['Change $'], align='mid', color=['#ef4444', '#10b981'])
+
+# --- LAZY PERIOD AGGREGATES ---
+# Comparison periods live in session state across reruns. Each panel asks for
+# the aggregates it needs, which are computed on first use and kept in the
+# period dict until that period is replaced (new range or filters).
+def period_aggregate(period, key):
+    """Revenue/Quantity totals of a comparison period grouped by key, computed once per period"""
+    aggregates = period.setdefault('aggregates', {})
+    if key not in aggregates:
+        with perf_span(f"aggregate.{key.lower()}"):
+            aggregates[key] = period['df'].groupby(key)[['Revenue', 'Quantity']].sum()
+    return aggregates[key]
+
+# --- MAIN APP ---
+st.markdown("""
+<div class="main-header">
+    <div style="display: flex; align-items: center; justify-content: space-between;">
+        <div>
+            <h1 class="main-title">🌾 Your Business</h1>
+            <p class="main-subtitle">SALES ANALYTICS DASHBOARD</p>
+        </div>
+        <div style="font-size: 80px; opacity: 0.3;">🥖</div>
+    </div>
+</div>
+""", unsafe_allow_html=True)
+
+# --- SIDEBAR: DATA SOURCE ---
+st.sidebar.header("📁 Data Source")
+
+# Hardcoded Google Drive Folder ID for Your Business Sales Data
+SALES_FOLDER_ID = "YOUR_GOOGLE_DRIVE_FOLDER_ID_HERE"
+
+# Multiple locations: set sales_folders = {"Store name": "folder id", ...} in secrets
+STORE_FOLDERS = get_store_folders()
+
+# Check for service account (or a local/fake backend)
+backend, error = get_storage_backend()
+
+if backend:
+    st.sidebar.success(f"✅ {backend.name} Connected")
+    
+    # Use hardcoded folder ID
+    st.session_state.folder_id = SALES_FOLDER_ID
+    st.session_state.store_folders = STORE_FOLDERS
+    
+    # Show folder location (read-only info)
+    if len(STORE_FOLDERS) > 1:
+        st.sidebar.info(f"🏬 {len(STORE_FOLDERS)} Stores: " + ", ".join(STORE_FOLDERS))
+    else:
+        st.sidebar.info(f"📂 Data Folder: `{backend.describe_folder(next(iter(STORE_FOLDERS.values())))}`")
 
 else:
     # Service account not found
@@ -523,22 +2547,47 @@ uploaded_files = st.sidebar.file_uploader(
     help="Drag and drop or browse"
 )
 
-if uploaded_files:
+# Only (re)process uploads when they differ from what is already loaded
+if uploaded_files and (
+    'df' not in st.session_state or
+    st.session_state.get('upload_signature') != upload_signature(uploaded_files)
+):
     with st.spinner("Processing uploaded files..."):
         df = process_files(uploaded_files)
         if not df.empty:
             st.session_state.df = df
             st.session_state.data_loaded = True
+            st.session_state.pop('chain_summary', None)
+            st.session_state.pop('load_warnings', None)
+            st.session_state.upload_signature = upload_signature(uploaded_files)
             st.success(f"✅ Loaded {len(df):,} records")
             st.rerun()
 
+if uploaded_files and st.session_state.get('upload_duplicates_removed'):
+    st.sidebar.caption(f"🧹 Skipped {st.session_state.upload_duplicates_removed:,} duplicate line items from overlapping files")
+
 # --- MAIN ANALYSIS ---
 if 'df' in st.session_state and not st.session_state.df.empty:
     df = st.session_state.df
     
-    # Calculate date range
-    min_date = df['Date'].min()
-    max_date = df['Date'].max()
+    # Rollups follow the loaded frame; a new frame only regroups new or changed days
+    if st.session_state.get('rollup_source') is not df:
+        with perf_span("rollup.update"):
+            st.session_state.rollups = update_rollups(st.session_state.get('rollups'), df)
+        with perf_span("transactions.index"):
+            # Uploads without receipt numbers get no transaction counts or basket analysis
+            st.session_state.transaction_index = build_transaction_index(df) if 'SequenceNumber' in df.columns else None
+        with perf_span("filters.index"):
+            st.session_state.filter_index = build_filter_index(df)
+        st.session_state.basket_cache = {}
+        st.session_state.date_bounds = (df['Date'].min(), df['Date'].max())
+        st.session_state.rollup_source = df
+    rollups = st.session_state.rollups
+    transaction_index = st.session_state.transaction_index
+    filter_index = st.session_state.filter_index
+    
+    # Date range is fixed for a loaded frame
+    min_date, max_date = st.session_state.date_bounds
     days_span = (max_date - min_date).days + 1
     
     # Prominent date range display at top with change button
@@ -559,11 +2608,24 @@ if 'df' in st.session_state and not st.session_state.df.empty:
     </div>
     """, unsafe_allow_html=True)
     
+    # Files that failed to load stay listed until the range changes, so a missing day is never silent
+    load_warnings = st.session_state.get('load_warnings', [])
+    if load_warnings:
+        with st.expander(f"⚠️ {len(load_warnings)} problem(s) while loading — affected days are missing from these totals", expanded=True):
+            for warning in load_warnings:
+                st.warning(warning)
+    if transaction_index is None:
+        st.warning("⚠️ This data has no SequenceNumber (receipt number) column, so transaction counts and basket analysis are unavailable")
+    
     # Change Date Range button
     if st.button("🔄 Change Date Range", type="secondary", use_container_width=False):
+        cancel_load_jobs()
+        st.session_state.pop('load_warnings', None)
         del st.session_state.df
         if 'data_loaded' in st.session_state:
             del st.session_state.data_loaded
+        if 'chain_summary' in st.session_state:
+            del st.session_state.chain_summary
         st.rerun()
     
     # Data info in sidebar
@@ -572,6 +2634,18 @@ if 'df' in st.session_state and not st.session_state.df.empty:
     st.sidebar.metric("📝 Records", f"{len(df):,}")
     st.sidebar.metric("🗓️ Days", f"{days_span}")
     
+    # Store selector for multi-store chains
+    selected_store = "All Stores"
+    if len(filter_index['stores']) > 1:
+        selected_store = st.sidebar.selectbox(
+            "🏬 Store",
+            options=["All Stores"] + filter_index['stores'],
+            index=0,
+            key="main_store_filter"
+        )
+        if selected_store != "All Stores":
+            df = filter_rows(df, filter_index, selected_store)
+    
     # Determine analysis mode based on days
     if days_span == 1:
         analysis_mode = "Daily"
@@ -589,20 +2663,18 @@ if 'df' in st.session_state and not st.session_state.df.empty:
     st.markdown("---")
     st.subheader("🔍 Quick Filters")
     filter_col1, filter_col2 = st.columns(2)
+    available_categories, _ = filter_options(filter_index, selected_store)
     
     with filter_col1:
         selected_category = st.selectbox(
             "📁 Filter by Category",
-            options=["All Categories"] + sorted(df['Category'].unique()),
+            options=["All Categories"] + available_categories,
             index=0,
             key="main_category_filter"
         )
     
     with filter_col2:
-        if selected_category != "All Categories":
-            available_products = sorted(df[df['Category'] == selected_category]['Description'].unique())
-        else:
-            available_products = sorted(df['Description'].unique())
+        _, available_products = filter_options(filter_index, selected_store, selected_category)
         
         selected_product = st.selectbox(
             "🏷️ Filter by Product",
@@ -611,12 +2683,9 @@ if 'df' in st.session_state and not st.session_state.df.empty:
             key="main_product_filter"
         )
     
-    # Apply filters
-    filtered_df = df.copy()
-    if selected_category != "All Categories":
-        filtered_df = filtered_df[filtered_df['Category'] == selected_category]
-    if selected_product != "All Products":
-        filtered_df = filtered_df[filtered_df['Description'] == selected_product]
+    # Apply filters (row positions come from the index of the loaded frame)
+    with perf_span("view.filters"):
+        filtered_df = filter_rows(st.session_state.df, filter_index, selected_store, selected_category, selected_product)
     
     # Show filtered metrics if filters applied
     if selected_category != "All Categories" or selected_product != "All Products":
@@ -647,7 +2716,7 @@ if 'df' in st.session_state and not st.session_state.df.empty:
             avg_price = filtered_df['Revenue'].sum() / filtered_df['Quantity'].sum() if filtered_df['Quantity'].sum() > 0 else 0
             st.metric("💵 Avg Price", f"${avg_price:.2f}")
         with col4:
-            st.metric("🛍️ Transactions", f"{int(filtered_df['SequenceNumber'].nunique()):,}")
+            st.metric("🛍️ Transactions", transactions_metric(transaction_index, selected_store, selected_category, selected_product))
         
         st.markdown("---")
         
@@ -666,62 +2735,67 @@ if 'df' in st.session_state and not st.session_state.df.empty:
             )
         
         # Get hourly data
-        hourly_data = filtered_df.groupby('Hour').agg({
-            'Revenue': 'sum',
-            'Quantity': 'sum'
-        }).reset_index()
-        
-        # Filter to business hours (8 AM - 10 PM)
-        hourly_data = hourly_data[(hourly_data['Hour'] >= 8) & (hourly_data['Hour'] <= 22)]
+        with perf_span("view.daily.hourly"):
+            hourly_data = filtered_df.groupby('Hour').agg({
+                'Revenue': 'sum',
+                'Quantity': 'sum'
+            }).reset_index()
+            
+            # Filter to business hours (8 AM - 10 PM)
+            hourly_data = hourly_data[(hourly_data['Hour'] >= 8) & (hourly_data['Hour'] <= 22)]
         
         # Create chart based on toggle
-        fig = go.Figure()
-        
-        if hourly_metric == "Revenue ($)":
-            y_data = hourly_data['Revenue']
-            y_title = 'Revenue ($)'
-            hover_template = 'Hour: %{x}<br>Revenue: $%{y:,.0f}<extra></extra>'
-            color = '#10b981'
-        else:  # Quantity
-            y_data = hourly_data['Quantity']
-            y_title = 'Quantity'
-            hover_template = 'Hour: %{x}<br>Quantity: %{y:,.0f}<extra></extra>'
-            color = '#7D8570'
-        
-        # Add line chart with gradient fill
-        fig.add_trace(go.Scatter(
-            x=hourly_data['Hour'],
-            y=y_data,
-            mode='lines+markers',
-            line=dict(color=color, width=3),
-            marker=dict(size=6, color=color),
-            fill='tozeroy',
-            fillcolor=f'rgba({int(color[1:3], 16)}, {int(color[3:5], 16)}, {int(color[5:7], 16)}, 0.2)',
-            hovertemplate=hover_template
-        ))
-        
-        fig.update_layout(
-            height=350,
-            margin=dict(l=0, r=0, t=20, b=40),
-            xaxis=dict(
-                title='Hour of Day',
-                tickmode='linear',
-                tick0=8,
-                dtick=2,
-                showgrid=True,
-                gridcolor='rgba(0,0,0,0.05)'
-            ),
-            yaxis=dict(
-                title=y_title,
-                tickformat=',.0f' if hourly_metric == "Quantity" else '$,.0f',
-                showgrid=True,
-                gridcolor='rgba(0,0,0,0.05)'
-            ),
-            plot_bgcolor='white',
-            showlegend=False
-        )
+        fig_key = figure_key("daily.hourly", hourly_data, hourly_metric)
+        fig = cached_figure(fig_key)
+        if fig is None:
+            with perf_span("figure.daily.hourly"):
+                fig = go.Figure()
+                
+                if hourly_metric == "Revenue ($)":
+                    y_data = hourly_data['Revenue']
+                    y_title = 'Revenue ($)'
+                    hover_template = 'Hour: %{x}<br>Revenue: $%{y:,.0f}<extra></extra>'
+                    color = '#10b981'
+                else:  # Quantity
+                    y_data = hourly_data['Quantity']
+                    y_title = 'Quantity'
+                    hover_template = 'Hour: %{x}<br>Quantity: %{y:,.0f}<extra></extra>'
+                    color = '#7D8570'
+                
+                # Add line chart with gradient fill
+                fig.add_trace(go.Scatter(
+                    x=hourly_data['Hour'],
+                    y=y_data,
+                    mode='lines+markers',
+                    line=dict(color=color, width=3),
+                    marker=dict(size=6, color=color),
+                    fill='tozeroy',
+                    fillcolor=f'rgba({int(color[1:3], 16)}, {int(color[3:5], 16)}, {int(color[5:7], 16)}, 0.2)',
+                    hovertemplate=hover_template
+                ))
+                
+                fig.update_layout(
+                    height=350,
+                    margin=dict(l=0, r=0, t=20, b=40),
+                    xaxis=dict(
+                        title='Hour of Day',
+                        tickmode='linear',
+                        tick0=8,
+                        dtick=2,
+                        showgrid=True,
+                        gridcolor='rgba(0,0,0,0.05)'
+                    ),
+                    yaxis=dict(
+                        title=y_title,
+                        tickformat=',.0f' if hourly_metric == "Quantity" else '$,.0f',
+                        showgrid=True,
+                        gridcolor='rgba(0,0,0,0.05)'
+                    ),
+                    plot_bgcolor='white',
+                    showlegend=False
+                )
         
-        st.plotly_chart(fig, use_container_width=True)
+        show_chart(fig, "daily.hourly", fig_key)
         
         st.markdown("---")
         
@@ -734,117 +2808,138 @@ if 'df' in st.session_state and not st.session_state.df.empty:
                 st.caption(f"Top products in: **{selected_category}**")
             
             # Get top 7 products (reduced from 10 for less clutter)
-            top_products_data = filtered_df.groupby('Description').agg({
-                'Revenue': 'sum',
-                'Quantity': 'sum'
-            }).sort_values('Revenue', ascending=True).tail(7)
-            
-            fig = go.Figure()
-            
-            # Add revenue bars with units shown in hover only
-            fig.add_trace(go.Bar(
-                y=top_products_data.index,
-                x=top_products_data['Revenue'],
-                orientation='h',
-                marker_color='#7D8570',
-                text=[f"${rev:,.0f}" for rev in top_products_data['Revenue']],
-                textposition='outside',
-                textfont=dict(size=11, color='#5A6B5E'),
-                name='Revenue',
-                hovertemplate='<b>%{y}</b><br>$%{x:,.0f} • %{customdata} units<extra></extra>',
-                customdata=top_products_data['Quantity'].astype(int)
-            ))
+            with perf_span("view.daily.top_products"):
+                top_products_data = top_k(filtered_df.groupby('Description').agg({
+                    'Revenue': 'sum',
+                    'Quantity': 'sum'
+                }), 7, by='Revenue', keep='last').iloc[::-1]
             
-            fig.update_layout(
-                showlegend=False, 
-                height=400, 
-                margin=dict(l=0, r=80, t=40, b=0),  # Increased top margin from 20 to 40
-                xaxis=dict(title='Revenue ($)', tickformat='$,.0f'),
-                yaxis=dict(title='')
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            fig_key = figure_key("daily.top_products", top_products_data)
+            fig = cached_figure(fig_key)
+            if fig is None:
+                with perf_span("figure.daily.top_products"):
+                    fig = go.Figure()
+                    
+                    # Add revenue bars with units shown in hover only
+                    fig.add_trace(go.Bar(
+                        y=top_products_data.index,
+                        x=top_products_data['Revenue'],
+                        orientation='h',
+                        marker_color='#7D8570',
+                        text=[f"${rev:,.0f}" for rev in top_products_data['Revenue']],
+                        textposition='outside',
+                        textfont=dict(size=11, color='#5A6B5E'),
+                        name='Revenue',
+                        hovertemplate='<b>%{y}</b><br>$%{x:,.0f} • %{customdata} units<extra></extra>',
+                        customdata=top_products_data['Quantity'].astype(int)
+                    ))
+                    
+                    fig.update_layout(
+                        showlegend=False, 
+                        height=400, 
+                        margin=dict(l=0, r=80, t=40, b=0),  # Increased top margin from 20 to 40
+                        xaxis=dict(title='Revenue ($)', tickformat='$,.0f'),
+                        yaxis=dict(title='')
+                    )
+            show_chart(fig, "daily.top_products", fig_key)
         
         with col_right:
             st.subheader("🥧 Category Mix")
             if selected_category != "All Categories":
                 st.caption(f"Product mix within: **{selected_category}**")
-                product_data = filtered_df.groupby('Description')['Revenue'].sum().sort_values(ascending=False)
+                product_data = filtered_df.groupby('Description')['Revenue'].sum()
                 
                 # Show top 6 with legend
-                top_6 = product_data.nlargest(6)
+                top_6 = top_k(product_data, 6)
                 other = product_data[~product_data.index.isin(top_6.index)].sum()
                 if other > 0:
                     plot_data = pd.concat([top_6, pd.Series({'Others': other})])
                 else:
                     plot_data = top_6
                 
-                fig = go.Figure(data=[go.Pie(
-                    labels=plot_data.index,
-                    values=plot_data.values,
-                    hole=0.5,
-                    marker=dict(colors=px.colors.qualitative.Pastel),
-                    texttemplate='%{percent}',
-                    textposition='inside',
-                    textfont=dict(size=11, color='white'),
-                    hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
-                )])
-                fig.update_layout(
-                    height=450, 
-                    margin=dict(l=20, r=20, t=20, b=20), 
-                    showlegend=True,
-                    legend=dict(
-                        orientation='v',
-                        yanchor='middle',
-                        y=0.5,
-                        xanchor='left',
-                        x=1.05,
-                        font=dict(size=9)
-                    )
-                )
+                fig_key = figure_key("daily.category_mix", plot_data)
+                fig = cached_figure(fig_key)
+                if fig is None:
+                    with perf_span("figure.daily.category_mix"):
+                        fig = go.Figure(data=[go.Pie(
+                            labels=plot_data.index,
+                            values=plot_data.values,
+                            hole=0.5,
+                            marker=dict(colors=px.colors.qualitative.Pastel),
+                            texttemplate='%{percent}',
+                            textposition='inside',
+                            textfont=dict(size=11, color='white'),
+                            hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
+                        )])
+                        fig.update_layout(
+                            height=450, 
+                            margin=dict(l=20, r=20, t=20, b=20), 
+                            showlegend=True,
+                            legend=dict(
+                                orientation='v',
+                                yanchor='middle',
+                                y=0.5,
+                                xanchor='left',
+                                x=1.05,
+                                font=dict(size=9)
+                            )
+                        )
             else:
                 cat_data = filtered_df.groupby('Category')['Revenue'].sum().sort_values(ascending=False)
-                fig = go.Figure(data=[go.Pie(
-                    labels=cat_data.index,
-                    values=cat_data.values,
-                    hole=0.5,
-                    marker=dict(colors=px.colors.qualitative.Pastel),
-                    texttemplate='%{percent}',
-                    textposition='inside',
-                    textfont=dict(size=11, color='white'),
-                    hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
-                )])
-                fig.update_layout(
-                    height=450, 
-                    margin=dict(l=20, r=20, t=20, b=20), 
-                    showlegend=True,
-                    legend=dict(
-                        orientation='v',
-                        yanchor='middle',
-                        y=0.5,
-                        xanchor='left',
-                        x=1.05,
-                        font=dict(size=10)
-                    )
-                )
+                fig_key = figure_key("daily.category_mix", cat_data)
+                fig = cached_figure(fig_key)
+                if fig is None:
+                    with perf_span("figure.daily.category_mix"):
+                        fig = go.Figure(data=[go.Pie(
+                            labels=cat_data.index,
+                            values=cat_data.values,
+                            hole=0.5,
+                            marker=dict(colors=px.colors.qualitative.Pastel),
+                            texttemplate='%{percent}',
+                            textposition='inside',
+                            textfont=dict(size=11, color='white'),
+                            hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
+                        )])
+                        fig.update_layout(
+                            height=450, 
+                            margin=dict(l=20, r=20, t=20, b=20), 
+                            showlegend=True,
+                            legend=dict(
+                                orientation='v',
+                                yanchor='middle',
+                                y=0.5,
+                                xanchor='left',
+                                x=1.05,
+                                font=dict(size=10)
+                            )
+                        )
             
-            st.plotly_chart(fig, use_container_width=True)
+            show_chart(fig, "daily.category_mix", fig_key)
     
     # ==== WEEKLY VIEW (2-14 days) ====
     elif analysis_mode == "Weekly":
         # Show date range in header
         st.caption(f"**Period:** {min_date.strftime('%A, %B %d, %Y')} to {max_date.strftime('%A, %B %d, %Y')}")
         
+        # Charts and KPIs read the rollups rather than the line items
+        day_rollup = filter_rollup(rollups['day'], selected_store, selected_category, selected_product)
+        week_rollup = filter_rollup(rollups['week'], selected_store, selected_category, selected_product)
+        daily_data = rollup_sums(day_rollup, 'Date').reset_index()
+        
         # Key metrics without sparklines
-        col1, col2, col3, col4 = st.columns(4)
+        col1, col2, col3, col4, col5 = st.columns(5)
         with col1:
-            st.metric("💰 Total Revenue", f"${filtered_df['Revenue'].sum():,.2f}")
+            st.metric("💰 Total Revenue", f"${rollup_revenue(day_rollup):,.2f}")
         with col2:
-            st.metric("📦 Total Units", f"{int(filtered_df['Quantity'].sum()):,}")
+            st.metric("📦 Total Units", f"{int(day_rollup['Quantity'].sum()):,}")
         with col3:
-            avg_daily = filtered_df.groupby('Date')['Revenue'].sum().mean()
+            avg_daily = daily_data['Revenue'].mean()
             st.metric("📊 Avg Daily Rev", f"${avg_daily:,.2f}")
         with col4:
-            st.metric("📅 Days Active", f"{filtered_df['Date'].nunique()}")
+            st.metric("📅 Days Active", f"{len(daily_data)}")
+        with col5:
+            approximate = use_approximate_count(days_span, selected_product)
+            st.metric("🛍️ Transactions", transactions_metric(transaction_index, selected_store, selected_category, selected_product, approximate))
         
         st.markdown("---")
         
@@ -860,13 +2955,10 @@ if 'df' in st.session_state and not st.session_state.df.empty:
                 key="weekly_daily_toggle"
             )
         
-        daily_data = filtered_df.groupby('Date').agg({
-            'Revenue': 'sum',
-            'Quantity': 'sum'
-        }).reset_index()
-        daily_data['DayName'] = daily_data['Date'].dt.day_name()
-        # Add date + day name for x-axis labels
-        daily_data['DateLabel'] = daily_data['Date'].dt.strftime('%b %d') + ' (' + daily_data['DayName'] + ')'
+        with perf_span("view.weekly.daily_breakdown"):
+            daily_data['DayName'] = daily_data['Date'].dt.day_name()
+            # Add date + day name for x-axis labels
+            daily_data['DateLabel'] = daily_data['Date'].dt.strftime('%b %d') + ' (' + daily_data['DayName'] + ')'
         
         # Choose data based on toggle
         if daily_metric == "Revenue ($)":
@@ -882,34 +2974,36 @@ if 'df' in st.session_state and not st.session_state.df.empty:
             color = '#7D8570'
             tick_format = ',.0f'
         
-        fig = go.Figure()
-        fig.add_trace(go.Bar(
-            x=daily_data['DateLabel'],
-            y=y_data,
-            name=daily_metric,
-            marker_color=color,
-            hovertemplate=hover_template
-        ))
-        fig.update_layout(
-            height=400,
-            margin=dict(l=0, r=0, t=20, b=0),
-            xaxis_title="Date",
-            yaxis_title=y_title,  # Use dynamic title based on toggle
-            yaxis=dict(tickformat=tick_format),
-            xaxis=dict(tickangle=-45),
-            showlegend=False
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        fig_key = figure_key("weekly.daily_breakdown", daily_data, daily_metric)
+        fig = cached_figure(fig_key)
+        if fig is None:
+            with perf_span("figure.weekly.daily_breakdown"):
+                fig = go.Figure()
+                fig.add_trace(go.Bar(
+                    x=daily_data['DateLabel'],
+                    y=y_data,
+                    name=daily_metric,
+                    marker_color=color,
+                    hovertemplate=hover_template
+                ))
+                fig.update_layout(
+                    height=400,
+                    margin=dict(l=0, r=0, t=20, b=0),
+                    xaxis_title="Date",
+                    yaxis_title=y_title,  # Use dynamic title based on toggle
+                    yaxis=dict(tickformat=tick_format),
+                    xaxis=dict(tickangle=-45),
+                    showlegend=False
+                )
+        show_chart(fig, "weekly.daily_breakdown", fig_key)
         
         # Two columns for additional analysis
         col_left, col_right = st.columns(2)
         
         with col_left:
             st.subheader("🏆 Top Performers")
-            top_items = filtered_df.groupby('Description').agg({
-                'Revenue': 'sum',
-                'Quantity': 'sum'
-            }).sort_values('Revenue', ascending=False).head(5)  # Reduced to 5 for less overlap
+            with perf_span("view.weekly.top_performers"):
+                top_items = top_k(rollup_sums(week_rollup, 'Description'), 5, by='Revenue')  # Reduced to 5 for less overlap
             
             # Add rank badges
             rank_badges = {1: "🥇", 2: "🥈", 3: "🥉"}
@@ -921,131 +3015,152 @@ if 'df' in st.session_state and not st.session_state.df.empty:
                 short_prod = prod if len(prod) <= 25 else prod[:22] + "..."
                 labels_with_rank.append(f"{badge} {short_prod}")
             
-            fig = go.Figure()
-            
-            # Revenue bars with units in hover (no overlay dots)
-            fig.add_trace(go.Bar(
-                x=labels_with_rank,
-                y=top_items['Revenue'],
-                marker_color='#7D8570',
-                text=[f"${rev:,.0f}" for rev in top_items['Revenue']],
-                textposition='outside',
-                textfont=dict(size=10, color='#5A6B5E'),
-                name='Revenue',
-                hovertemplate='<b>%{x}</b><br>$%{y:,.0f} • %{customdata} units<extra></extra>',
-                customdata=top_items['Quantity'].astype(int)
-            ))
-            
-            fig.update_layout(
-                showlegend=False, 
-                height=400, 
-                margin=dict(l=0, r=0, t=50, b=100),
-                xaxis=dict(tickangle=-45, title='', tickfont=dict(size=9)),
-                yaxis=dict(tickformat='$,.0f', title='Revenue')
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            fig_key = figure_key("weekly.top_performers", top_items)
+            fig = cached_figure(fig_key)
+            if fig is None:
+                with perf_span("figure.weekly.top_performers"):
+                    fig = go.Figure()
+                    
+                    # Revenue bars with units in hover (no overlay dots)
+                    fig.add_trace(go.Bar(
+                        x=labels_with_rank,
+                        y=top_items['Revenue'],
+                        marker_color='#7D8570',
+                        text=[f"${rev:,.0f}" for rev in top_items['Revenue']],
+                        textposition='outside',
+                        textfont=dict(size=10, color='#5A6B5E'),
+                        name='Revenue',
+                        hovertemplate='<b>%{x}</b><br>$%{y:,.0f} • %{customdata} units<extra></extra>',
+                        customdata=top_items['Quantity'].astype(int)
+                    ))
+                    
+                    fig.update_layout(
+                        showlegend=False, 
+                        height=400, 
+                        margin=dict(l=0, r=0, t=50, b=100),
+                        xaxis=dict(tickangle=-45, title='', tickfont=dict(size=9)),
+                        yaxis=dict(tickformat='$,.0f', title='Revenue')
+                    )
+            show_chart(fig, "weekly.top_performers", fig_key)
         
         with col_right:
             st.subheader("📊 Category Performance")
             if selected_category == "All Categories":
-                cat_data = filtered_df.groupby('Category')['Revenue'].sum().sort_values(ascending=False)
+                cat_data = rollup_sums(week_rollup, 'Category')['Revenue'].sort_values(ascending=False)
                 
                 # Create donut chart with legend instead of outside labels
-                fig = go.Figure(data=[go.Pie(
-                    labels=cat_data.index,
-                    values=cat_data.values,
-                    hole=0.5,
-                    marker=dict(colors=px.colors.qualitative.Pastel),
-                    texttemplate='%{percent}',
-                    textposition='inside',
-                    textfont=dict(size=12, color='white'),
-                    hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
-                )])
-                fig.update_layout(
-                    height=450,
-                    margin=dict(l=20, r=20, t=20, b=20),
-                    showlegend=True,
-                    legend=dict(
-                        orientation='v',
-                        yanchor='middle',
-                        y=0.5,
-                        xanchor='left',
-                        x=1.05,
-                        font=dict(size=10)
-                    ),
-                    annotations=[dict(
-                        text=f'${cat_data.sum():,.0f}<br>Total',
-                        x=0.5, y=0.5,
-                        font_size=18,
-                        showarrow=False
-                    )]
-                )
-                st.plotly_chart(fig, use_container_width=True)
+                fig_key = figure_key("weekly.category_mix", cat_data)
+                fig = cached_figure(fig_key)
+                if fig is None:
+                    with perf_span("figure.weekly.category_mix"):
+                        fig = go.Figure(data=[go.Pie(
+                            labels=cat_data.index,
+                            values=cat_data.values,
+                            hole=0.5,
+                            marker=dict(colors=px.colors.qualitative.Pastel),
+                            texttemplate='%{percent}',
+                            textposition='inside',
+                            textfont=dict(size=12, color='white'),
+                            hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
+                        )])
+                        fig.update_layout(
+                            height=450,
+                            margin=dict(l=20, r=20, t=20, b=20),
+                            showlegend=True,
+                            legend=dict(
+                                orientation='v',
+                                yanchor='middle',
+                                y=0.5,
+                                xanchor='left',
+                                x=1.05,
+                                font=dict(size=10)
+                            ),
+                            annotations=[dict(
+                                text=f'${cat_data.sum():,.0f}<br>Total',
+                                x=0.5, y=0.5,
+                                font_size=18,
+                                showarrow=False
+                            )]
+                        )
+                show_chart(fig, "weekly.category_mix", fig_key)
             else:
-                prod_data = filtered_df.groupby('Description')['Revenue'].sum()
+                prod_data = rollup_sums(week_rollup, 'Description')['Revenue']
                 
                 # Show top 6 products + Others in donut (reduced from 8)
-                top_6 = prod_data.nlargest(6)
+                top_6 = top_k(prod_data, 6)
                 other = prod_data[~prod_data.index.isin(top_6.index)].sum()
                 if other > 0:
                     plot_data = pd.concat([top_6, pd.Series({'Others': other})])
                 else:
                     plot_data = top_6
                 
-                fig = go.Figure(data=[go.Pie(
-                    labels=plot_data.index,
-                    values=plot_data.values,
-                    hole=0.5,
-                    marker=dict(colors=px.colors.qualitative.Set2),
-                    texttemplate='%{percent}',
-                    textposition='inside',
-                    textfont=dict(size=12, color='white'),
-                    hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
-                )])
-                fig.update_layout(
-                    height=450,
-                    margin=dict(l=20, r=20, t=20, b=20),
-                    showlegend=True,
-                    legend=dict(
-                        orientation='v',
-                        yanchor='middle',
-                        y=0.5,
-                        xanchor='left',
-                        x=1.05,
-                        font=dict(size=9)
-                    ),
-                    annotations=[dict(
-                        text=f'${prod_data.sum():,.0f}<br>Total',
-                        x=0.5, y=0.5,
-                        font_size=18,
-                        showarrow=False
-                    )]
-                )
-                st.plotly_chart(fig, use_container_width=True)
+                fig_key = figure_key("weekly.product_mix", plot_data, prod_data)
+                fig = cached_figure(fig_key)
+                if fig is None:
+                    with perf_span("figure.weekly.product_mix"):
+                        fig = go.Figure(data=[go.Pie(
+                            labels=plot_data.index,
+                            values=plot_data.values,
+                            hole=0.5,
+                            marker=dict(colors=px.colors.qualitative.Set2),
+                            texttemplate='%{percent}',
+                            textposition='inside',
+                            textfont=dict(size=12, color='white'),
+                            hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
+                        )])
+                        fig.update_layout(
+                            height=450,
+                            margin=dict(l=20, r=20, t=20, b=20),
+                            showlegend=True,
+                            legend=dict(
+                                orientation='v',
+                                yanchor='middle',
+                                y=0.5,
+                                xanchor='left',
+                                x=1.05,
+                                font=dict(size=9)
+                            ),
+                            annotations=[dict(
+                                text=f'${prod_data.sum():,.0f}<br>Total',
+                                x=0.5, y=0.5,
+                                font_size=18,
+                                showarrow=False
+                            )]
+                        )
+                show_chart(fig, "weekly.product_mix", fig_key)
     
     # ==== MONTHLY VIEW (15+ days) ====
     else:  # Monthly
         # Show date range in header
         st.caption(f"**Period:** {min_date.strftime('%B %d, %Y')} to {max_date.strftime('%B %d, %Y')}")
         
+        # Charts and KPIs read the rollups rather than the line items
+        day_rollup = filter_rollup(rollups['day'], selected_store, selected_category, selected_product)
+        month_rollup = filter_rollup(rollups['month'], selected_store, selected_category, selected_product)
+        daily_totals = rollup_sums(day_rollup, 'Date').reset_index()
+        
         # Key metrics without sparklines
-        col1, col2, col3, col4 = st.columns(4)
+        col1, col2, col3, col4, col5 = st.columns(5)
         with col1:
-            st.metric("💰 Total Revenue", f"${filtered_df['Revenue'].sum():,.2f}")
+            st.metric("💰 Total Revenue", f"${rollup_revenue(day_rollup):,.2f}")
         with col2:
-            st.metric("📦 Total Units", f"{int(filtered_df['Quantity'].sum()):,}")
+            st.metric("📦 Total Units", f"{int(day_rollup['Quantity'].sum()):,}")
         with col3:
-            avg_daily = filtered_df.groupby('Date')['Revenue'].sum().mean()
+            avg_daily = daily_totals['Revenue'].mean()
             st.metric("📊 Avg Daily Rev", f"${avg_daily:,.0f}")
         with col4:
-            st.metric("📅 Days Active", f"{filtered_df['Date'].nunique()}")
+            st.metric("📅 Days Active", f"{len(daily_totals)}")
+        with col5:
+            approximate = use_approximate_count(days_span, selected_product)
+            st.metric("🛍️ Transactions", transactions_metric(transaction_index, selected_store, selected_category, selected_product, approximate))
         
         st.markdown("---")
         
-        # Weekly breakdown with toggle
+        # Weekly (or, for long ranges, monthly) breakdown with toggle
+        trend_granularity = choose_granularity(days_span)
         weekly_view_col1, weekly_view_col2 = st.columns([3, 1])
         with weekly_view_col1:
-            st.subheader("📊 Weekly Performance")
+            st.subheader("📊 Monthly Performance" if trend_granularity == 'month' else "📊 Weekly Performance")
             if selected_product != "All Products":
                 st.caption(f"Showing trend for: **{selected_product}**")
             elif selected_category != "All Categories":
@@ -1058,62 +3173,38 @@ if 'df' in st.session_state and not st.session_state.df.empty:
                 key="monthly_weekly_toggle"
             )
         
-        # Calculate week numbers (1-7 = Week 1, 8-14 = Week 2, etc.)
-        weekly_data = filtered_df.copy()
-        weekly_data['DayOfMonth'] = weekly_data['Date'].dt.day
-        weekly_data['WeekNum'] = ((weekly_data['DayOfMonth'] - 1) // 7) + 1
-        weekly_data['MonthName'] = weekly_data['Date'].dt.strftime('%b')
-        
-        # Group by week
-        weekly_summary = weekly_data.groupby(['MonthName', 'WeekNum']).agg({
-            'Revenue': 'sum',
-            'Quantity': 'sum',
-            'Date': ['min', 'max']
-        }).reset_index()
-        
-        # Create week labels with date ranges (e.g., "Dec 1-7")
-        week_labels = []
-        for _, row in weekly_summary.iterrows():
-            month = row[('MonthName', '')]
-            start_day = row[('Date', 'min')].day
-            end_day = row[('Date', 'max')].day
-            week_labels.append(f"{month} {start_day}-{end_day}")
-        
-        weekly_summary['WeekLabel'] = week_labels
+        with perf_span("view.monthly.weekly_performance"):
+            weekly_summary = period_totals(daily_totals, trend_granularity)
         
         # Choose data based on toggle
         if weekly_metric == "Revenue ($)":
-            y_data = weekly_summary[('Revenue', 'sum')]
+            value_column = 'Revenue'
             y_title = 'Revenue ($)'
             hover_template = '<b>%{x}</b><br>Revenue: $%{y:,.0f}<extra></extra>'
             color = '#10b981'
             tick_format = '$,.0f'
         else:  # Quantity
-            y_data = weekly_summary[('Quantity', 'sum')]
+            value_column = 'Quantity'
             y_title = 'Quantity'
             hover_template = '<b>%{x}</b><br>Quantity: %{y:,.0f}<extra></extra>'
             color = '#7D8570'
             tick_format = ',.0f'
         
-        fig = go.Figure()
-        fig.add_trace(go.Bar(
-            x=weekly_summary['WeekLabel'],
-            y=y_data,
-            marker_color=color,
-            text=[f"{v:,.0f}" for v in y_data],
-            textposition='outside',
-            textfont=dict(size=10),
-            hovertemplate=hover_template
-        ))
-        fig.update_layout(
-            height=400,
-            margin=dict(l=0, r=0, t=20, b=40),
-            xaxis=dict(title='Week', showgrid=False),
-            yaxis=dict(title=y_title, tickformat=tick_format, showgrid=True, gridcolor='rgba(0,0,0,0.05)'),
-            plot_bgcolor='white',
-            showlegend=False
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        fig_key = figure_key("monthly.weekly_performance", weekly_summary, daily_totals, value_column, trend_granularity)
+        fig = cached_figure(fig_key)
+        if fig is None:
+            with perf_span("figure.monthly.weekly_performance"):
+                fig = go.Figure()
+                fig.add_trace(trend_trace(weekly_summary, daily_totals, value_column, color, hover_template))
+                fig.update_layout(
+                    height=400,
+                    margin=dict(l=0, r=0, t=20, b=40),
+                    xaxis=dict(title='Month' if trend_granularity == 'month' else 'Week', showgrid=False),
+                    yaxis=dict(title=y_title, tickformat=tick_format, showgrid=True, gridcolor='rgba(0,0,0,0.05)'),
+                    plot_bgcolor='white',
+                    showlegend=False
+                )
+        show_chart(fig, "monthly.weekly_performance", fig_key)
         
         col_left, col_right = st.columns(2)
         
@@ -1123,35 +3214,37 @@ if 'df' in st.session_state and not st.session_state.df.empty:
                 st.caption(f"Top products in: **{selected_category}**")
             
             # Use horizontal bars for better readability
-            top_products = filtered_df.groupby('Description')['Revenue'].sum().sort_values(ascending=True).tail(10)
+            with perf_span("view.monthly.top_products"):
+                top_products = top_k(rollup_sums(month_rollup, 'Description')['Revenue'], 10, keep='last').iloc[::-1]
             
-            fig = go.Figure()
-            fig.add_trace(go.Bar(
-                y=top_products.index,
-                x=top_products.values,
-                orientation='h',
-                marker_color='#7D8570',
-                text=[f"${rev:,.0f}" for rev in top_products.values],
-                textposition='outside',
-                textfont=dict(size=10),
-                hovertemplate='<b>%{y}</b><br>Revenue: $%{x:,.2f}<extra></extra>'
-            ))
-            fig.update_layout(
-                showlegend=False,
-                height=450,
-                margin=dict(l=0, r=60, t=20, b=40),
-                xaxis=dict(title='Revenue ($)', tickformat='$,.0f'),
-                yaxis=dict(title='', tickfont=dict(size=9))
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            fig_key = figure_key("monthly.top_products", top_products)
+            fig = cached_figure(fig_key)
+            if fig is None:
+                with perf_span("figure.monthly.top_products"):
+                    fig = go.Figure()
+                    fig.add_trace(go.Bar(
+                        y=top_products.index,
+                        x=top_products.values,
+                        orientation='h',
+                        marker_color='#7D8570',
+                        text=[f"${rev:,.0f}" for rev in top_products.values],
+                        textposition='outside',
+                        textfont=dict(size=10),
+                        hovertemplate='<b>%{y}</b><br>Revenue: $%{x:,.2f}<extra></extra>'
+                    ))
+                    fig.update_layout(
+                        showlegend=False,
+                        height=450,
+                        margin=dict(l=0, r=60, t=20, b=40),
+                        xaxis=dict(title='Revenue ($)', tickformat='$,.0f'),
+                        yaxis=dict(title='', tickfont=dict(size=9))
+                    )
+            show_chart(fig, "monthly.top_products", fig_key)
         
         with col_right:
             st.subheader("📊 Performance Summary")
             if selected_category == "All Categories":
-                cat_data = filtered_df.groupby('Category').agg({
-                    'Revenue': 'sum',
-                    'Quantity': 'sum'
-                }).sort_values('Revenue', ascending=False)
+                cat_data = rollup_sums(month_rollup, 'Category').sort_values('Revenue', ascending=False)
                 cat_data['% of Total'] = (cat_data['Revenue'] / cat_data['Revenue'].sum() * 100).round(1)
                 
                 st.dataframe(cat_data.style.format({
@@ -1160,10 +3253,7 @@ if 'df' in st.session_state and not st.session_state.df.empty:
                     '% of Total': "{:.1f}%"
                 }), use_container_width=True)
             else:
-                prod_data = filtered_df.groupby('Description').agg({
-                    'Revenue': 'sum',
-                    'Quantity': 'sum'
-                }).sort_values('Revenue', ascending=False)
+                prod_data = rollup_sums(month_rollup, 'Description').sort_values('Revenue', ascending=False)
                 prod_data['Avg Price'] = (prod_data['Revenue'] / prod_data['Quantity']).round(2)
                 
                 st.dataframe(prod_data.style.format({
@@ -1172,6 +3262,158 @@ if 'df' in st.session_state and not st.session_state.df.empty:
                     'Avg Price': "${:.2f}"
                 }), use_container_width=True, height=400)
     
+    # Hourly heatmap for multi-day ranges
+    if analysis_mode != "Daily":
+        st.markdown("---")
+        heat_col1, heat_col2, heat_col3 = st.columns([2, 1, 1])
+        with heat_col1:
+            st.subheader("🕐 Hourly Heatmap")
+        with heat_col2:
+            heatmap_rows = st.radio(
+                "Rows:",
+                ["Day of Week", "Date"],
+                horizontal=True,
+                key="heatmap_rows_toggle"
+            )
+        with heat_col3:
+            heatmap_metric = st.radio(
+                "View:",
+                ["Revenue ($)", "Quantity"],
+                horizontal=True,
+                key="heatmap_metric_toggle"
+            )
+        
+        if filtered_df.empty:
+            st.info("No data for the selected filters in this range")
+        else:
+            value_column = 'Revenue' if heatmap_metric == "Revenue ($)" else 'Quantity'
+            with perf_span("view.heatmap"):
+                grid, row_labels = hourly_heatmap(
+                    filtered_df,
+                    rows='weekday' if heatmap_rows == "Day of Week" else 'date',
+                    value=value_column
+                )
+                # Business hours (8 AM - 10 PM), as in the daily hourly chart
+                grid = grid[:, 8:23]
+            
+            if heatmap_rows == "Day of Week":
+                st.caption("Average per trading day for each weekday")
+            value_format = '$%{z:,.0f}' if value_column == 'Revenue' else '%{z:,.0f}'
+            
+            fig_key = figure_key("heatmap.hourly", grid, row_labels, heatmap_metric)
+            fig = cached_figure(fig_key)
+            if fig is None:
+                with perf_span("figure.heatmap.hourly"):
+                    fig = go.Figure(data=go.Heatmap(
+                        z=grid,
+                        x=[f"{hour}:00" for hour in range(8, 23)],
+                        y=row_labels,
+                        colorscale=[[0, '#FAF9F6'], [0.5, '#B5C99A'], [1, '#5A6B5E']],
+                        hovertemplate=f'<b>%{{y}}</b> %{{x}}<br>{heatmap_metric}: {value_format}<extra></extra>'
+                    ))
+                    fig.update_layout(
+                        height=max(300, min(900, 22 * len(row_labels) + 80)),
+                        margin=dict(l=0, r=0, t=20, b=40),
+                        xaxis=dict(title='Hour of Day'),
+                        yaxis=dict(title='', autorange='reversed', tickfont=dict(size=10)),
+                        plot_bgcolor='white'
+                    )
+            show_chart(fig, "heatmap.hourly", fig_key)
+    
+    # Store breakdown for multi-store chains, built from the merged per-store partials
+    chain_summary = st.session_state.get('chain_summary')
+    if chain_summary is not None and len(chain_summary['by_store']) > 1:
+        st.markdown("---")
+        st.subheader("🏬 Store Breakdown")
+        
+        chain_col1, chain_col2, chain_col3 = st.columns(3)
+        with chain_col1:
+            st.metric("💰 Chain Revenue", f"${chain_summary['revenue']:,.2f}")
+        with chain_col2:
+            st.metric("📦 Chain Units", f"{int(chain_summary['units']):,}")
+        with chain_col3:
+            st.metric("🏬 Stores", f"{len(chain_summary['by_store'])}")
+        
+        store_table = chain_summary['by_store'].sort_values('Revenue', ascending=False)
+        store_table['% of Chain'] = store_table['Revenue'] / chain_summary['revenue'] * 100 if chain_summary['revenue'] else 0
+        st.dataframe(store_table.style.format({
+            'Revenue': "${:,.2f}",
+            'Quantity': "{:,.0f}",
+            '% of Chain': "{:.1f}%"
+        }), use_container_width=True)
+    
+    # Market basket analysis over the transaction index
+    st.markdown("---")
+    st.subheader("🧺 Basket Analysis")
+    st.caption("Products bought together in the same transaction")
+    
+    if transaction_index is None:
+        st.info("Basket analysis needs receipt numbers (SequenceNumber), which this data doesn't have")
+    else:
+        basket_key = (selected_store, selected_category)
+        basket_cache = st.session_state.setdefault('basket_cache', {})
+        if basket_key not in basket_cache:
+            with perf_span("view.baskets"):
+                basket_cache[basket_key] = analyze_baskets(transaction_index, selected_store, selected_category)
+        baskets = basket_cache[basket_key]
+        
+        basket_col1, basket_col2, basket_col3 = st.columns(3)
+        with basket_col1:
+            st.metric("🧺 Baskets", f"{baskets['baskets']:,}")
+        with basket_col2:
+            st.metric("🛒 Avg Products / Basket", f"{baskets['avg_products']:.2f}")
+        with basket_col3:
+            st.metric("🔗 Multi-Product Baskets", f"{baskets['multi_product_share']:.1f}%")
+        
+        if baskets['pairs'].empty:
+            st.info("No products were bought together in this period")
+        else:
+            basket_left, basket_right = st.columns(2)
+            
+            with basket_left:
+                st.markdown("**🔗 Top Product Pairs**")
+                st.dataframe(baskets['pairs'].head(15).style.format({
+                    'Baskets Together': "{:,}",
+                    'Attach Rate': "{:.1f}%",
+                    'Lift': "{:.2f}"
+                }), use_container_width=True, hide_index=True, height=400)
+            
+            with basket_right:
+                anchor_options = list(baskets['products'])
+                anchor = st.selectbox(
+                    "🛒 Bought with...",
+                    options=anchor_options,
+                    index=anchor_options.index(selected_product) if selected_product in anchor_options else 0,
+                    key="basket_anchor"
+                )
+                # Ascending so the highest attach rate ends up on top
+                rates = attach_rates(baskets, anchor).head(10).sort_values('Attach Rate')
+                
+                fig_key = figure_key("baskets.attach_rate", rates)
+                fig = cached_figure(fig_key)
+                if fig is None:
+                    with perf_span("figure.baskets.attach_rate"):
+                        fig = go.Figure()
+                        fig.add_trace(go.Bar(
+                            y=rates['Bought With'],
+                            x=rates['Attach Rate'],
+                            orientation='h',
+                            marker_color='#7D8570',
+                            customdata=rates['Lift'],
+                            text=[f"{rate:.0f}%" for rate in rates['Attach Rate']],
+                            textposition='outside',
+                            textfont=dict(size=10),
+                            hovertemplate='<b>%{y}</b><br>Attach rate: %{x:.1f}%<br>Lift: %{customdata:.2f}<extra></extra>'
+                        ))
+                        fig.update_layout(
+                            showlegend=False,
+                            height=360,
+                            margin=dict(l=0, r=40, t=10, b=40),
+                            xaxis=dict(title='% of baskets with this product', ticksuffix='%'),
+                            yaxis=dict(title='', tickfont=dict(size=9))
+                        )
+                show_chart(fig, "baskets.attach_rate", fig_key)
+    
     # Compare Periods button
     st.markdown("---")
     st.subheader("📊 Compare Periods")
@@ -1192,12 +3434,14 @@ if 'df' in st.session_state and not st.session_state.df.empty:
                 'date_range': f"{min_date.strftime('%b %d')} - {max_date.strftime('%b %d, %Y')}",
                 'days': days_span,
                 'category': selected_category,
-                'product': selected_product
+                'product': selected_product,
+                'store': selected_store
             }
         
         # Check if filters changed - update both periods
         if (st.session_state.comparison_period1.get('category') != selected_category or 
-            st.session_state.comparison_period1.get('product') != selected_product):
+            st.session_state.comparison_period1.get('product') != selected_product or
+            st.session_state.comparison_period1.get('store') != selected_store):
             
             # Update Period 1
             st.session_state.comparison_period1 = {
@@ -1205,33 +3449,17 @@ if 'df' in st.session_state and not st.session_state.df.empty:
                 'date_range': f"{min_date.strftime('%b %d')} - {max_date.strftime('%b %d, %Y')}",
                 'days': days_span,
                 'category': selected_category,
-                'product': selected_product
+                'product': selected_product,
+                'store': selected_store
             }
             
-            # If Period 2 exists, reapply filters (keep dates, update data)
+            # If Period 2 exists, reload its dates in the background; the finished
+            # job below applies the new filters. The old Period 2 used the old
+            # filters, so it is hidden until then.
             if 'comparison_period2' in st.session_state and 'comparison_period2_dates' in st.session_state:
                 p2_dates = st.session_state.comparison_period2_dates
-                comp_df, error = process_gdrive_files(
-                    service,
-                    st.session_state.folder_id,
-                    p2_dates['start'],
-                    p2_dates['end']
-                )
-                
-                # Apply new filters
-                if selected_category != "All Categories":
-                    comp_df = comp_df[comp_df['Category'] == selected_category]
-                if selected_product != "All Products":
-                    comp_df = comp_df[comp_df['Description'] == selected_product]
-                
-                if not error and not comp_df.empty:
-                    st.session_state.comparison_period2 = {
-                        'df': comp_df,
-                        'date_range': st.session_state.comparison_period2['date_range'],
-                        'days': st.session_state.comparison_period2['days'],
-                        'category': selected_category,
-                        'product': selected_product
-                    }
+                start_load_job('period2', backend, st.session_state.store_folders, p2_dates['start'], p2_dates['end'])
+                del st.session_state.comparison_period2
         
         # Period 2 date selector
         st.markdown("### 📅 Select Period 2 to Compare")
@@ -1260,6 +3488,9 @@ if 'df' in st.session_state and not st.session_state.df.empty:
         with comp_col4:
             if st.button("❌ Cancel", use_container_width=True):
                 st.session_state.show_comparison = False
+                period2_job = st.session_state.get('load_jobs', {}).pop('period2', None)
+                if period2_job is not None:
+                    period2_job.cancel()
                 if 'comparison_period1' in st.session_state:
                     del st.session_state.comparison_period1
                 if 'comparison_period2' in st.session_state:
@@ -1297,38 +3528,45 @@ if 'df' in st.session_state and not st.session_state.df.empty:
             st.markdown("<br>", unsafe_allow_html=True)
             comp_load_button = st.button("🔄 Load Period 2", type="primary", use_container_width=True)
         
-        # Load Period 2 data
-        if comp_load_button and service and st.session_state.get('folder_id'):
-            with st.spinner("📥 Loading comparison data..."):
-                comp_df, error = process_gdrive_files(
-                    service,
-                    st.session_state.folder_id,
-                    pd.Timestamp(comp_start_date),
-                    pd.Timestamp(comp_end_date)
-                )
-                
-                # Apply same filters as Period 1
+        # Load Period 2 data in the background; changing its range restarts the job
+        comp_job = st.session_state.get('load_jobs', {}).get('period2')
+        if backend and st.session_state.get('folder_id'):
+            comp_requested = load_job_key(st.session_state.store_folders, comp_start_date, comp_end_date)
+            if comp_load_button or (comp_job is not None and comp_job.running and comp_job.key != comp_requested):
+                start_load_job('period2', backend, st.session_state.store_folders, comp_start_date, comp_end_date)
+        
+        finished_comp_job = follow_load_job('period2', "📥 Loading comparison data")
+        if finished_comp_job is not None:
+            comp_df, error, _, comp_warnings = finished_comp_job.outcome()
+            for warning in comp_warnings:
+                st.warning(warning)
+            comp_start_date, comp_end_date = (ts.date() for ts in finished_comp_job.key[1:])
+            
+            # Apply same filters as Period 1 (a failed job has no columns to filter)
+            if not error:
+                if selected_store != "All Stores":
+                    comp_df = comp_df[comp_df['Store'] == selected_store]
                 if selected_category != "All Categories":
                     comp_df = comp_df[comp_df['Category'] == selected_category]
                 if selected_product != "All Products":
-                    comp_df = comp_df[comp_df['Description'] == selected_product]
-                
-                if not error and not comp_df.empty:
-                    # Store the dates so we can reload with new filters
-                    st.session_state.comparison_period2_dates = {
-                        'start': pd.Timestamp(comp_start_date),
-                        'end': pd.Timestamp(comp_end_date)
-                    }
-                    st.session_state.comparison_period2 = {
-                        'df': comp_df,
-                        'date_range': f"{comp_start_date.strftime('%b %d')} - {comp_end_date.strftime('%b %d, %Y')}",
-                        'days': (comp_end_date - comp_start_date).days + 1
-                    }
-                    st.success(f"✅ Loaded Period 2: {len(comp_df):,} records")
-                elif error:
-                    st.error(error)
-                else:
-                    st.warning("No data found for Period 2")
+                    comp_df = comp_df[comp_df['Description'] == selected_product]
+            
+            if not error and not comp_df.empty:
+                # Store the dates so we can reload with new filters
+                st.session_state.comparison_period2_dates = {
+                    'start': pd.Timestamp(comp_start_date),
+                    'end': pd.Timestamp(comp_end_date)
+                }
+                st.session_state.comparison_period2 = {
+                    'df': comp_df,
+                    'date_range': f"{comp_start_date.strftime('%b %d')} - {comp_end_date.strftime('%b %d, %Y')}",
+                    'days': (comp_end_date - comp_start_date).days + 1
+                }
+                st.success(f"✅ Loaded Period 2: {len(comp_df):,} records")
+            elif error:
+                st.error(error)
+            else:
+                st.warning("No data found for Period 2")
         
         # Show comparison if both periods loaded
         if 'comparison_period2' in st.session_state:
@@ -1404,731 +3642,698 @@ if 'df' in st.session_state and not st.session_state.df.empty:
             
             st.markdown("---")
             
-            # Pattern Comparison Charts (Hourly/Daily/Weekly based on period length)
-            st.markdown("### 📊 Sales Pattern Comparison")
-            
-            # Determine what type of pattern chart to show based on period length
-            p1_days = p1['days']
-            p2_days = p2['days']
-            
-            # Add toggle for metric
-            pattern_toggle_col1, pattern_toggle_col2 = st.columns([3, 1])
-            with pattern_toggle_col2:
-                pattern_metric = st.radio(
-                    "View:",
-                    ["Revenue ($)", "Quantity"],
-                    horizontal=True,
-                    key="comparison_pattern_toggle"
-                )
-            
-            # Determine chart type based on period lengths
-            if p1_days == 1 and p2_days == 1:
-                # Both are single days - show hourly comparison
-                with pattern_toggle_col1:
-                    st.caption("Hourly Pattern Comparison")
-                
-                # Get hourly data for both periods
-                p1_hourly = p1['df'].groupby('Hour').agg({
-                    'Revenue': 'sum',
-                    'Quantity': 'sum'
-                }).reset_index()
-                p1_hourly = p1_hourly[(p1_hourly['Hour'] >= 8) & (p1_hourly['Hour'] <= 22)]
-                
-                p2_hourly = p2['df'].groupby('Hour').agg({
-                    'Revenue': 'sum',
-                    'Quantity': 'sum'
-                }).reset_index()
-                p2_hourly = p2_hourly[(p2_hourly['Hour'] >= 8) & (p2_hourly['Hour'] <= 22)]
-                
-                # Choose data based on toggle
-                if pattern_metric == "Revenue ($)":
-                    p1_y = p1_hourly['Revenue']
-                    p2_y = p2_hourly['Revenue']
-                    y_title = 'Revenue ($)'
-                    tick_format = '$,.0f'
-                    color1 = '#7D8570'
-                    color2 = '#B5C99A'
-                else:
-                    p1_y = p1_hourly['Quantity']
-                    p2_y = p2_hourly['Quantity']
-                    y_title = 'Quantity'
-                    tick_format = ',.0f'
-                    color1 = '#7D8570'
-                    color2 = '#B5C99A'
-                
-                # Side-by-side hourly charts
-                hourly_col1, hourly_col2 = st.columns(2)
-                
-                with hourly_col1:
-                    st.caption(f"📊 {p1['date_range']}")
-                    fig = go.Figure()
-                    fig.add_trace(go.Scatter(
-                        x=p1_hourly['Hour'],
-                        y=p1_y,
-                        mode='lines+markers',
-                        line=dict(color=color1, width=3),
-                        marker=dict(size=6),
-                        fill='tozeroy',
-                        fillcolor=f'rgba(125, 133, 112, 0.2)',
-                        hovertemplate=f'Hour: %{{x}}<br>{y_title}: %{{y:,.0f}}<extra></extra>'
-                    ))
-                    fig.update_layout(
-                        height=350,
-                        margin=dict(l=0, r=0, t=10, b=40),
-                        xaxis=dict(title='Hour', dtick=2, showgrid=True, gridcolor='rgba(0,0,0,0.05)'),
-                        yaxis=dict(title=y_title, tickformat=tick_format, showgrid=True, gridcolor='rgba(0,0,0,0.05)'),
-                        plot_bgcolor='white',
-                        showlegend=False
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                with hourly_col2:
-                    st.caption(f"📊 {p2['date_range']}")
-                    fig = go.Figure()
-                    fig.add_trace(go.Scatter(
-                        x=p2_hourly['Hour'],
-                        y=p2_y,
-                        mode='lines+markers',
-                        line=dict(color=color2, width=3),
-                        marker=dict(size=6),
-                        fill='tozeroy',
-                        fillcolor=f'rgba(181, 201, 154, 0.2)',
-                        hovertemplate=f'Hour: %{{x}}<br>{y_title}: %{{y:,.0f}}<extra></extra>'
-                    ))
-                    fig.update_layout(
-                        height=350,
-                        margin=dict(l=0, r=0, t=10, b=40),
-                        xaxis=dict(title='Hour', dtick=2, showgrid=True, gridcolor='rgba(0,0,0,0.05)'),
-                        yaxis=dict(title=y_title, tickformat=tick_format, showgrid=True, gridcolor='rgba(0,0,0,0.05)'),
-                        plot_bgcolor='white',
-                        showlegend=False
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
+            # Heavy sections are aggregated and drawn only when selected
+            comparison_section = st.radio(
+                "Show:",
+                ["📊 Sales Patterns", "📈 Top Products", "📋 Category & Product Changes"],
+                horizontal=True,
+                key="comparison_section"
+            )
             
-            elif p1_days <= 14 and p2_days <= 14:
-                # Weekly periods - show daily comparison
-                with pattern_toggle_col1:
-                    st.caption("Day-by-Day Pattern Comparison")
-                
-                # Get daily data
-                p1_daily = p1['df'].groupby('Date').agg({
-                    'Revenue': 'sum',
-                    'Quantity': 'sum'
-                }).reset_index()
-                p1_daily['DateLabel'] = p1_daily['Date'].dt.strftime('%b %d')
-                
-                p2_daily = p2['df'].groupby('Date').agg({
-                    'Revenue': 'sum',
-                    'Quantity': 'sum'
-                }).reset_index()
-                p2_daily['DateLabel'] = p2_daily['Date'].dt.strftime('%b %d')
-                
-                # Choose data
-                if pattern_metric == "Revenue ($)":
-                    p1_y = p1_daily['Revenue']
-                    p2_y = p2_daily['Revenue']
-                    y_title = 'Revenue ($)'
-                    tick_format = '$,.0f'
-                    color1 = '#10b981'
-                    color2 = '#7D8570'
-                else:
-                    p1_y = p1_daily['Quantity']
-                    p2_y = p2_daily['Quantity']
-                    y_title = 'Quantity'
-                    tick_format = ',.0f'
-                    color1 = '#10b981'
-                    color2 = '#7D8570'
-                
-                # Side-by-side daily charts
-                daily_comp_col1, daily_comp_col2 = st.columns(2)
+            if comparison_section == "📊 Sales Patterns":
+                # Pattern Comparison Charts (Hourly/Daily/Weekly based on period length)
+                st.markdown("### 📊 Sales Pattern Comparison")
                 
-                with daily_comp_col1:
-                    st.caption(f"📊 {p1['date_range']}")
-                    fig = go.Figure()
-                    fig.add_trace(go.Bar(
-                        x=p1_daily['DateLabel'],
-                        y=p1_y,
-                        marker_color=color1,
-                        hovertemplate=f'<b>%{{x}}</b><br>{y_title}: %{{y:,.0f}}<extra></extra>'
-                    ))
-                    fig.update_layout(
-                        height=350,
-                        margin=dict(l=0, r=0, t=10, b=40),
-                        xaxis=dict(title='Date', tickangle=-45),
-                        yaxis=dict(title=y_title, tickformat=tick_format),
-                        showlegend=False
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
+                # Determine what type of pattern chart to show based on period length
+                p1_days = p1['days']
+                p2_days = p2['days']
                 
-                with daily_comp_col2:
-                    st.caption(f"📊 {p2['date_range']}")
-                    fig = go.Figure()
-                    fig.add_trace(go.Bar(
-                        x=p2_daily['DateLabel'],
-                        y=p2_y,
-                        marker_color=color2,
-                        hovertemplate=f'<b>%{{x}}</b><br>{y_title}: %{{y:,.0f}}<extra></extra>'
-                    ))
-                    fig.update_layout(
-                        height=350,
-                        margin=dict(l=0, r=0, t=10, b=40),
-                        xaxis=dict(title='Date', tickangle=-45),
-                        yaxis=dict(title=y_title, tickformat=tick_format),
-                        showlegend=False
+                # Add toggle for metric
+                pattern_toggle_col1, pattern_toggle_col2 = st.columns([3, 1])
+                with pattern_toggle_col2:
+                    pattern_metric = st.radio(
+                        "View:",
+                        ["Revenue ($)", "Quantity"],
+                        horizontal=True,
+                        key="comparison_pattern_toggle"
                     )
-                    st.plotly_chart(fig, use_container_width=True)
-            
-            else:
-                # Monthly periods - show weekly comparison
-                with pattern_toggle_col1:
-                    st.caption("Week-by-Week Pattern Comparison")
                 
-                # Calculate weekly data for both periods
-                def get_weekly_data(df):
-                    weekly_df = df.copy()
-                    weekly_df['DayOfMonth'] = weekly_df['Date'].dt.day
-                    weekly_df['WeekNum'] = ((weekly_df['DayOfMonth'] - 1) // 7) + 1
-                    weekly_df['MonthName'] = weekly_df['Date'].dt.strftime('%b')
+                # Determine chart type based on period lengths
+                if p1_days == 1 and p2_days == 1:
+                    # Both are single days - show hourly comparison
+                    with pattern_toggle_col1:
+                        st.caption("Hourly Pattern Comparison")
                     
-                    weekly_summary = weekly_df.groupby(['MonthName', 'WeekNum']).agg({
-                        'Revenue': 'sum',
-                        'Quantity': 'sum',
-                        'Date': ['min', 'max']
-                    }).reset_index()
+                    # Get hourly data for both periods
+                    p1_hourly = period_aggregate(p1, 'Hour').reset_index()
+                    p1_hourly = p1_hourly[(p1_hourly['Hour'] >= 8) & (p1_hourly['Hour'] <= 22)]
                     
-                    week_labels = []
-                    for _, row in weekly_summary.iterrows():
-                        month = row[('MonthName', '')]
-                        start_day = row[('Date', 'min')].day
-                        end_day = row[('Date', 'max')].day
-                        week_labels.append(f"{month} {start_day}-{end_day}")
+                    p2_hourly = period_aggregate(p2, 'Hour').reset_index()
+                    p2_hourly = p2_hourly[(p2_hourly['Hour'] >= 8) & (p2_hourly['Hour'] <= 22)]
                     
-                    weekly_summary['WeekLabel'] = week_labels
-                    return weekly_summary
-                
-                p1_weekly = get_weekly_data(p1['df'])
-                p2_weekly = get_weekly_data(p2['df'])
-                
-                # Choose data
-                if pattern_metric == "Revenue ($)":
-                    p1_y = p1_weekly[('Revenue', 'sum')]
-                    p2_y = p2_weekly[('Revenue', 'sum')]
-                    y_title = 'Revenue ($)'
-                    tick_format = '$,.0f'
-                    color1 = '#10b981'
-                    color2 = '#7D8570'
-                else:
-                    p1_y = p1_weekly[('Quantity', 'sum')]
-                    p2_y = p2_weekly[('Quantity', 'sum')]
-                    y_title = 'Quantity'
-                    tick_format = ',.0f'
-                    color1 = '#10b981'
-                    color2 = '#7D8570'
-                
-                # Side-by-side weekly charts
-                weekly_comp_col1, weekly_comp_col2 = st.columns(2)
-                
-                with weekly_comp_col1:
-                    st.caption(f"📊 {p1['date_range']}")
-                    fig = go.Figure()
-                    fig.add_trace(go.Bar(
-                        x=p1_weekly['WeekLabel'],
-                        y=p1_y,
-                        marker_color=color1,
-                        text=[f"{v:,.0f}" for v in p1_y],
-                        textposition='outside',
-                        textfont=dict(size=9),
-                        hovertemplate=f'<b>%{{x}}</b><br>{y_title}: %{{y:,.0f}}<extra></extra>'
-                    ))
-                    fig.update_layout(
-                        height=350,
-                        margin=dict(l=0, r=0, t=30, b=40),
-                        xaxis=dict(title='Week'),
-                        yaxis=dict(title=y_title, tickformat=tick_format),
-                        showlegend=False
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                with weekly_comp_col2:
-                    st.caption(f"📊 {p2['date_range']}")
-                    fig = go.Figure()
-                    fig.add_trace(go.Bar(
-                        x=p2_weekly['WeekLabel'],
-                        y=p2_y,
-                        marker_color=color2,
-                        text=[f"{v:,.0f}" for v in p2_y],
-                        textposition='outside',
-                        textfont=dict(size=9),
-                        hovertemplate=f'<b>%{{x}}</b><br>{y_title}: %{{y:,.0f}}<extra></extra>'
-                    ))
-                    fig.update_layout(
-                        height=350,
-                        margin=dict(l=0, r=0, t=30, b=40),
-                        xaxis=dict(title='Week'),
-                        yaxis=dict(title=y_title, tickformat=tick_format),
-                        showlegend=False
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-            
-            st.markdown("---")
-            
-            # Side-by-side charts with rank changes
-            st.markdown("### 📈 Top Products Comparison")
-            
-            # Get top products for both periods
-            p1_data = p1['df'].groupby('Description').agg({
-                'Revenue': 'sum',
-                'Quantity': 'sum'
-            }).sort_values('Revenue', ascending=False).head(10)
-            
-            p2_data = p2['df'].groupby('Description').agg({
-                'Revenue': 'sum',
-                'Quantity': 'sum'
-            }).sort_values('Revenue', ascending=False).head(10)
-            
-            # Calculate rank changes
-            p1_ranks = {prod: i+1 for i, prod in enumerate(p1_data.index)}
-            p2_ranks = {prod: i+1 for i, prod in enumerate(p2_data.index)}
-            
-            rank_changes = {}
-            for prod in p2_data.index:
-                if prod in p1_ranks:
-                    change = p1_ranks[prod] - p2_ranks[prod]  # Positive means moved up
-                    if change > 0:
-                        rank_changes[prod] = f"↑{change}"
-                    elif change < 0:
-                        rank_changes[prod] = f"↓{abs(change)}"
+                    # Choose data based on toggle
+                    if pattern_metric == "Revenue ($)":
+                        p1_y = p1_hourly['Revenue']
+                        p2_y = p2_hourly['Revenue']
+                        y_title = 'Revenue ($)'
+                        tick_format = '$,.0f'
+                        color1 = '#7D8570'
+                        color2 = '#B5C99A'
                     else:
-                        rank_changes[prod] = "—"
-                else:
-                    rank_changes[prod] = "NEW"
-            
-            comp_chart_col1, comp_chart_col2 = st.columns(2)
-            
-            with comp_chart_col1:
-                st.caption(f"📊 {p1['date_range']}")
-                
-                fig = go.Figure()
-                fig.add_trace(go.Bar(
-                    x=p1_data.index,
-                    y=p1_data['Revenue'],
-                    marker_color='#7D8570',
-                    text=[f"#{i+1}" for i in range(len(p1_data))],
-                    textposition='outside',
-                    textfont=dict(color='#5A6B5E', size=10),
-                    hovertemplate='<b>%{x}</b><br>$%{y:,.0f} • %{customdata} units<extra></extra>',
-                    customdata=p1_data['Quantity'].astype(int)
-                ))
-                fig.update_layout(
-                    showlegend=False, 
-                    height=400, 
-                    margin=dict(l=0, r=0, t=40, b=80),
-                    xaxis={'tickangle': -45, 'title': ''},
-                    yaxis={'tickformat': '$,.0f', 'title': 'Revenue'}
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            
-            with comp_chart_col2:
-                st.caption(f"📊 {p2['date_range']}")
-                
-                fig = go.Figure()
+                        p1_y = p1_hourly['Quantity']
+                        p2_y = p2_hourly['Quantity']
+                        y_title = 'Quantity'
+                        tick_format = ',.0f'
+                        color1 = '#7D8570'
+                        color2 = '#B5C99A'
+                    
+                    # Side-by-side hourly charts
+                    hourly_col1, hourly_col2 = st.columns(2)
+                    
+                    with hourly_col1:
+                        st.caption(f"📊 {p1['date_range']}")
+                        fig_key = figure_key("compare.hourly_p1", p1_hourly, pattern_metric)
+                        fig = cached_figure(fig_key)
+                        if fig is None:
+                            with perf_span("figure.compare.hourly_p1"):
+                                fig = go.Figure()
+                                fig.add_trace(go.Scatter(
+                                    x=p1_hourly['Hour'],
+                                    y=p1_y,
+                                    mode='lines+markers',
+                                    line=dict(color=color1, width=3),
+                                    marker=dict(size=6),
+                                    fill='tozeroy',
+                                    fillcolor=f'rgba(125, 133, 112, 0.2)',
+                                    hovertemplate=f'Hour: %{{x}}<br>{y_title}: %{{y:,.0f}}<extra></extra>'
+                                ))
+                                fig.update_layout(
+                                    height=350,
+                                    margin=dict(l=0, r=0, t=10, b=40),
+                                    xaxis=dict(title='Hour', dtick=2, showgrid=True, gridcolor='rgba(0,0,0,0.05)'),
+                                    yaxis=dict(title=y_title, tickformat=tick_format, showgrid=True, gridcolor='rgba(0,0,0,0.05)'),
+                                    plot_bgcolor='white',
+                                    showlegend=False
+                                )
+                        show_chart(fig, "compare.hourly_p1", fig_key)
+                    
+                    with hourly_col2:
+                        st.caption(f"📊 {p2['date_range']}")
+                        fig_key = figure_key("compare.hourly_p2", p2_hourly, pattern_metric)
+                        fig = cached_figure(fig_key)
+                        if fig is None:
+                            with perf_span("figure.compare.hourly_p2"):
+                                fig = go.Figure()
+                                fig.add_trace(go.Scatter(
+                                    x=p2_hourly['Hour'],
+                                    y=p2_y,
+                                    mode='lines+markers',
+                                    line=dict(color=color2, width=3),
+                                    marker=dict(size=6),
+                                    fill='tozeroy',
+                                    fillcolor=f'rgba(181, 201, 154, 0.2)',
+                                    hovertemplate=f'Hour: %{{x}}<br>{y_title}: %{{y:,.0f}}<extra></extra>'
+                                ))
+                                fig.update_layout(
+                                    height=350,
+                                    margin=dict(l=0, r=0, t=10, b=40),
+                                    xaxis=dict(title='Hour', dtick=2, showgrid=True, gridcolor='rgba(0,0,0,0.05)'),
+                                    yaxis=dict(title=y_title, tickformat=tick_format, showgrid=True, gridcolor='rgba(0,0,0,0.05)'),
+                                    plot_bgcolor='white',
+                                    showlegend=False
+                                )
+                        show_chart(fig, "compare.hourly_p2", fig_key)
                 
-                # Add rank with rank change indicators
-                rank_labels = []
-                for i, prod in enumerate(p2_data.index):
-                    rank_indicator = rank_changes.get(prod, "")
-                    if rank_indicator:
-                        rank_labels.append(f"#{i+1} {rank_indicator}")
+                elif choose_granularity(max(p1_days, p2_days)) == 'day':
+                    # Weekly periods - show daily comparison
+                    with pattern_toggle_col1:
+                        st.caption("Day-by-Day Pattern Comparison")
+                    
+                    # Get daily data
+                    p1_daily = period_aggregate(p1, 'Date').reset_index()
+                    p1_daily['DateLabel'] = p1_daily['Date'].dt.strftime('%b %d')
+                    
+                    p2_daily = period_aggregate(p2, 'Date').reset_index()
+                    p2_daily['DateLabel'] = p2_daily['Date'].dt.strftime('%b %d')
+                    
+                    # Choose data
+                    if pattern_metric == "Revenue ($)":
+                        p1_y = p1_daily['Revenue']
+                        p2_y = p2_daily['Revenue']
+                        y_title = 'Revenue ($)'
+                        tick_format = '$,.0f'
+                        color1 = '#10b981'
+                        color2 = '#7D8570'
                     else:
-                        rank_labels.append(f"#{i+1}")
-                
-                fig.add_trace(go.Bar(
-                    x=p2_data.index,
-                    y=p2_data['Revenue'],
-                    marker_color='#B5C99A',
-                    text=rank_labels,
-                    textposition='outside',
-                    textfont=dict(color='#5A6B5E', size=10),
-                    hovertemplate='<b>%{x}</b><br>$%{y:,.0f} • %{customdata} units<extra></extra>',
-                    customdata=p2_data['Quantity'].astype(int)
-                ))
-                fig.update_layout(
-                    showlegend=False, 
-                    height=400, 
-                    margin=dict(l=0, r=0, t=40, b=80),
-                    xaxis={'tickangle': -45, 'title': ''},
-                    yaxis={'tickformat': '$,.0f', 'title': 'Revenue'}
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            
-            st.markdown("---")
-            
-            # If specific product selected, show hourly comparison
-            if selected_product != "All Products":
-                st.subheader(f"⏱️ Hourly Sales Pattern: {selected_product}")
-                
-                # Get hourly data for both periods
-                p1_hourly = p1['df'].groupby('Hour').agg({
-                    'Revenue': 'sum',
-                    'Quantity': 'sum'
-                }).reset_index()
-                
-                p2_hourly = p2['df'].groupby('Hour').agg({
-                    'Revenue': 'sum',
-                    'Quantity': 'sum'
-                }).reset_index()
-                
-                # Create side-by-side hourly charts
-                hourly_col1, hourly_col2 = st.columns(2)
-                
-                with hourly_col1:
-                    st.caption(f"📊 {p1['date_range']}")
-                    fig = go.Figure()
+                        p1_y = p1_daily['Quantity']
+                        p2_y = p2_daily['Quantity']
+                        y_title = 'Quantity'
+                        tick_format = ',.0f'
+                        color1 = '#10b981'
+                        color2 = '#7D8570'
                     
-                    # Line chart for revenue without fill
-                    fig.add_trace(go.Scatter(
-                        x=p1_hourly['Hour'],
-                        y=p1_hourly['Revenue'],
-                        mode='lines',
-                        name='Revenue',
-                        line=dict(color='#7D8570', width=3),
-                        hovertemplate='Hour: %{x}<br>Revenue: $%{y:,.2f}<extra></extra>'
-                    ))
+                    # Side-by-side daily charts
+                    daily_comp_col1, daily_comp_col2 = st.columns(2)
                     
-                    # Add units as markers
-                    fig.add_trace(go.Scatter(
-                        x=p1_hourly['Hour'],
-                        y=p1_hourly['Revenue'],
-                        mode='markers+text',
-                        marker=dict(size=8, color='#5A6B5E'),
-                        text=[f"{int(q)}" for q in p1_hourly['Quantity']],
-                        textposition='top center',
-                        textfont=dict(size=9, color='#5A6B5E'),
-                        showlegend=False,
-                        hovertemplate='Units: %{text}<extra></extra>'
-                    ))
+                    with daily_comp_col1:
+                        st.caption(f"📊 {p1['date_range']}")
+                        fig_key = figure_key("compare.daily_p1", p1_daily, pattern_metric)
+                        fig = cached_figure(fig_key)
+                        if fig is None:
+                            with perf_span("figure.compare.daily_p1"):
+                                fig = go.Figure()
+                                fig.add_trace(go.Bar(
+                                    x=p1_daily['DateLabel'],
+                                    y=p1_y,
+                                    marker_color=color1,
+                                    hovertemplate=f'<b>%{{x}}</b><br>{y_title}: %{{y:,.0f}}<extra></extra>'
+                                ))
+                                fig.update_layout(
+                                    height=350,
+                                    margin=dict(l=0, r=0, t=10, b=40),
+                                    xaxis=dict(title='Date', tickangle=-45),
+                                    yaxis=dict(title=y_title, tickformat=tick_format),
+                                    showlegend=False
+                                )
+                        show_chart(fig, "compare.daily_p1", fig_key)
                     
-                    fig.update_layout(
-                        height=350,
-                        margin=dict(l=0, r=0, t=10, b=0),
-                        xaxis=dict(title='Hour of Day', dtick=1),
-                        yaxis=dict(title='Revenue ($)', tickformat='$,.0f'),
-                        showlegend=False
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
+                    with daily_comp_col2:
+                        st.caption(f"📊 {p2['date_range']}")
+                        fig_key = figure_key("compare.daily_p2", p2_daily, pattern_metric)
+                        fig = cached_figure(fig_key)
+                        if fig is None:
+                            with perf_span("figure.compare.daily_p2"):
+                                fig = go.Figure()
+                                fig.add_trace(go.Bar(
+                                    x=p2_daily['DateLabel'],
+                                    y=p2_y,
+                                    marker_color=color2,
+                                    hovertemplate=f'<b>%{{x}}</b><br>{y_title}: %{{y:,.0f}}<extra></extra>'
+                                ))
+                                fig.update_layout(
+                                    height=350,
+                                    margin=dict(l=0, r=0, t=10, b=40),
+                                    xaxis=dict(title='Date', tickangle=-45),
+                                    yaxis=dict(title=y_title, tickformat=tick_format),
+                                    showlegend=False
+                                )
+                        show_chart(fig, "compare.daily_p2", fig_key)
                 
-                with hourly_col2:
-                    st.caption(f"📊 {p2['date_range']}")
-                    fig = go.Figure()
+                else:
+                    # Longer periods - show weekly (or monthly) comparison
+                    compare_granularity = choose_granularity(max(p1_days, p2_days))
+                    period_name = 'Month' if compare_granularity == 'month' else 'Week'
+                    with pattern_toggle_col1:
+                        st.caption(f"{period_name}-by-{period_name} Pattern Comparison")
                     
-                    # Line chart for revenue without fill
-                    fig.add_trace(go.Scatter(
-                        x=p2_hourly['Hour'],
-                        y=p2_hourly['Revenue'],
-                        mode='lines',
-                        name='Revenue',
-                        line=dict(color='#B5C99A', width=3),
-                        hovertemplate='Hour: %{x}<br>Revenue: $%{y:,.2f}<extra></extra>'
-                    ))
+                    with perf_span("view.compare.weekly"):
+                        p1_daily = period_aggregate(p1, 'Date').reset_index()
+                        p2_daily = period_aggregate(p2, 'Date').reset_index()
+                        p1_weekly = period_totals(p1_daily, compare_granularity)
+                        p2_weekly = period_totals(p2_daily, compare_granularity)
                     
-                    # Add units as markers
-                    fig.add_trace(go.Scatter(
-                        x=p2_hourly['Hour'],
-                        y=p2_hourly['Revenue'],
-                        mode='markers+text',
-                        marker=dict(size=8, color='#7D8570'),
-                        text=[f"{int(q)}" for q in p2_hourly['Quantity']],
-                        textposition='top center',
-                        textfont=dict(size=9, color='#7D8570'),
-                        showlegend=False,
-                        hovertemplate='Units: %{text}<extra></extra>'
-                    ))
+                    # Choose data
+                    if pattern_metric == "Revenue ($)":
+                        value_column = 'Revenue'
+                        y_title = 'Revenue ($)'
+                        tick_format = '$,.0f'
+                        color1 = '#10b981'
+                        color2 = '#7D8570'
+                    else:
+                        value_column = 'Quantity'
+                        y_title = 'Quantity'
+                        tick_format = ',.0f'
+                        color1 = '#10b981'
+                        color2 = '#7D8570'
+                    hover_template = f'<b>%{{x}}</b><br>{y_title}: %{{y:,.0f}}<extra></extra>'
                     
-                    fig.update_layout(
-                        height=350,
-                        margin=dict(l=0, r=0, t=10, b=0),
-                        xaxis=dict(title='Hour of Day', dtick=1),
-                        yaxis=dict(title='Revenue ($)', tickformat='$,.0f'),
-                        showlegend=False
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                # Peak hours summary
-                p1_peak_hour = p1_hourly.loc[p1_hourly['Revenue'].idxmax(), 'Hour']
-                p2_peak_hour = p2_hourly.loc[p2_hourly['Revenue'].idxmax(), 'Hour']
-                
-                peak_col1, peak_col2 = st.columns(2)
-                with peak_col1:
-                    st.info(f"🕐 Peak Hour: {int(p1_peak_hour)}:00")
-                with peak_col2:
-                    st.info(f"🕐 Peak Hour: {int(p2_peak_hour)}:00")
+                    # Side-by-side weekly charts
+                    weekly_comp_col1, weekly_comp_col2 = st.columns(2)
+                    
+                    with weekly_comp_col1:
+                        st.caption(f"📊 {p1['date_range']}")
+                        fig_key = figure_key("compare.weekly_p1", p1_weekly, p1_daily, pattern_metric, period_name)
+                        fig = cached_figure(fig_key)
+                        if fig is None:
+                            with perf_span("figure.compare.weekly_p1"):
+                                fig = go.Figure()
+                                fig.add_trace(trend_trace(p1_weekly, p1_daily, value_column, color1, hover_template, text_size=9))
+                                fig.update_layout(
+                                    height=350,
+                                    margin=dict(l=0, r=0, t=30, b=40),
+                                    xaxis=dict(title=period_name),
+                                    yaxis=dict(title=y_title, tickformat=tick_format),
+                                    showlegend=False
+                                )
+                        show_chart(fig, "compare.weekly_p1", fig_key)
+                    
+                    with weekly_comp_col2:
+                        st.caption(f"📊 {p2['date_range']}")
+                        fig_key = figure_key("compare.weekly_p2", p2_weekly, p2_daily, pattern_metric, period_name)
+                        fig = cached_figure(fig_key)
+                        if fig is None:
+                            with perf_span("figure.compare.weekly_p2"):
+                                fig = go.Figure()
+                                fig.add_trace(trend_trace(p2_weekly, p2_daily, value_column, color2, hover_template, text_size=9))
+                                fig.update_layout(
+                                    height=350,
+                                    margin=dict(l=0, r=0, t=30, b=40),
+                                    xaxis=dict(title=period_name),
+                                    yaxis=dict(title=y_title, tickformat=tick_format),
+                                    showlegend=False
+                                )
+                        show_chart(fig, "compare.weekly_p2", fig_key)
             
-            # Product-level comparison table
-            st.markdown("---")
-            # Category/Product comparison visualization
-            if selected_category == "All Categories" and selected_product == "All Products":
-                st.subheader("📊 Category Performance Comparison")
+            elif comparison_section == "📈 Top Products":
+                # Side-by-side charts with rank changes
+                st.markdown("### 📈 Top Products Comparison")
                 
-                # Get category data for both periods
-                p1_cat = p1['df'].groupby('Category')['Revenue'].sum()
-                p2_cat = p2['df'].groupby('Category')['Revenue'].sum()
+                # Get top products for both periods
+                with perf_span("view.compare.top_products"):
+                    p1_data = top_k(period_aggregate(p1, 'Description'), 10, by='Revenue')
+                    
+                    p2_data = top_k(period_aggregate(p2, 'Description'), 10, by='Revenue')
                 
-                # Debug info
-                st.caption(f"Period 1 categories: {len(p1_cat)} | Period 2 categories: {len(p2_cat)}")
+                # Rank changes across every product, not just each top 10
+                with perf_span("view.compare.rank_changes"):
+                    ranks = product_ranks(period_aggregate(p1, 'Description'), period_aggregate(p2, 'Description'))
+                    rank_changes = rank_change_labels(ranks).loc[p2_data.index]
+                    p1_rank_numbers = ranks.loc[p1_data.index, 'Rank Before'].astype(int)
+                    p2_rank_numbers = ranks.loc[p2_data.index, 'Rank After'].astype(int)
                 
-                # Create donut charts side by side
-                donut_col1, donut_col2 = st.columns(2)
+                comp_chart_col1, comp_chart_col2 = st.columns(2)
                 
-                with donut_col1:
+                with comp_chart_col1:
                     st.caption(f"📊 {p1['date_range']}")
-                    fig = go.Figure(data=[go.Pie(
-                        labels=p1_cat.index,
-                        values=p1_cat.values,
-                        hole=0.5,
-                        marker=dict(colors=px.colors.qualitative.Pastel),
-                        texttemplate='%{percent}',
-                        textposition='inside',
-                        textfont=dict(size=11, color='white'),
-                        hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
-                    )])
-                    fig.update_layout(
-                        height=450,
-                        margin=dict(l=20, r=20, t=40, b=20),
-                        showlegend=True,
-                        legend=dict(
-                            orientation='v',
-                            yanchor='top',
-                            y=1,
-                            xanchor='left',
-                            x=1.05,
-                            font=dict(size=9)
-                        ),
-                        annotations=[dict(
-                            text=f'${p1_cat.sum():,.0f}',
-                            x=0.5, y=0.5,
-                            font_size=18,
-                            showarrow=False
-                        )]
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
+                    
+                    fig_key = figure_key("compare.top_products_p1", p1_data)
+                    fig = cached_figure(fig_key)
+                    if fig is None:
+                        with perf_span("figure.compare.top_products_p1"):
+                            fig = go.Figure()
+                            fig.add_trace(go.Bar(
+                                x=p1_data.index,
+                                y=p1_data['Revenue'],
+                                marker_color='#7D8570',
+                                text=[f"#{rank}" for rank in p1_rank_numbers],
+                                textposition='outside',
+                                textfont=dict(color='#5A6B5E', size=10),
+                                hovertemplate='<b>%{x}</b><br>$%{y:,.0f} • %{customdata} units<extra></extra>',
+                                customdata=p1_data['Quantity'].astype(int)
+                            ))
+                            fig.update_layout(
+                                showlegend=False, 
+                                height=400, 
+                                margin=dict(l=0, r=0, t=40, b=80),
+                                xaxis={'tickangle': -45, 'title': ''},
+                                yaxis={'tickformat': '$,.0f', 'title': 'Revenue'}
+                            )
+                    show_chart(fig, "compare.top_products_p1", fig_key)
                 
-                with donut_col2:
+                with comp_chart_col2:
                     st.caption(f"📊 {p2['date_range']}")
-                    fig = go.Figure(data=[go.Pie(
-                        labels=p2_cat.index,
-                        values=p2_cat.values,
-                        hole=0.5,
-                        marker=dict(colors=px.colors.qualitative.Set2),
-                        texttemplate='%{percent}',
-                        textposition='inside',
-                        textfont=dict(size=11, color='white'),
-                        hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
-                    )])
-                    fig.update_layout(
-                        height=450,
-                        margin=dict(l=20, r=20, t=40, b=20),
-                        showlegend=True,
-                        legend=dict(
-                            orientation='v',
-                            yanchor='top',
-                            y=1,
-                            xanchor='left',
-                            x=1.05,
-                            font=dict(size=9)
-                        ),
-                        annotations=[dict(
-                            text=f'${p2_cat.sum():,.0f}',
-                            x=0.5, y=0.5,
-                            font_size=18,
-                            showarrow=False
-                        )]
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                # Change summary below donuts
-                st.markdown("#### 📈 Category Changes")
-                
-                # Use full date range as column names to avoid duplicates
-                period1_label = p1['date_range']
-                period2_label = p2['date_range']
-                
-                comp_table = pd.DataFrame({
-                    'Category': p1_cat.index,
-                    period1_label: p1_cat.values,
-                    period2_label: p2_cat.reindex(p1_cat.index, fill_value=0).values
-                })
-                
-                # Add all categories from period 2 that weren't in period 1
-                for cat in p2_cat.index:
-                    if cat not in comp_table['Category'].values:
-                        new_row = pd.DataFrame({
-                            'Category': [cat],
-                            period1_label: [0],
-                            period2_label: [p2_cat[cat]]
-                        })
-                        comp_table = pd.concat([comp_table, new_row], ignore_index=True)
-                
-                comp_table['Change $'] = comp_table[period2_label] - comp_table[period1_label]
-                comp_table['Change %'] = ((comp_table[period2_label] - comp_table[period1_label]) / comp_table[period1_label] * 100).replace([float('inf'), -float('inf')], 100).fillna(0)
-                comp_table = comp_table.sort_values('Change %', ascending=False)
-                comp_table = comp_table.set_index('Category')
+                    
+                    fig_key = figure_key("compare.top_products_p2", p2_data, rank_changes)
+                    fig = cached_figure(fig_key)
+                    if fig is None:
+                        with perf_span("figure.compare.top_products_p2"):
+                            fig = go.Figure()
+                            
+                            # Add rank with rank change indicators
+                            rank_labels = [
+                                f"#{rank} {indicator}" if indicator else f"#{rank}"
+                                for rank, indicator in zip(p2_rank_numbers, rank_changes)
+                            ]
+                            
+                            fig.add_trace(go.Bar(
+                                x=p2_data.index,
+                                y=p2_data['Revenue'],
+                                marker_color='#B5C99A',
+                                text=rank_labels,
+                                textposition='outside',
+                                textfont=dict(color='#5A6B5E', size=10),
+                                hovertemplate='<b>%{x}</b><br>$%{y:,.0f} • %{customdata} units<extra></extra>',
+                                customdata=p2_data['Quantity'].astype(int)
+                            ))
+                            fig.update_layout(
+                                showlegend=False, 
+                                height=400, 
+                                margin=dict(l=0, r=0, t=40, b=80),
+                                xaxis={'tickangle': -45, 'title': ''},
+                                yaxis={'tickformat': '$,.0f', 'title': 'Revenue'}
+                            )
+                    show_chart(fig, "compare.top_products_p2", fig_key)
                 
-                # Apply color-coded styling with arrows
-                def color_change(val):
-                    if val > 0:
-                        return f'background-color: rgba(16, 185, 129, 0.2); color: #10b981; font-weight: bold;'
-                    elif val < 0:
-                        return f'background-color: rgba(239, 68, 68, 0.2); color: #ef4444; font-weight: bold;'
-                    else:
-                        return 'background-color: rgba(156, 163, 175, 0.1); color: #6b7280;'
+                # Biggest moves into or out of the top 50
+                climbers, fallers = rank_movers(ranks, n=3, within=50)
+                new_entries = int(ranks['New'].sum())
+                mover_notes = []
+                if not climbers.empty:
+                    mover_notes.append("🚀 Climbers: " + ", ".join(f"{prod} (↑{int(change)})" for prod, change in climbers.items()))
+                if not fallers.empty:
+                    mover_notes.append("📉 Fallers: " + ", ".join(f"{prod} (↓{int(-change)})" for prod, change in fallers.items()))
+                if new_entries:
+                    mover_notes.append(f"🆕 {new_entries:,} product{'s' if new_entries != 1 else ''} not sold in {p1['date_range']}")
+                if mover_notes:
+                    st.caption(" • ".join(mover_notes))
                 
-                st.dataframe(comp_table.style.format({
-                    period1_label: "${:,.2f}",
-                    period2_label: "${:,.2f}",
-                    'Change $': "${:,.2f}",
-                    'Change %': "{:+.1f}%"
-                }).applymap(color_change, subset=['Change %'])
-                  .bar(subset=['Change $'], align='mid', color=['#ef4444', '#10b981']),
-                use_container_width=True)
+                st.markdown("---")
                 
+                # If specific product selected, show hourly comparison
+                if selected_product != "All Products":
+                    st.subheader(f"⏱️ Hourly Sales Pattern: {selected_product}")
+                    
+                    # Get hourly data for both periods
+                    p1_hourly = period_aggregate(p1, 'Hour').reset_index()
+                    
+                    p2_hourly = period_aggregate(p2, 'Hour').reset_index()
+                    
+                    # Create side-by-side hourly charts
+                    hourly_col1, hourly_col2 = st.columns(2)
+                    
+                    with hourly_col1:
+                        st.caption(f"📊 {p1['date_range']}")
+                        fig_key = figure_key("compare.product_hourly_p1", p1_hourly)
+                        fig = cached_figure(fig_key)
+                        if fig is None:
+                            with perf_span("figure.compare.product_hourly_p1"):
+                                fig = go.Figure()
+                                
+                                # Line chart for revenue without fill
+                                fig.add_trace(go.Scatter(
+                                    x=p1_hourly['Hour'],
+                                    y=p1_hourly['Revenue'],
+                                    mode='lines',
+                                    name='Revenue',
+                                    line=dict(color='#7D8570', width=3),
+                                    hovertemplate='Hour: %{x}<br>Revenue: $%{y:,.2f}<extra></extra>'
+                                ))
+                                
+                                # Add units as markers
+                                fig.add_trace(go.Scatter(
+                                    x=p1_hourly['Hour'],
+                                    y=p1_hourly['Revenue'],
+                                    mode='markers+text',
+                                    marker=dict(size=8, color='#5A6B5E'),
+                                    text=[f"{int(q)}" for q in p1_hourly['Quantity']],
+                                    textposition='top center',
+                                    textfont=dict(size=9, color='#5A6B5E'),
+                                    showlegend=False,
+                                    hovertemplate='Units: %{text}<extra></extra>'
+                                ))
+                                
+                                fig.update_layout(
+                                    height=350,
+                                    margin=dict(l=0, r=0, t=10, b=0),
+                                    xaxis=dict(title='Hour of Day', dtick=1),
+                                    yaxis=dict(title='Revenue ($)', tickformat='$,.0f'),
+                                    showlegend=False
+                                )
+                        show_chart(fig, "compare.product_hourly_p1", fig_key)
+                    
+                    with hourly_col2:
+                        st.caption(f"📊 {p2['date_range']}")
+                        fig_key = figure_key("compare.product_hourly_p2", p2_hourly)
+                        fig = cached_figure(fig_key)
+                        if fig is None:
+                            with perf_span("figure.compare.product_hourly_p2"):
+                                fig = go.Figure()
+                                
+                                # Line chart for revenue without fill
+                                fig.add_trace(go.Scatter(
+                                    x=p2_hourly['Hour'],
+                                    y=p2_hourly['Revenue'],
+                                    mode='lines',
+                                    name='Revenue',
+                                    line=dict(color='#B5C99A', width=3),
+                                    hovertemplate='Hour: %{x}<br>Revenue: $%{y:,.2f}<extra></extra>'
+                                ))
+                                
+                                # Add units as markers
+                                fig.add_trace(go.Scatter(
+                                    x=p2_hourly['Hour'],
+                                    y=p2_hourly['Revenue'],
+                                    mode='markers+text',
+                                    marker=dict(size=8, color='#7D8570'),
+                                    text=[f"{int(q)}" for q in p2_hourly['Quantity']],
+                                    textposition='top center',
+                                    textfont=dict(size=9, color='#7D8570'),
+                                    showlegend=False,
+                                    hovertemplate='Units: %{text}<extra></extra>'
+                                ))
+                                
+                                fig.update_layout(
+                                    height=350,
+                                    margin=dict(l=0, r=0, t=10, b=0),
+                                    xaxis=dict(title='Hour of Day', dtick=1),
+                                    yaxis=dict(title='Revenue ($)', tickformat='$,.0f'),
+                                    showlegend=False
+                                )
+                        show_chart(fig, "compare.product_hourly_p2", fig_key)
+                    
+                    # Peak hours summary
+                    p1_peak_hour = p1_hourly.loc[p1_hourly['Revenue'].idxmax(), 'Hour']
+                    p2_peak_hour = p2_hourly.loc[p2_hourly['Revenue'].idxmax(), 'Hour']
+                    
+                    peak_col1, peak_col2 = st.columns(2)
+                    with peak_col1:
+                        st.info(f"🕐 Peak Hour: {int(p1_peak_hour)}:00")
+                    with peak_col2:
+                        st.info(f"🕐 Peak Hour: {int(p2_peak_hour)}:00")
+            
             else:
-                st.subheader("📊 Product Performance Comparison")
-                
-                p1_prod = p1['df'].groupby('Description')['Revenue'].sum()
-                p2_prod = p2['df'].groupby('Description')['Revenue'].sum()
-                
-                # Donut charts for products
-                donut_col1, donut_col2 = st.columns(2)
-                
-                with donut_col1:
-                    st.caption(f"📊 {p1['date_range']}")
-                    # Show top 6 products + Others
-                    top_6_p1 = p1_prod.nlargest(6)
-                    other_p1 = p1_prod[~p1_prod.index.isin(top_6_p1.index)].sum()
-                    if other_p1 > 0:
-                        plot_data_p1 = pd.concat([top_6_p1, pd.Series({'Others': other_p1})])
-                    else:
-                        plot_data_p1 = top_6_p1
+                # Category/Product comparison visualization
+                if selected_category == "All Categories" and selected_product == "All Products":
+                    st.subheader("📊 Category Performance Comparison")
                     
-                    fig = go.Figure(data=[go.Pie(
-                        labels=plot_data_p1.index,
-                        values=plot_data_p1.values,
-                        hole=0.5,
-                        marker=dict(colors=px.colors.qualitative.Pastel),
-                        texttemplate='%{percent}',
-                        textposition='inside',
-                        textfont=dict(size=11, color='white'),
-                        hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
-                    )])
-                    fig.update_layout(
-                        height=450,
-                        margin=dict(l=20, r=20, t=40, b=20),
-                        showlegend=True,
-                        legend=dict(
-                            orientation='v',
-                            yanchor='top',
-                            y=1,
-                            xanchor='left',
-                            x=1.05,
-                            font=dict(size=9)
-                        ),
-                        annotations=[dict(
-                            text=f'${p1_prod.sum():,.0f}',
-                            x=0.5, y=0.5,
-                            font_size=18,
-                            showarrow=False
-                        )]
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                with donut_col2:
-                    st.caption(f"📊 {p2['date_range']}")
-                    # Show top 6 products + Others
-                    top_6_p2 = p2_prod.nlargest(6)
-                    other_p2 = p2_prod[~p2_prod.index.isin(top_6_p2.index)].sum()
-                    if other_p2 > 0:
-                        plot_data_p2 = pd.concat([top_6_p2, pd.Series({'Others': other_p2})])
-                    else:
-                        plot_data_p2 = top_6_p2
+                    # Get category data for both periods
+                    with perf_span("view.compare.categories"):
+                        p1_cat = period_aggregate(p1, 'Category')['Revenue']
+                        p2_cat = period_aggregate(p2, 'Category')['Revenue']
                     
-                    fig = go.Figure(data=[go.Pie(
-                        labels=plot_data_p2.index,
-                        values=plot_data_p2.values,
-                        hole=0.5,
-                        marker=dict(colors=px.colors.qualitative.Set2),
-                        texttemplate='%{percent}',
-                        textposition='inside',
-                        textfont=dict(size=11, color='white'),
-                        hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
-                    )])
-                    fig.update_layout(
-                        height=450,
-                        margin=dict(l=20, r=20, t=40, b=20),
-                        showlegend=True,
-                        legend=dict(
-                            orientation='v',
-                            yanchor='top',
-                            y=1,
-                            xanchor='left',
-                            x=1.05,
-                            font=dict(size=9)
-                        ),
-                        annotations=[dict(
-                            text=f'${p2_prod.sum():,.0f}',
-                            x=0.5, y=0.5,
-                            font_size=20,
-                            showarrow=False
-                        )]
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                # Change summary
-                st.markdown("#### 📈 Product Changes")
-                
-                # Use full date range as column names to avoid duplicates
-                period1_label = p1['date_range']
-                period2_label = p2['date_range']
-                
-                comp_table = pd.DataFrame({
-                    'Product': p1_prod.index,
-                    period1_label: p1_prod.values,
-                    period2_label: p2_prod.reindex(p1_prod.index, fill_value=0).values
-                })
-                
-                # Add all products from period 2 that weren't in period 1
-                for prod in p2_prod.index:
-                    if prod not in comp_table['Product'].values:
-                        new_row = pd.DataFrame({
-                            'Product': [prod],
-                            period1_label: [0],
-                            period2_label: [p2_prod[prod]]
-                        })
-                        comp_table = pd.concat([comp_table, new_row], ignore_index=True)
-                
-                comp_table['Change $'] = comp_table[period2_label] - comp_table[period1_label]
-                comp_table['Change %'] = ((comp_table[period2_label] - comp_table[period1_label]) / comp_table[period1_label] * 100).replace([float('inf'), -float('inf')], 100).fillna(0)
-                comp_table = comp_table.sort_values('Change %', ascending=False)
-                comp_table = comp_table.set_index('Product')
-                
-                # Apply color-coded styling with arrows
-                def color_change(val):
-                    if val > 0:
-                        return f'background-color: rgba(16, 185, 129, 0.2); color: #10b981; font-weight: bold;'
-                    elif val < 0:
-                        return f'background-color: rgba(239, 68, 68, 0.2); color: #ef4444; font-weight: bold;'
-                    else:
-                        return 'background-color: rgba(156, 163, 175, 0.1); color: #6b7280;'
-                
-                st.dataframe(comp_table.style.format({
-                    period1_label: "${:,.2f}",
-                    period2_label: "${:,.2f}",
-                    'Change $': "${:,.2f}",
-                    'Change %': "{:+.1f}%"
-                }).applymap(color_change, subset=['Change %'])
-                  .bar(subset=['Change $'], align='mid', color=['#ef4444', '#10b981']),
-                use_container_width=True)
-
-elif service and st.session_state.get('folder_id'):
+                    # Debug info
+                    st.caption(f"Period 1 categories: {len(p1_cat)} | Period 2 categories: {len(p2_cat)}")
+                    
+                    # Create donut charts side by side
+                    donut_col1, donut_col2 = st.columns(2)
+                    
+                    with donut_col1:
+                        st.caption(f"📊 {p1['date_range']}")
+                        fig_key = figure_key("compare.category_mix_p1", p1_cat)
+                        fig = cached_figure(fig_key)
+                        if fig is None:
+                            with perf_span("figure.compare.category_mix_p1"):
+                                fig = go.Figure(data=[go.Pie(
+                                    labels=p1_cat.index,
+                                    values=p1_cat.values,
+                                    hole=0.5,
+                                    marker=dict(colors=px.colors.qualitative.Pastel),
+                                    texttemplate='%{percent}',
+                                    textposition='inside',
+                                    textfont=dict(size=11, color='white'),
+                                    hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
+                                )])
+                                fig.update_layout(
+                                    height=450,
+                                    margin=dict(l=20, r=20, t=40, b=20),
+                                    showlegend=True,
+                                    legend=dict(
+                                        orientation='v',
+                                        yanchor='top',
+                                        y=1,
+                                        xanchor='left',
+                                        x=1.05,
+                                        font=dict(size=9)
+                                    ),
+                                    annotations=[dict(
+                                        text=f'${p1_cat.sum():,.0f}',
+                                        x=0.5, y=0.5,
+                                        font_size=18,
+                                        showarrow=False
+                                    )]
+                                )
+                        show_chart(fig, "compare.category_mix_p1", fig_key)
+                    
+                    with donut_col2:
+                        st.caption(f"📊 {p2['date_range']}")
+                        fig_key = figure_key("compare.category_mix_p2", p2_cat)
+                        fig = cached_figure(fig_key)
+                        if fig is None:
+                            with perf_span("figure.compare.category_mix_p2"):
+                                fig = go.Figure(data=[go.Pie(
+                                    labels=p2_cat.index,
+                                    values=p2_cat.values,
+                                    hole=0.5,
+                                    marker=dict(colors=px.colors.qualitative.Set2),
+                                    texttemplate='%{percent}',
+                                    textposition='inside',
+                                    textfont=dict(size=11, color='white'),
+                                    hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
+                                )])
+                                fig.update_layout(
+                                    height=450,
+                                    margin=dict(l=20, r=20, t=40, b=20),
+                                    showlegend=True,
+                                    legend=dict(
+                                        orientation='v',
+                                        yanchor='top',
+                                        y=1,
+                                        xanchor='left',
+                                        x=1.05,
+                                        font=dict(size=9)
+                                    ),
+                                    annotations=[dict(
+                                        text=f'${p2_cat.sum():,.0f}',
+                                        x=0.5, y=0.5,
+                                        font_size=18,
+                                        showarrow=False
+                                    )]
+                                )
+                        show_chart(fig, "compare.category_mix_p2", fig_key)
+                    
+                    # Change summary below donuts
+                    st.markdown("#### 📈 Category Changes")
+                    
+                    # Use full date range as column names to avoid duplicates
+                    period1_label = p1['date_range']
+                    period2_label = p2['date_range']
+                    
+                    with perf_span("view.compare.categories_table"):
+                        comp_table = delta_table(p1_cat, p2_cat, period1_label, period2_label, 'Category')
+                    
+                    # Long tables default to their biggest changes; every row stays one click away
+                    shown_rows = comp_table
+                    if len(comp_table) > DELTA_TABLE_MAX_ROWS:
+                        delta_rows = st.radio(
+                            "Rows:",
+                            ["🔝 Biggest changes", "📋 All categories"],
+                            horizontal=True,
+                            key="category_delta_rows"
+                        )
+                        if delta_rows == "🔝 Biggest changes":
+                            shown_rows = delta_table_rows(comp_table)
+                            st.caption(f"Showing the {len(shown_rows) // 2} largest gains and {len(shown_rows) - len(shown_rows) // 2} largest declines of {len(comp_table):,} categories")
+                    
+                    # Color-coded changes; only the displayed rows are styled
+                    st.dataframe(style_delta_table(shown_rows, period1_label, period2_label), use_container_width=True)
+                    
+                else:
+                    st.subheader("📊 Product Performance Comparison")
+                    
+                    with perf_span("view.compare.products"):
+                        p1_prod = period_aggregate(p1, 'Description')['Revenue']
+                        p2_prod = period_aggregate(p2, 'Description')['Revenue']
+                    
+                    # Donut charts for products
+                    donut_col1, donut_col2 = st.columns(2)
+                    
+                    with donut_col1:
+                        st.caption(f"📊 {p1['date_range']}")
+                        # Show top 6 products + Others
+                        top_6_p1 = top_k(p1_prod, 6)
+                        other_p1 = p1_prod[~p1_prod.index.isin(top_6_p1.index)].sum()
+                        if other_p1 > 0:
+                            plot_data_p1 = pd.concat([top_6_p1, pd.Series({'Others': other_p1})])
+                        else:
+                            plot_data_p1 = top_6_p1
+                        
+                        fig_key = figure_key("compare.product_mix_p1", p1_prod, plot_data_p1)
+                        fig = cached_figure(fig_key)
+                        if fig is None:
+                            with perf_span("figure.compare.product_mix_p1"):
+                                fig = go.Figure(data=[go.Pie(
+                                    labels=plot_data_p1.index,
+                                    values=plot_data_p1.values,
+                                    hole=0.5,
+                                    marker=dict(colors=px.colors.qualitative.Pastel),
+                                    texttemplate='%{percent}',
+                                    textposition='inside',
+                                    textfont=dict(size=11, color='white'),
+                                    hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
+                                )])
+                                fig.update_layout(
+                                    height=450,
+                                    margin=dict(l=20, r=20, t=40, b=20),
+                                    showlegend=True,
+                                    legend=dict(
+                                        orientation='v',
+                                        yanchor='top',
+                                        y=1,
+                                        xanchor='left',
+                                        x=1.05,
+                                        font=dict(size=9)
+                                    ),
+                                    annotations=[dict(
+                                        text=f'${p1_prod.sum():,.0f}',
+                                        x=0.5, y=0.5,
+                                        font_size=18,
+                                        showarrow=False
+                                    )]
+                                )
+                        show_chart(fig, "compare.product_mix_p1", fig_key)
+                    
+                    with donut_col2:
+                        st.caption(f"📊 {p2['date_range']}")
+                        # Show top 6 products + Others
+                        top_6_p2 = top_k(p2_prod, 6)
+                        other_p2 = p2_prod[~p2_prod.index.isin(top_6_p2.index)].sum()
+                        if other_p2 > 0:
+                            plot_data_p2 = pd.concat([top_6_p2, pd.Series({'Others': other_p2})])
+                        else:
+                            plot_data_p2 = top_6_p2
+                        
+                        fig_key = figure_key("compare.product_mix_p2", p2_prod, plot_data_p2)
+                        fig = cached_figure(fig_key)
+                        if fig is None:
+                            with perf_span("figure.compare.product_mix_p2"):
+                                fig = go.Figure(data=[go.Pie(
+                                    labels=plot_data_p2.index,
+                                    values=plot_data_p2.values,
+                                    hole=0.5,
+                                    marker=dict(colors=px.colors.qualitative.Set2),
+                                    texttemplate='%{percent}',
+                                    textposition='inside',
+                                    textfont=dict(size=11, color='white'),
+                                    hovertemplate='<b>%{label}</b><br>$%{value:,.0f} • %{percent}<extra></extra>'
+                                )])
+                                fig.update_layout(
+                                    height=450,
+                                    margin=dict(l=20, r=20, t=40, b=20),
+                                    showlegend=True,
+                                    legend=dict(
+                                        orientation='v',
+                                        yanchor='top',
+                                        y=1,
+                                        xanchor='left',
+                                        x=1.05,
+                                        font=dict(size=9)
+                                    ),
+                                    annotations=[dict(
+                                        text=f'${p2_prod.sum():,.0f}',
+                                        x=0.5, y=0.5,
+                                        font_size=20,
+                                        showarrow=False
+                                    )]
+                                )
+                        show_chart(fig, "compare.product_mix_p2", fig_key)
+                    
+                    # Change summary
+                    st.markdown("#### 📈 Product Changes")
+                    
+                    # Use full date range as column names to avoid duplicates
+                    period1_label = p1['date_range']
+                    period2_label = p2['date_range']
+                    
+                    with perf_span("view.compare.products_table"):
+                        comp_table = delta_table(p1_prod, p2_prod, period1_label, period2_label, 'Product')
+                    
+                    # Long tables default to their biggest changes; every row stays one click away
+                    shown_rows = comp_table
+                    if len(comp_table) > DELTA_TABLE_MAX_ROWS:
+                        delta_rows = st.radio(
+                            "Rows:",
+                            ["🔝 Biggest changes", "📋 All products"],
+                            horizontal=True,
+                            key="product_delta_rows"
+                        )
+                        if delta_rows == "🔝 Biggest changes":
+                            shown_rows = delta_table_rows(comp_table)
+                            st.caption(f"Showing the {len(shown_rows) // 2} largest gains and {len(shown_rows) - len(shown_rows) // 2} largest declines of {len(comp_table):,} products")
+                    
+                    # Color-coded changes; only the displayed rows are styled
+                    st.dataframe(style_delta_table(shown_rows, period1_label, period2_label), use_container_width=True)
+
+elif backend and st.session_state.get('folder_id'):
     # Show date picker at top when Drive is connected but no data loaded yet
     st.markdown("## 📅 Select Date Range to Load Data")
     
@@ -2210,25 +4415,29 @@ elif service and st.session_state.get('folder_id'):
     days_selected = (end_date - start_date).days + 1
     st.info(f"📊 Selected: **{start_date.strftime('%b %d, %Y')}** to **{end_date.strftime('%b %d, %Y')}** ({days_selected} day{'s' if days_selected != 1 else ''})")
     
-    # Load data when button clicked
-    if load_button:
-        with st.spinner("📥 Loading data from Google Drive..."):
-            df, error = process_gdrive_files(
-                service, 
-                st.session_state.folder_id,
-                pd.Timestamp(start_date),
-                pd.Timestamp(end_date)
-            )
-            
-            if error:
-                st.error(error)
-            elif not df.empty:
-                st.session_state.df = df
-                st.session_state.data_loaded = True
-                st.success(f"✅ Loaded {len(df):,} records from {df['Date'].nunique()} days!")
-                st.rerun()
-            else:
-                st.warning("No data found in selected range")
+    # Load in the background; changing the range while loading restarts the job
+    load_job = st.session_state.get('load_jobs', {}).get('main')
+    requested = load_job_key(st.session_state.store_folders, start_date, end_date)
+    if load_button or (load_job is not None and load_job.running and load_job.key != requested):
+        start_load_job('main', backend, st.session_state.store_folders, start_date, end_date)
+    
+    finished_job = follow_load_job('main', "📥 Loading data from Google Drive")
+    if finished_job is not None:
+        df, error, chain_summary, warnings = finished_job.outcome()
+        for warning in warnings:
+            st.warning(warning)
+        
+        if error:
+            st.error(error)
+        elif not df.empty:
+            st.session_state.df = df
+            st.session_state.chain_summary = chain_summary
+            st.session_state.load_warnings = warnings
+            st.session_state.data_loaded = True
+            st.success(f"✅ Loaded {len(df):,} records from {df['Date'].nunique()} days!")
+            st.rerun()
+        else:
+            st.warning("No data found in selected range")
 
 else:
     # Enhanced Welcome Screen
@@ -2322,19 +4531,6 @@ else:
             </ul>
         </div>
         """, unsafe_allow_html=True)
-
-    
-    with col2:
-        st.markdown("""
-        ### ✨ Features:
-        
-        - 📊 Daily/Weekly/Monthly Reports
-        - 🔍 Smart Filtering
-        - 📈 Interactive Charts
-        - 📥 Excel Export
-        - 🔄 Auto-sync from Drive
-        - ⚡ Fast Performance
-        """)
     
     st.markdown("---")
     
@@ -2348,10 +4544,159 @@ else:
         6. Paste it in the sidebar input field
         """)
 
+# --- SALES HISTORY ---
+history_version = sales_history_version()
+if history_version is not None:
+    st.markdown("---")
+    with st.expander("📚 Sales History", expanded=False):
+        st.caption("Answered from the embedded history database, no Google Drive downloads")
+        
+        history_window = st.radio(
+            "Window:",
+            ["Last 3 Months", "Last 12 Months", "Last 24 Months", "All Time"],
+            index=1,
+            horizontal=True,
+            key="history_window"
+        )
+        months_back = {"Last 3 Months": 3, "Last 12 Months": 12, "Last 24 Months": 24}.get(history_window)
+        history_start = (
+            (pd.Timestamp.today().normalize() - pd.DateOffset(months=months_back)).strftime('%Y-%m-%d')
+            if months_back else '0000-00-00'
+        )
+        
+        with perf_span("view.history"):
+            coverage = query_sales_history(
+                "SELECT MIN(Date) AS first_day, MAX(Date) AS last_day, COUNT(DISTINCT Date) AS days "
+                "FROM sales_lines WHERE Date >= ?",
+                (history_start,), db_version=history_version
+            )
+            monthly_history = query_sales_history(
+                "SELECT Month, SUM(Revenue) AS Revenue, SUM(Quantity) AS Quantity "
+                "FROM sales_lines WHERE Date >= ? GROUP BY Month ORDER BY Month",
+                (history_start,), db_version=history_version
+            )
+            top_history = query_sales_history(
+                "SELECT Description AS Product, Category, SUM(Revenue) AS Revenue, SUM(Quantity) AS Quantity "
+                "FROM sales_lines WHERE Date >= ? GROUP BY Description, Category "
+                "ORDER BY Revenue DESC LIMIT 10",
+                (history_start,), db_version=history_version
+            )
+        
+        if monthly_history.empty:
+            st.info("No stored history in this window yet. Loaded days are added automatically.")
+        else:
+            st.caption(
+                f"📅 {coverage['first_day'][0]} — {coverage['last_day'][0]} • "
+                f"{int(coverage['days'][0])} days stored"
+            )
+            
+            history_col1, history_col2 = st.columns(2)
+            with history_col1:
+                st.subheader("📈 Monthly Revenue")
+                fig_key = figure_key("history.monthly", monthly_history)
+                fig = cached_figure(fig_key)
+                if fig is None:
+                    with perf_span("figure.history.monthly"):
+                        fig = go.Figure()
+                        fig.add_trace(go.Bar(
+                            x=monthly_history['Month'],
+                            y=monthly_history['Revenue'],
+                            marker_color='#7D8570',
+                            hovertemplate='<b>%{x}</b><br>Revenue: $%{y:,.0f}<extra></extra>'
+                        ))
+                        fig.update_layout(
+                            height=350,
+                            margin=dict(l=0, r=0, t=20, b=40),
+                            xaxis=dict(title='Month'),
+                            yaxis=dict(title='Revenue ($)', tickformat='$,.0f'),
+                            showlegend=False
+                        )
+                show_chart(fig, "history.monthly", fig_key)
+            
+            with history_col2:
+                st.subheader("🏆 Top 10 Products")
+                st.dataframe(top_history.set_index('Product').style.format({
+                    'Revenue': "${:,.2f}",
+                    'Quantity': "{:,.0f}"
+                }), use_container_width=True)
+
+# --- SIDEBAR: PERFORMANCE PANEL ---
+# Background loads keep recording while the panel renders, so it works on a snapshot
+perf_metrics = perf_metrics_snapshot()
+with st.sidebar.expander("⏱ Performance", expanded=False):
+    if perf_metrics['spans']:
+        span_table = pd.DataFrame([
+            {
+                'Stage': name,
+                'Last (ms)': span['last'] * 1000,
+                'Avg (ms)': span['total'] / span['count'] * 1000,
+                'Max (ms)': span['max'] * 1000,
+                'Calls': span['count']
+            }
+            for name, span in perf_metrics['spans'].items()
+        ]).sort_values('Last (ms)', ascending=False)
+        st.dataframe(span_table.style.format({
+            'Last (ms)': "{:,.1f}",
+            'Avg (ms)': "{:,.1f}",
+            'Max (ms)': "{:,.1f}"
+        }), use_container_width=True, hide_index=True)
+    else:
+        st.caption("No timings recorded yet")
+    
+    counters = perf_metrics['counters']
+    st.caption(
+        f"📥 {counters.get('bytes_downloaded', 0) / 1e6:,.1f} MB downloaded • "
+        f"📤 {counters.get('bytes_uploaded', 0) / 1e6:,.1f} MB uploaded • "
+        f"📝 {counters.get('rows_processed', 0):,} rows • "
+        f"📄 {counters.get('files_processed', 0):,} files"
+    )
+    chunk_spans = sorted(
+        (name[len('drive.chunk.'):], span) for name, span in perf_metrics['spans'].items()
+        if name.startswith('drive.chunk.') and span['total']
+    )
+    if chunk_spans:
+        st.caption(" • ".join(
+            f"📶 {size} chunks: {counters.get(f'drive_chunk_bytes_{size}', 0) / span['total'] / 1e6:,.2f} MB/s"
+            for size, span in chunk_spans
+        ))
+    if isinstance(backend, DriveBackend):
+        drive_usage = get_drive_scheduler().usage()
+        st.caption(
+            f"🚦 Drive this minute: {drive_usage['requests']:,} requests • "
+            f"{drive_usage['throttled']:,} throttled • {drive_usage['retries']:,} retries • "
+            f"concurrency limit {drive_usage['limit']}"
+        )
+    
+    perf_col1, perf_col2 = st.columns(2)
+    with perf_col1:
+        st.download_button(
+            "📈 Prometheus",
+            data=perf_metrics_prometheus(perf_metrics),
+            file_name="dashboard_metrics.prom",
+            mime="text/plain",
+            use_container_width=True
+        )
+    with perf_col2:
+        st.download_button(
+            "🧾 JSON",
+            data=json.dumps(perf_metrics, indent=2),
+            file_name="dashboard_metrics.json",
+            mime="application/json",
+            use_container_width=True
+        )
+    if st.button("🧹 Reset Timings", use_container_width=True):
+        st.session_state.perf_metrics = {'spans': {}, 'counters': {}}
+        st.rerun()
+
 st.markdown("---")
 st.markdown("""
 <div style='text-align: center; padding: 20px; color: #6B705C; font-size: 13px;'>
     <p style='margin: 0;'><strong>Your Business</strong> | Your Business Retail Sales Analytics Dashboard</p>
     <p style='margin: 5px 0 0 0; opacity: 0.7;'>Open Source Sales Dashboard - Contribute on GitHub!</p>
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+# --- BACKGROUND LOAD POLLING ---
+# Runs last so the whole page has rendered before waiting for the next poll
+if any(job.running for job in st.session_state.get('load_jobs', {}).values()):
+    time.sleep(LOAD_POLL_SECONDS)
+    st.rerun()
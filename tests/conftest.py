@@ -0,0 +1,81 @@
+import importlib
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRODUCTS = ["TMB Sourdough Loaf", "Croissant", "Almond Danish", "Cookie Choc", "BAH Escargot", "Baguette"]
+
+
+@pytest.fixture(scope="session")
+def dashboard(tmp_path_factory):
+    """The dashboard module, imported headless with its on-disk caches in a temp dir"""
+    cache_root = tmp_path_factory.mktemp("caches")
+    os.environ.pop('DATA_BACKEND', None)
+    os.environ['COLUMNAR_CACHE_DIR'] = str(cache_root / "columnar")
+    os.environ['SALES_LAKE_DIR'] = str(cache_root / "lake")
+    sys.path.insert(0, REPO_ROOT)
+    return importlib.import_module("sales_dashboard")
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(dashboard, monkeypatch):
+    """Start every test with empty in-process caches and near-instant Drive backoff"""
+    dashboard.get_shared_data_cache.clear()
+    dashboard.get_fetch_flights.clear()
+    monkeypatch.setattr(dashboard, 'DRIVE_BACKOFF_BASE', 0.001)
+    monkeypatch.setattr(dashboard, 'DRIVE_BACKOFF_MAX', 0.01)
+
+
+def write_daily_exports(folder, start, days, lines, seed):
+    """Write one POS export per day (Drive file naming) and return the raw line items"""
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    frames = []
+    for offset in range(days):
+        date = pd.Timestamp(start) + pd.Timedelta(days=offset)
+        day = pd.DataFrame({
+            'Saledate': date,
+            'Description': rng.choice(PRODUCTS, lines),
+            'Quantity': rng.integers(1, 4, lines),
+            'ExtendedNetAmount': rng.integers(300, 2000, lines) / 100,
+            'SequenceNumber': rng.integers(1, lines // 3, lines),
+            'Hour_ID': rng.integers(7, 21, lines)
+        })
+        day.to_excel(os.path.join(folder, f"DailyIncrementalSales_{date:%Y%m%d}.xlsx"), index=False)
+        frames.append(day)
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.fixture
+def store_exports(tmp_path):
+    """Four days of exports for two stores, one subfolder each: (root, raw line items by store)"""
+    raw = {
+        store: write_daily_exports(tmp_path / store, "2025-03-01", 4, lines=60, seed=seed)
+        for seed, store in enumerate(["North", "South"])
+    }
+    return tmp_path, raw
+
+
+CATEGORIES = {"TMB Sourdough Loaf": "Bread", "Baguette": "Bread", "Croissant": "Pastry",
+              "Almond Danish": "Pastry", "BAH Escargot": "Pastry", "Cookie Choc": "Cookies"}
+
+
+def sales_lines(start, days, lines, seed, stores=("North", "South")):
+    """Cleaned line items, as load_store_folders returns them, for a few stores and days"""
+    rng = np.random.default_rng(seed)
+    n = days * lines * len(stores)
+    products = rng.choice(PRODUCTS, n)
+    return pd.DataFrame({
+        'Store': np.repeat(stores, days * lines),
+        'Date': pd.Timestamp(start) + pd.to_timedelta(np.tile(np.repeat(np.arange(days), lines), len(stores)), unit='D'),
+        'Description': products,
+        'Category': [CATEGORIES[product] for product in products],
+        'Hour': rng.integers(7, 21, n),
+        'Revenue': rng.integers(300, 2000, n) / 100,
+        'Quantity': rng.integers(1, 4, n).astype(float),
+        'SequenceNumber': rng.integers(1, max(lines // 3, 2), n).astype(str)
+    })
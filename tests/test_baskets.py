@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import CATEGORIES
+
+
+def basket_lines(dashboard, baskets):
+    """Cleaned line items for {(store, day, receipt): [products]} and their transaction index"""
+    rows = [
+        {'Store': store, 'Date': pd.Timestamp("2025-03-01") + pd.Timedelta(days=day), 'SequenceNumber': str(receipt),
+         'Description': product, 'Category': CATEGORIES[product], 'Revenue': 1.0, 'Quantity': 1.0}
+        for (store, day, receipt), products in baskets.items() for product in products
+    ]
+    return dashboard.build_transaction_index(pd.DataFrame(rows))
+
+
+BASKETS = {
+    ('North', 0, 1): ["Croissant", "Baguette", "Croissant"],  # A product on two lines is one basket entry
+    ('North', 0, 2): ["Croissant", "Baguette"],
+    ('North', 0, 3): ["Croissant"],
+    ('North', 1, 1): ["Baguette", "Cookie Choc"],  # Same receipt number on another day is another basket
+    ('South', 0, 1): ["Croissant", "Baguette"]  # ... and so is the same receipt in another store
+}
+
+
+def test_co_purchase_counts_equal_incidence_product(dashboard):
+    rng = np.random.default_rng(0)
+    incidence = rng.random((200, 12)) < 0.2
+    basket_codes, product_codes = np.nonzero(incidence)
+    
+    counts = dashboard.co_purchase_counts(basket_codes, product_codes, 12)
+    
+    dense = incidence.astype(np.int64)
+    np.testing.assert_array_equal(counts, dense.T @ dense)
+
+
+def test_pairs_attach_rate_and_lift(dashboard):
+    analysis = dashboard.analyze_baskets(basket_lines(dashboard, BASKETS))
+    
+    assert analysis['baskets'] == analysis['all_baskets'] == 5
+    assert analysis['avg_products'] == pytest.approx(9 / 5)
+    assert analysis['multi_product_share'] == pytest.approx(80)
+    
+    pairs = analysis['pairs'].set_index(['Product', 'Bought With'])
+    assert len(pairs) == 2
+    croissant_baguette = pairs.loc[[p for p in pairs.index if set(p) == {"Croissant", "Baguette"}][0]]
+    assert croissant_baguette['Baskets Together'] == 3
+    assert croissant_baguette['Attach Rate'] == pytest.approx(75)
+    assert croissant_baguette['Lift'] == pytest.approx(3 * 5 / (4 * 4))
+    
+    rates = dashboard.attach_rates(analysis, "Baguette").set_index('Bought With')
+    assert rates.loc["Croissant", 'Attach Rate'] == pytest.approx(75)
+    assert rates.loc["Cookie Choc", 'Attach Rate'] == pytest.approx(25)
+    assert rates.loc["Cookie Choc", 'Lift'] == pytest.approx(1 * 5 / (4 * 1))
+
+
+def test_category_stats_cover_baskets_with_a_category_product(dashboard):
+    analysis = dashboard.analyze_baskets(basket_lines(dashboard, BASKETS), category="Pastry")
+    
+    assert analysis['baskets'] == 4 and analysis['all_baskets'] == 5
+    assert analysis['avg_products'] == pytest.approx(7 / 4)
+    assert list(analysis['products']) == ["Croissant"]
+
+
+def test_store_filter(dashboard):
+    analysis = dashboard.analyze_baskets(basket_lines(dashboard, BASKETS), store="North")
+    
+    assert analysis['baskets'] == 4
+    assert analysis['multi_product_share'] == pytest.approx(75)
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+
+def daily_totals(days, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Date': pd.date_range("2020-01-01", periods=days),
+        'Revenue': rng.integers(500, 5000, days).astype(float),
+        'Quantity': rng.integers(50, 500, days).astype(float)
+    })
+
+
+def test_lttb_keeps_endpoints_and_extremes(dashboard):
+    x = np.arange(10_000)
+    y = np.sin(x / 500) * 100
+    y[4321] = 1_000  # A single spike must survive downsampling
+    
+    keep = dashboard.lttb_downsample(x, y, 400)
+    
+    assert len(keep) == 400 and keep[0] == 0 and keep[-1] == len(x) - 1
+    assert np.all(np.diff(keep) > 0) and 4321 in keep
+
+
+def test_long_ranges_draw_a_bounded_svg_line(dashboard):
+    totals = daily_totals(2_000)
+    periods = dashboard.period_totals(totals, 'month')
+    
+    trace = dashboard.trend_trace(periods, totals, 'Revenue', '#7D8570', '%{y}')
+    
+    assert isinstance(trace, go.Scatter)
+    assert len(trace.x) == dashboard.MAX_LINE_POINTS
+
+
+def test_short_ranges_draw_labelled_bars(dashboard):
+    totals = daily_totals(10)
+    periods = dashboard.period_totals(totals, dashboard.choose_granularity(10))
+    
+    trace = dashboard.trend_trace(periods, totals, 'Quantity', '#7D8570', '%{y}')
+    
+    assert isinstance(trace, go.Bar) and len(trace.x) == 10 and len(trace.text) == 10
@@ -0,0 +1,41 @@
+import pytest
+import pandas as pd
+
+
+def test_change_from_zero_base(dashboard):
+    before = pd.Series({'Bread': 200.0, 'Pastry': 0.0, 'Drinks': 50.0, 'Cakes': 0.0})
+    after = pd.Series({'Bread': 250.0, 'Pastry': 80.0, 'Cakes': 0.0, 'Coffee': 30.0})
+    
+    table = dashboard.delta_table(before, after, "Before", "After", "Category")
+    
+    assert table.index.name == "Category"
+    assert table.loc['Bread', 'Change %'] == pytest.approx(25.0)
+    assert table.loc['Pastry', 'Change %'] == 100.0  # Gain from zero
+    assert table.loc['Coffee', 'Change %'] == 100.0  # Missing before counts as zero
+    assert table.loc['Drinks', 'Change %'] == -100.0  # Missing after counts as zero
+    assert table.loc['Cakes', 'Change %'] == 0.0  # Zero in both periods
+    assert table.loc['Coffee', ['Before', 'Change $']].tolist() == [0.0, 30.0]
+    assert table.loc['Drinks', 'Change $'] == -50.0
+    assert table['Change %'].is_monotonic_decreasing
+    assert table['Change %'].notna().all()
+
+
+def test_negative_base_uses_its_size(dashboard):
+    table = dashboard.delta_table(pd.Series({'Refunds': -40.0}), pd.Series({'Refunds': -10.0}), "Before", "After", "Category")
+    
+    assert table.loc['Refunds', 'Change %'] == pytest.approx(75.0)  # A smaller loss is a gain
+
+
+@pytest.mark.parametrize("rows", [4, 10])
+def test_short_tables_show_every_row(dashboard, rows):
+    table = pd.DataFrame({'Change %': range(rows, 0, -1)})
+    
+    pd.testing.assert_frame_equal(dashboard.delta_table_rows(table, max_rows=10), table)
+
+
+def test_long_tables_show_biggest_gains_and_declines(dashboard):
+    table = pd.DataFrame({'Change %': range(25, 0, -1)})
+    
+    rows = dashboard.delta_table_rows(table, max_rows=5)
+    
+    assert rows['Change %'].tolist() == [25, 24, 3, 2, 1]
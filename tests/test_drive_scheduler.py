@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+
+def http_error(status, reason=None, **headers):
+    content = json.dumps({'error': {'code': status, 'errors': [{'reason': reason}] if reason else []}}).encode()
+    return HttpError(httplib2.Response({'status': status, **headers}), content)
+
+
+class FlakyRequest:
+    """A Drive request failing with the given errors before it succeeds"""
+    
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+    
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def sleeps(dashboard, monkeypatch):
+    """Backoff delays taken by the scheduler (at their upper bound, without sleeping)"""
+    delays = []
+    monkeypatch.setattr(dashboard, 'DRIVE_BACKOFF_BASE', 1.0)
+    monkeypatch.setattr(dashboard, 'DRIVE_BACKOFF_MAX', 6.0)
+    monkeypatch.setattr(dashboard.random, 'uniform', lambda low, high: high)
+    monkeypatch.setattr(dashboard.time, 'sleep', delays.append)
+    return delays
+
+
+@pytest.mark.parametrize("error, kind", [
+    (http_error(429), 'throttled'),
+    (http_error(403, 'userRateLimitExceeded'), 'throttled'),
+    (http_error(403, 'rateLimitExceeded'), 'throttled'),
+    (http_error(403, 'insufficientFilePermissions'), None),
+    (http_error(404, 'notFound'), None),
+    (http_error(503), 'transient'),
+    (ConnectionResetError("reset"), 'transient')
+])
+def test_error_kinds(dashboard, error, kind):
+    assert dashboard.drive_error_kind(error) == kind
+
+
+def test_retries_with_capped_exponential_backoff(dashboard, sleeps):
+    scheduler = dashboard.DriveQuotaScheduler(1000, 8, max_retries=8)
+    request = FlakyRequest(*[http_error(429)] * 4, http_error(503))
+    
+    assert scheduler.call(request) == "ok"
+    
+    assert request.calls == 6
+    assert sleeps == [1.0, 2.0, 4.0, 6.0, 6.0]
+    usage = scheduler.usage()
+    assert (usage['requests'], usage['throttled'], usage['retries'], usage['failed']) == (6, 4, 5, 0)
+
+
+def test_retry_after_header_is_honoured(dashboard, sleeps):
+    scheduler = dashboard.DriveQuotaScheduler(1000, 8, max_retries=8)
+    
+    assert scheduler.call(FlakyRequest(http_error(429, **{'retry-after': '30'}))) == "ok"
+    assert sleeps == [30.0]
+
+
+def test_permanent_errors_are_not_retried(dashboard, sleeps):
+    scheduler = dashboard.DriveQuotaScheduler(1000, 8, max_retries=8)
+    request = FlakyRequest(http_error(404, 'notFound'))
+    
+    with pytest.raises(HttpError):
+        scheduler.call(request)
+    assert request.calls == 1 and sleeps == [] and scheduler.usage()['failed'] == 1
+
+
+def test_gives_up_after_max_retries(dashboard, sleeps):
+    scheduler = dashboard.DriveQuotaScheduler(1000, 8, max_retries=3)
+    request = FlakyRequest(*[ConnectionResetError("reset")] * 10)
+    
+    with pytest.raises(ConnectionResetError):
+        scheduler.call(request)
+    assert request.calls == 4 and len(sleeps) == 3
+
+
+def test_concurrency_limit_halves_on_throttle_and_grows_back(dashboard, sleeps):
+    scheduler = dashboard.DriveQuotaScheduler(1000, 8, max_retries=8)
+    
+    scheduler.call(FlakyRequest(*[http_error(429)] * 5))
+    assert scheduler.limit == 2.0  # 8 -> 4 -> 2 -> 1, floored at 1, then +1/limit for the success
+    
+    scheduler.call(FlakyRequest())
+    assert scheduler.limit == 2.5
+    
+    for _ in range(200):
+        scheduler.call(FlakyRequest())
+    assert scheduler.limit == 8.0  # Additive increase stops at max_concurrency
+
+
+def test_in_flight_requests_stay_under_the_limit(dashboard):
+    scheduler = dashboard.DriveQuotaScheduler(1000, 3, max_retries=0)
+    lock, in_flight, peak = threading.Lock(), [0], [0]
+    
+    def request():
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+    
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        list(pool.map(lambda _: scheduler.call(request), range(36)))
+    assert peak[0] == 3
+
+
+def test_token_bucket_keeps_the_request_rate(dashboard):
+    scheduler = dashboard.DriveQuotaScheduler(50, 8, max_retries=0)
+    
+    start = time.monotonic()
+    for _ in range(75):
+        scheduler.call(lambda: None)
+    
+    assert time.monotonic() - start >= 0.45  # A burst of 50, then 25 more at 50/s
@@ -0,0 +1,58 @@
+import itertools
+
+import pandas as pd
+
+from conftest import sales_lines
+
+
+def masked(df, store, category, product):
+    mask = pd.Series(True, index=df.index)
+    if store != "All Stores":
+        mask &= df['Store'] == store
+    if category != "All Categories":
+        mask &= df['Category'] == category
+    if product != "All Products":
+        mask &= df['Description'] == product
+    return df[mask]
+
+
+def test_filter_rows_match_boolean_masks(dashboard):
+    df = sales_lines("2025-03-01", days=3, lines=50, seed=1).sample(frac=1, random_state=1)  # Unsorted index
+    index = dashboard.build_filter_index(df)
+    
+    for store, category, product in itertools.product(
+        ["All Stores", "North", "South"],
+        ["All Categories", "Bread", "Pastry"],
+        ["All Products", "Croissant", "Baguette"]
+    ):
+        pd.testing.assert_frame_equal(dashboard.filter_rows(df, index, store, category, product), masked(df, store, category, product))
+
+
+def test_unfiltered_frame_is_returned_as_is(dashboard):
+    df = sales_lines("2025-03-01", days=1, lines=20, seed=2)
+    
+    assert dashboard.filter_rows(df, dashboard.build_filter_index(df)) is df
+
+
+def test_no_matching_rows_keeps_the_columns(dashboard):
+    df = sales_lines("2025-03-01", days=1, lines=20, seed=3)
+    
+    empty = dashboard.filter_rows(df, dashboard.build_filter_index(df), "North", "Bread", "Croissant")
+    
+    assert empty.empty and list(empty.columns) == list(df.columns)
+
+
+def test_options_are_scoped_to_the_store_and_category(dashboard):
+    df = pd.concat([
+        sales_lines("2025-03-01", days=1, lines=40, seed=4, stores=("North",)),
+        pd.DataFrame([{'Store': 'South', 'Date': pd.Timestamp("2025-03-01"), 'Description': "Baguette",
+                       'Category': "Bread", 'Hour': 9, 'Revenue': 4.0, 'Quantity': 1.0, 'SequenceNumber': "1"}])
+    ], ignore_index=True)
+    index = dashboard.build_filter_index(df)
+    
+    assert index['stores'] == ["North", "South"]
+    assert dashboard.filter_options(index, "South") == (["Bread"], ["Baguette"])
+    categories, products = dashboard.filter_options(index)
+    assert categories == sorted(df['Category'].unique()) and products == sorted(df['Description'].unique())
+    assert dashboard.filter_options(index, "All Stores", "Pastry")[1] == sorted(df.loc[df['Category'] == "Pastry", 'Description'].unique())
+    assert dashboard.filter_options(index, "Harbour St") == ([], [])
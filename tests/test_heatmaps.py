@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from conftest import sales_lines
+
+
+def test_date_rows_match_a_pivot_table(dashboard):
+    df = sales_lines("2025-03-01", days=9, lines=40, seed=1)
+    df = df[df['Date'] != pd.Timestamp("2025-03-05")]  # A closed day still gets a (zero) row
+    
+    grid, labels = dashboard.hourly_heatmap(df, rows='date')
+    
+    expected = df.pivot_table(index='Date', columns='Hour', values='Revenue', aggfunc='sum', fill_value=0)
+    expected = expected.reindex(index=pd.date_range("2025-03-01", periods=9), columns=range(24), fill_value=0)
+    np.testing.assert_allclose(grid, expected.to_numpy())
+    assert labels[0] == "Mar 01, 2025" and len(labels) == 9
+
+
+def test_weekday_rows_average_per_trading_day(dashboard):
+    df = sales_lines("2025-03-03", days=14, lines=40, seed=2)  # Two of every weekday
+    
+    grid, labels = dashboard.hourly_heatmap(df, rows='weekday', value='Quantity')
+    
+    by_day = df.groupby([df['Date'].dt.dayofweek, 'Hour'])['Quantity'].sum().unstack(fill_value=0)
+    np.testing.assert_allclose(grid[:, 7:21], by_day.reindex(columns=range(7, 21), fill_value=0).to_numpy() / 2)
+    assert labels == dashboard.WEEKDAY_NAMES
+
+
+def test_empty_frame_gives_an_empty_grid(dashboard):
+    empty = sales_lines("2025-03-01", days=1, lines=10, seed=3).iloc[:0]
+    
+    grid, labels = dashboard.hourly_heatmap(empty, rows='date')
+    assert grid.shape == (0, 24) and labels == []
+    
+    grid, labels = dashboard.hourly_heatmap(empty, rows='weekday')
+    assert grid.shape == (7, 24) and not grid.any()
@@ -0,0 +1,39 @@
+import pytest
+import pandas as pd
+
+STORE_FOLDERS = {'North': 'North', 'South': 'South'}
+START, END = pd.Timestamp("2025-03-01"), pd.Timestamp("2025-03-04")
+
+
+def stored_revenue(dashboard):
+    return dashboard.query_sales_history(
+        "SELECT Store, SUM(Revenue) AS Revenue FROM sales_lines GROUP BY Store ORDER BY Store",
+        db_version=dashboard.sales_history_version()
+    ).set_index('Store')['Revenue']
+
+
+def test_reloading_a_range_replaces_its_days(dashboard, store_exports, tmp_path, monkeypatch):
+    root, raw = store_exports
+    monkeypatch.setattr(dashboard, 'SALES_DB_PATH', str(tmp_path / "history.sqlite"))
+    backend = dashboard.LocalDirectoryBackend(str(root))
+    
+    for _ in range(2):
+        dashboard.get_shared_data_cache.clear()
+        _, error, _, warnings = dashboard.load_store_folders(backend, STORE_FOLDERS, START, END)
+        assert error is None and warnings == []
+    
+    revenue = stored_revenue(dashboard)
+    for store, lines in raw.items():
+        assert revenue[store] == pytest.approx(lines['ExtendedNetAmount'].sum())
+
+
+def test_failed_history_write_is_a_load_warning(dashboard, store_exports, tmp_path, monkeypatch):
+    root, _ = store_exports
+    monkeypatch.setattr(dashboard, 'SALES_DB_PATH', str(tmp_path))  # A directory can't be opened as a database
+    backend = dashboard.LocalDirectoryBackend(str(root))
+    
+    df, error, _, warnings = dashboard.load_store_folders(backend, STORE_FOLDERS, START, END)
+    
+    assert error is None and not df.empty
+    assert sorted(warning.split(':')[0] for warning in warnings) == ['North', 'South']
+    assert all("Sales history not updated for 4 day(s)" in warning for warning in warnings)
@@ -0,0 +1,82 @@
+import pytest
+import pandas as pd
+
+from conftest import write_daily_exports
+
+STORE_FOLDERS = {'North': 'North', 'South': 'South'}
+START, END = pd.Timestamp("2025-03-01"), pd.Timestamp("2025-03-04")
+
+
+def sorted_lines(df):
+    return df.sort_values(['Store', 'Date', 'SequenceNumber', 'Description', 'Revenue'], ignore_index=True)
+
+
+def test_local_backend_loads_every_store(dashboard, store_exports):
+    root, raw = store_exports
+    backend = dashboard.LocalDirectoryBackend(str(root))
+    
+    df, error, chain_summary, warnings = dashboard.load_store_folders(backend, STORE_FOLDERS, START, END)
+    
+    assert error is None and warnings == []
+    assert set(df['Store']) == {'North', 'South'}
+    for store, lines in raw.items():
+        store_df = df[df['Store'] == store]
+        assert len(store_df) == len(lines)
+        assert store_df['Revenue'].sum() == pytest.approx(lines['ExtendedNetAmount'].sum())
+    assert chain_summary['revenue'] == pytest.approx(df['Revenue'].sum())
+
+
+def test_date_range_selects_daily_files(dashboard, store_exports):
+    root, _ = store_exports
+    backend = dashboard.LocalDirectoryBackend(str(root))
+    
+    df, error, _, _ = dashboard.load_store_folders(backend, {'North': 'North'}, pd.Timestamp("2025-03-02"), pd.Timestamp("2025-03-03"))
+    
+    assert error is None
+    assert sorted(df['Date'].dt.strftime('%Y-%m-%d').unique()) == ['2025-03-02', '2025-03-03']
+
+
+def test_range_without_files_is_an_error(dashboard, store_exports):
+    root, _ = store_exports
+    backend = dashboard.LocalDirectoryBackend(str(root))
+    
+    df, error, chain_summary, _ = dashboard.load_store_folders(backend, STORE_FOLDERS, pd.Timestamp("2024-01-01"), pd.Timestamp("2024-01-31"))
+    
+    assert df.empty and error and chain_summary is None
+
+
+def test_fake_drive_matches_local_folder_despite_faults(dashboard, store_exports):
+    root, _ = store_exports
+    local_df, error, _, _ = dashboard.load_store_folders(
+        dashboard.LocalDirectoryBackend(str(root)), STORE_FOLDERS, START, END
+    )
+    assert error is None
+    
+    dashboard.get_shared_data_cache.clear()
+    fake = dashboard.FakeDriveService(str(root), error_rate=0.2, drop_rate=0.2, page_size=2, seed=7)
+    scheduler = dashboard.DriveQuotaScheduler(1000, 4, 20)
+    backend = dashboard.DriveBackend(fake, scheduler=scheduler)
+    drive_df, error, _, warnings = dashboard.load_store_folders(backend, STORE_FOLDERS, START, END)
+    
+    assert error is None and warnings == []
+    assert fake.stats['pages'] > len(STORE_FOLDERS)  # Listings were paginated
+    assert fake.stats['throttled'] > 0 and fake.stats['dropped'] > 0
+    pd.testing.assert_frame_equal(sorted_lines(drive_df), sorted_lines(local_df))
+
+
+def test_missing_store_folder_is_reported_not_loaded_from_root(dashboard, store_exports):
+    root, raw = store_exports
+    write_daily_exports(root, "2025-03-01", 4, lines=30, seed=9)  # Files in the root must not stand in for South
+    folders = {'North': 'North', 'South': 'Suoth'}
+    backends = [
+        dashboard.LocalDirectoryBackend(str(root)),
+        dashboard.DriveBackend(dashboard.FakeDriveService(str(root)), scheduler=dashboard.DriveQuotaScheduler(1000, 4, 2))
+    ]
+    for backend in backends:
+        dashboard.get_shared_data_cache.clear()
+        df, error, chain_summary, warnings = dashboard.load_store_folders(backend, folders, START, END)
+        
+        assert error is None
+        assert set(df['Store']) == {'North'} and len(df) == len(raw['North'])
+        assert len(warnings) == 1 and warnings[0].startswith("South: Error listing files")
+        assert chain_summary['revenue'] == pytest.approx(raw['North']['ExtendedNetAmount'].sum())
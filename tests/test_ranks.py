@@ -0,0 +1,51 @@
+import pandas as pd
+
+
+def totals(revenue):
+    return pd.DataFrame({'Revenue': revenue}, dtype=float)
+
+
+def test_dense_ranks_changes_and_flags(dashboard):
+    before = totals({'Bagel': 50, 'Baguette': 40, 'Croissant': 40, 'Muffin': 10})
+    after = totals({'Baguette': 90, 'Bagel': 50, 'Croissant': 30, 'Scone': 30})
+    
+    ranks = dashboard.product_ranks(before, after)
+    
+    assert ranks.loc[['Bagel', 'Baguette', 'Croissant', 'Muffin'], 'Rank Before'].tolist() == [1, 2, 2, 3]
+    assert ranks.loc[['Baguette', 'Bagel', 'Croissant', 'Scone'], 'Rank After'].tolist() == [1, 2, 3, 3]  # Ties share a rank
+    assert ranks.loc[['Bagel', 'Baguette', 'Croissant'], 'Rank Change'].tolist() == [-1, 1, -1]
+    assert ranks['New'][ranks['New']].index.tolist() == ['Scone']
+    assert ranks['Dropped'][ranks['Dropped']].index.tolist() == ['Muffin']
+    assert ranks.loc[['Muffin', 'Scone'], 'Rank Change'].isna().all()
+
+
+def test_rank_change_labels(dashboard):
+    before = totals({'Eclair': 60, 'Bagel': 50, 'Baguette': 40, 'Croissant': 30, 'Muffin': 20})
+    after = totals({'Eclair': 95, 'Muffin': 90, 'Bagel': 50, 'Baguette': 40, 'Scone': 5})
+    
+    labels = dashboard.rank_change_labels(dashboard.product_ranks(before, after))
+    
+    assert labels.to_dict() == {
+        'Bagel': "↓1", 'Baguette': "↓1", 'Croissant': "", 'Eclair': "—", 'Muffin': "↑3", 'Scone': "NEW"
+    }
+
+
+def test_rank_movers_respect_the_top_window(dashboard):
+    before = totals({name: 100 - i for i, name in enumerate("ABCDEFGH")})
+    after = totals({'H': 200, 'G': 150, 'B': 99, 'C': 98, 'D': 97, 'E': 96, 'F': 95, 'A': 1})
+    ranks = dashboard.product_ranks(before, after)
+    
+    climbers, fallers = dashboard.rank_movers(ranks, n=2)
+    
+    assert climbers.to_dict() == {'H': 7, 'G': 5}
+    assert fallers.to_dict() == {'A': -7, 'B': -1}  # B to F all fell one place; ties keep the first
+    
+    climbers, fallers = dashboard.rank_movers(ranks, n=2, within=3)
+    
+    assert climbers.to_dict() == {'H': 7, 'G': 5}
+    assert fallers.to_dict() == {'A': -7, 'B': -1}
+    
+    climbers, fallers = dashboard.rank_movers(ranks, n=2, within=1)
+    
+    assert climbers.to_dict() == {'H': 7}  # G ends 2nd, outside the top 1
+    assert fallers.to_dict() == {'A': -7}  # B started 2nd
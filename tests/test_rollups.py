@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+from conftest import sales_lines
+
+
+def rebuilt_days(dashboard, rollups, df):
+    """update_rollups' result and how many store/days it regrouped from line items"""
+    metrics = {'spans': {}, 'counters': {}}
+    updated = dashboard.run_with_perf_metrics(metrics, dashboard.update_rollups, rollups, df)
+    return updated, metrics['counters']['rollup_days_rebuilt']
+
+
+def assert_same_rollups(left, right):
+    for period in ['day', 'week', 'month']:
+        pd.testing.assert_frame_equal(left[period].reset_index(drop=True), right[period].reset_index(drop=True))
+
+
+def test_rollup_totals_equal_line_totals_exactly(dashboard):
+    df = sales_lines("2025-03-01", days=40, lines=50, seed=1)
+    rollups = dashboard.update_rollups(None, df)
+    
+    expected = dashboard.revenue_cents(df['Revenue']).sum()
+    for period in ['day', 'week', 'month']:
+        assert rollups[period]['RevenueCents'].sum() == expected
+        assert rollups[period]['Lines'].sum() == len(df)
+
+
+def test_appending_days_rebuilds_only_new_days(dashboard):
+    df = sales_lines("2025-03-01", days=10, lines=30, seed=2)
+    more = pd.concat([df, sales_lines("2025-03-11", days=3, lines=30, seed=3)], ignore_index=True)
+    
+    rollups, _ = rebuilt_days(dashboard, None, df)
+    updated, rebuilt = rebuilt_days(dashboard, rollups, more)
+    
+    assert rebuilt == 3 * 2  # Three new days for each of two stores
+    assert_same_rollups(updated, dashboard.update_rollups(None, more))
+
+
+def test_corrected_day_with_same_total_is_rebuilt(dashboard):
+    df = sales_lines("2025-03-01", days=5, lines=30, seed=4)
+    rollups = dashboard.update_rollups(None, df)
+    
+    # A corrected export moves revenue between two lines of one day: the day total is unchanged
+    corrected = df.copy()
+    day = corrected.index[(corrected['Store'] == 'North') & (corrected['Date'] == pd.Timestamp("2025-03-03"))]
+    corrected.loc[day[[0, 1]], 'Revenue'] = corrected.loc[day[[1, 0]], 'Revenue'].to_numpy()
+    corrected.loc[day[0], 'Description'], corrected.loc[day[0], 'Category'] = "Cookie Choc", "Cookies"
+    
+    updated, rebuilt = rebuilt_days(dashboard, rollups, corrected)
+    
+    assert rebuilt == 1
+    assert_same_rollups(updated, dashboard.update_rollups(None, corrected))
+
+
+def test_unchanged_frame_rebuilds_nothing(dashboard):
+    df = sales_lines("2025-03-01", days=5, lines=30, seed=5)
+    rollups = dashboard.update_rollups(None, df)
+    
+    updated, rebuilt = rebuilt_days(dashboard, rollups, df.sample(frac=1, random_state=0))  # Row order doesn't matter
+    
+    assert rebuilt == 0
+    assert_same_rollups(updated, rollups)
+
+
+def test_filter_rollup_and_sums(dashboard):
+    df = sales_lines("2025-03-01", days=3, lines=40, seed=6)
+    day = dashboard.update_rollups(None, df)['day']
+    
+    north_bread = dashboard.filter_rollup(day, store='North', category='Bread')
+    sums = dashboard.rollup_sums(north_bread, 'Description')
+    
+    lines = df[(df['Store'] == 'North') & (df['Category'] == 'Bread')]
+    expected = lines.groupby('Description')['Revenue'].sum()
+    pd.testing.assert_series_equal(sums['Revenue'], expected, check_names=False)
+    assert dashboard.rollup_revenue(north_bread) == pytest.approx(lines['Revenue'].sum(), abs=0.005)
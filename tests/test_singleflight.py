@@ -0,0 +1,74 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+class LookupCountingDict(dict):
+    """In-flight call table that counts lookups, so a test knows when followers are attached"""
+    lookups = 0
+    
+    def get(self, key, default=None):
+        self.lookups += 1
+        return super().get(key, default)
+
+
+def start_flight(flights, key, fn, followers):
+    """Run one leader and some followers of flights.do(key, fn), returning once all have joined the call"""
+    flights.calls = LookupCountingDict()
+    pool = ThreadPoolExecutor(max_workers=followers + 1)
+    leader = pool.submit(flights.do, key, fn)
+    wait_for(lambda: key in flights.calls)
+    waiting = [pool.submit(flights.do, key, fn) for _ in range(followers)]
+    wait_for(lambda: flights.calls.lookups == followers + 1)
+    return leader, waiting
+
+
+def test_concurrent_callers_share_one_run(dashboard):
+    flights = dashboard.SingleFlight()
+    release, runs = threading.Event(), []
+    
+    def fetch():
+        runs.append(1)
+        release.wait(5)
+        return "day frame"
+    
+    leader, followers = start_flight(flights, "file-1@v1", fetch, followers=5)
+    release.set()
+    
+    assert leader.result() == ("day frame", False)
+    assert [follower.result() for follower in followers] == [("day frame", True)] * 5
+    assert len(runs) == 1 and flights.calls == {}
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached(dashboard):
+    flights = dashboard.SingleFlight()
+    release = threading.Event()
+    
+    def failing_fetch():
+        release.wait(5)
+        raise OSError("connection reset")
+    
+    leader, followers = start_flight(flights, "file-1@v1", failing_fetch, followers=2)
+    release.set()
+    
+    for call in [leader] + followers:
+        with pytest.raises(OSError, match="connection reset"):
+            call.result()
+    assert flights.do("file-1@v1", lambda: "retried") == ("retried", False)
+
+
+def test_finished_and_different_keys_run_again(dashboard):
+    flights = dashboard.SingleFlight()
+    
+    assert flights.do("file-1@v1", lambda: 1) == (1, False)
+    assert flights.do("file-1@v1", lambda: 2) == (2, False)  # Results are not cached after the flight lands
+    assert flights.do("file-1@v2", lambda: 3) == (3, False)
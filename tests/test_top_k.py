@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def product_totals(n, seed=0, nan_share=0.0):
+    """Totals with many ties (small integer range) and optionally some NaNs"""
+    rng = np.random.default_rng(seed)
+    revenue = rng.integers(0, 20, n).astype(float)
+    revenue[rng.random(n) < nan_share] = np.nan
+    index = pd.Index([f"Product {i:04d}" for i in range(n)], name='Description')
+    return pd.DataFrame({'Revenue': revenue, 'Quantity': rng.integers(0, 5, n)}, index=index)
+
+
+@pytest.mark.parametrize("k", [1, 5, 10, 60, 500])
+def test_keep_first_matches_stable_sort_and_nlargest(dashboard, k):
+    totals = product_totals(300, seed=k)
+    
+    top = dashboard.top_k(totals['Revenue'], k)
+    
+    pd.testing.assert_series_equal(top, totals['Revenue'].sort_values(ascending=False, kind='stable').head(k))
+    if k < len(totals):  # nlargest falls back to an unstable full sort beyond that
+        pd.testing.assert_series_equal(top, totals['Revenue'].nlargest(k, keep='first'))
+        pd.testing.assert_frame_equal(dashboard.top_k(totals, k, by='Quantity'), totals.nlargest(k, 'Quantity', keep='first'))
+
+
+@pytest.mark.parametrize("k", [1, 7, 10, 60])
+def test_keep_last_reversed_matches_ascending_tail(dashboard, k):
+    totals = product_totals(300, seed=k)['Revenue']
+    
+    top = dashboard.top_k(totals, k, keep='last').iloc[::-1]
+    
+    pd.testing.assert_series_equal(top, totals.sort_values(kind='stable').tail(k))
+    pd.testing.assert_series_equal(dashboard.top_k(totals, k, keep='last'), totals.nlargest(k, keep='last'))
+
+
+@pytest.mark.parametrize("keep", ['first', 'last'])
+def test_nan_totals_are_skipped(dashboard, keep):
+    totals = product_totals(200, seed=3, nan_share=0.3)
+    
+    top = dashboard.top_k(totals['Revenue'], 10, keep=keep)
+    
+    assert len(top) == 10 and top.notna().all()
+    pd.testing.assert_series_equal(top, totals['Revenue'].nlargest(10, keep=keep))
+    pd.testing.assert_frame_equal(dashboard.top_k(totals, 10, by='Revenue', keep=keep), totals.nlargest(10, 'Revenue', keep=keep))
+
+
+def test_fewer_values_than_k(dashboard):
+    totals = pd.Series([3.0, np.nan, 5.0, np.nan], index=list("abcd"))
+    
+    assert list(dashboard.top_k(totals, 3).index) == ["c", "a"]
+    assert list(dashboard.top_k(totals, 3, keep='last').index) == ["c", "a"]
+    assert dashboard.top_k(totals.iloc[[1, 3]], 2).empty
+    assert dashboard.top_k(totals, 0).empty
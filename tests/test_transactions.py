@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import sales_lines
+
+
+def exact_transactions(df):
+    return len(df[['Store', 'Date', 'SequenceNumber']].drop_duplicates())
+
+
+@pytest.mark.parametrize("store, category, product", [
+    ("All Stores", "All Categories", "All Products"),
+    ("North", "All Categories", "All Products"),
+    ("All Stores", "Pastry", "All Products"),
+    ("South", "Bread", "All Products"),
+    ("All Stores", "All Categories", "Croissant"),
+    ("North", "Pastry", "Croissant")
+])
+def test_counts_match_distinct_receipts(dashboard, store, category, product):
+    df = sales_lines("2025-03-01", days=6, lines=120, seed=1)
+    index = dashboard.build_transaction_index(df)
+    
+    expected = df
+    if store != "All Stores":
+        expected = expected[expected['Store'] == store]
+    if category != "All Categories":
+        expected = expected[expected['Category'] == category]
+    if product != "All Products":
+        expected = expected[expected['Description'] == product]
+    
+    assert dashboard.count_transactions(index, store, category, product) == exact_transactions(expected)
+
+
+def test_lines_without_a_receipt_number_are_not_counted(dashboard):
+    df = sales_lines("2025-03-01", days=2, lines=60, seed=2)
+    df.loc[df.index[::5], 'SequenceNumber'] = None
+    
+    index = dashboard.build_transaction_index(df)
+    
+    assert dashboard.count_transactions(index) == exact_transactions(df.dropna(subset=['SequenceNumber']))
+
+
+def test_sketch_estimate_is_close_to_exact(dashboard):
+    df = sales_lines("2024-01-01", days=400, lines=60, seed=3)
+    index = dashboard.build_transaction_index(df)
+    
+    for store, category in [("All Stores", "All Categories"), ("North", "Pastry")]:
+        exact = dashboard.count_transactions(index, store, category)
+        approximate = dashboard.count_transactions(index, store, category, approximate=True)
+        assert approximate == pytest.approx(exact, rel=0.05)
+
+
+def test_hll_small_range_is_exact_enough(dashboard):
+    hashes = pd.util.hash_array(np.arange(1000))
+    registers = dashboard.hll_registers(hashes, np.zeros(len(hashes), dtype=int), 1)
+    
+    assert dashboard.hll_estimate(registers[0]) == pytest.approx(1000, rel=0.03)
+
+
+def test_approximate_only_for_long_unfiltered_spans(dashboard, monkeypatch):
+    monkeypatch.setattr(dashboard, 'TRANSACTION_COUNT_MODE', 'auto')
+    assert not dashboard.use_approximate_count(dashboard.HLL_MIN_DAYS)
+    assert dashboard.use_approximate_count(dashboard.HLL_MIN_DAYS + 1)
+    assert not dashboard.use_approximate_count(dashboard.HLL_MIN_DAYS + 1, product="Croissant")
+
+
+def test_metric_without_receipt_numbers(dashboard):
+    df = sales_lines("2025-03-01", days=1, lines=30, seed=4)
+    
+    assert dashboard.transactions_metric(None) == "—"
+    assert dashboard.transactions_metric(dashboard.build_transaction_index(df)) == f"{exact_transactions(df):,}"